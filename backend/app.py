@@ -1,46 +1,42 @@
 from flask import Flask, jsonify, request
-from flask_cors import CORS
-from flask_migrate import Migrate
-from flask_limiter import Limiter
-from flask_limiter.util import get_remote_address
 from flask_wtf.csrf import CSRFProtect
 from dotenv import load_dotenv
+import click
+import importlib
 import os
-import logging
-import re
 from datetime import datetime, timezone
-from logging.handlers import RotatingFileHandler
-
-from routes.auth_routes import auth_bp
-from routes.tenant_routes import tenant_bp
-from routes.admin_routes import admin_bp
-from routes.caretaker_routes import caretaker_bp
-from routes.payment_routes import payment_bp
-from routes.rent_deposit import rent_deposit_bp
 
 from config import Config
-from models.base import db
-
-from models.user import User
-from models.payment import Payment
-from models.lease import Lease
-from models.maintenance import MaintenanceRequest
-from models.vacate_notice import VacateNotice
-from models.bill import Bill
-from models.message import Message
-from models.notification import Notification
-from models.property import Property
-from models.property_image import PropertyImage
-from models.reset_password import ResetPassword
-from models.booking_inquiry import BookingInquiry
+from models import db, User, Property, MonthlyLedger
+from utils.overdue_checks import run_overdue_checks
+from utils.logging_config import configure_logging, register_request_logging
+from utils.cors import init_cors
+from utils.rate_limit import init_rate_limits, apply_rate_limit_budgets
+from utils.db_engine import connection_shortfall, engine_options, install_engine_events
+from utils.read_replica import init_read_replica
+from services.payment_jobs import init_payment_jobs
 
 load_dotenv()
 
 
-def create_app():
+def create_app(config_overrides=None):
     """Application factory for Joyce Suites backend."""
     app = Flask(__name__)
     app.config.from_object(Config)
+    if config_overrides:
+        app.config.update(config_overrides)
+
+    # Pool class and sizes for this dialect and this worker's share of DB_MAX_CONNECTIONS
+    app.config["SQLALCHEMY_ENGINE_OPTIONS"] = {
+        **engine_options(app.config),
+        **app.config.get("SQLALCHEMY_ENGINE_OPTIONS", {})
+    }
+    shortfall = connection_shortfall(app.config)
+    if shortfall:
+        app.logger.warning(
+            f"Each worker's share of DB_MAX_CONNECTIONS is {shortfall} short of its request and payment job "
+            f"threads; they will queue for connections (raise DB_MAX_CONNECTIONS or lower WEB_CONCURRENCY)"
+        )
 
     # Ensure database directory exists for SQLite
     db_uri = app.config.get('SQLALCHEMY_DATABASE_URI', '')
@@ -56,135 +52,38 @@ def create_app():
             os.makedirs(db_dir, exist_ok=True)
 
     db.init_app(app)
-    Migrate(app, db)
-    
-    # CORS origins - comprehensive list with fallback
-    configured_origins = app.config.get('CORS_ORIGINS', [
-        "http://localhost:3000",
-        "http://127.0.0.1:3000",
-        "http://localhost:3001",
-        "https://joyce-suites.vercel.app",
-        "https://joyce-suites-jcfw.vercel.app",
-        "https://joyce-suites-git-main-steves-projects-d95e3bef.vercel.app",
-        "https://joyce-suites.onrender.com"
-    ])
-    
-    # Always ensure critical domains are included
-    required_origins = [
-        "https://joyce-suites.vercel.app",
-        "https://joyce-suites-jcfw.vercel.app",
-        "https://joyce-suites-git-main-steves-projects-d95e3bef.vercel.app",
-        "https://joyce-suites.onrender.com"
-    ]
-    
-    cors_origins = [origin.strip() for origin in configured_origins if origin and origin.strip()]
+    init_read_replica(app)
+    install_engine_events(app)
 
-    for origin in required_origins:
-        if origin not in cors_origins:
-            cors_origins.append(origin)
-            app.logger.info(f"Added required CORS origin: {origin}")
-    
-    # Ensure all render.com URLs are included
-    render_urls = ["https://joyce-suites.onrender.com"]
-    for url in render_urls:
-        if url not in cors_origins:
-            cors_origins.append(url)
-
-    # Allow deploy-preview style domains without redeploying backend config each time.
-    dynamic_origin_patterns = [
-        r"^https://joyce-suites(?:-[a-z0-9-]+)?\.onrender\.com$",
-        r"^https://joyce-suites(?:-[a-z0-9-]+)?\.vercel\.app$"
-    ]
-
-    def is_allowed_origin(origin: str) -> bool:
-        if not origin:
-            return False
-        if origin in cors_origins:
-            return True
-        return any(re.match(pattern, origin) for pattern in dynamic_origin_patterns)
-    
-    app.logger.info(f"CORS origins: {cors_origins}")
-    app.logger.info("CORS fix deployed - v4.0 - Comprehensive solution")
-    
-    # Configure Flask-CORS with explicit settings
-    CORS(app, 
-         origins=cors_origins + dynamic_origin_patterns,
-         supports_credentials=True,
-         methods=['GET', 'POST', 'PUT', 'DELETE', 'OPTIONS', 'PATCH'],
-         allow_headers=['content-type', 'Content-Type', 'Authorization', 'X-Requested-With', 'Accept', 'Origin'],
-         expose_headers=['Content-Type', 'Authorization'],
-         max_age=3600,
-         vary_header=True)
-    
-    @app.after_request
-    def after_request(response):
-        origin = request.headers.get('Origin')
-        
-        # Debug logging
-        app.logger.info(f"After request - Method: {request.method}, Origin: {origin}, Path: {request.path}")
-        
-        # Force CORS headers for all responses
-        if origin and is_allowed_origin(origin):
-            response.headers['Access-Control-Allow-Origin'] = origin
-            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS, PATCH'
-            response.headers['Access-Control-Allow-Headers'] = 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin'
-            response.headers['Access-Control-Allow-Credentials'] = 'true'
-            response.headers['Access-Control-Max-Age'] = '3600'
-            app.logger.info(f"CORS headers added for origin: {origin}")
-        elif origin is None:
-            # For requests without Origin (like mobile apps, Postman, etc.)
-            response.headers['Access-Control-Allow-Origin'] = '*'
-            response.headers['Access-Control-Allow-Methods'] = 'GET, POST, PUT, DELETE, OPTIONS, PATCH'
-            response.headers['Access-Control-Allow-Headers'] = 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin'
-            app.logger.info("CORS headers added for requests with no Origin header")
-        else:
-            app.logger.warning(f"CORS blocked for origin: {origin}")
-        
-        return response
+    # Alembic is only needed by `flask db ...`; servers and tests skip importing it
+    if app.config.get("REGISTER_MIGRATE", click.get_current_context(silent=True) is not None):
+        from flask_migrate import Migrate
+        Migrate(app, db)
     
+    cors = init_cors(app)
+
     # Add a simple test endpoint for CORS debugging
-    @app.route('/test-cors-debug', methods=['GET', 'OPTIONS'])
+    @app.route('/test-cors-debug', methods=['GET'])
     def test_cors_debug():
         origin = request.headers.get('Origin')
-        app.logger.info(f"Test CORS - Method: {request.method}, Origin: {origin}")
-        
-        if request.method == 'OPTIONS':
-            response = app.make_default_options_response()
-            response.headers.set('Access-Control-Allow-Origin', origin or '*')
-            response.headers.set('Access-Control-Allow-Methods', 'GET, POST, OPTIONS')
-            response.headers.set('Access-Control-Allow-Headers', 'content-type, Content-Type, Authorization')
-            return response
         return jsonify({
             'message': 'CORS test endpoint',
             'origin': origin,
-            'cors_origins': cors_origins,
-            'origin_allowed': is_allowed_origin(origin) if origin else True
+            'cors_origins': sorted(cors.origins),
+            'origin_allowed': cors.is_allowed(origin) if origin else True
         })
     
-    is_development = os.getenv("FLASK_ENV", "development") == "development"
+    limiter = init_rate_limits(app)
     
-    limiter = Limiter(
-        app=app,
-        key_func=get_remote_address,
-        default_limits=["1000 per day", "200 per hour"] if is_development else ["200 per day", "50 per hour"],
-        storage_uri="memory://",
-        default_limits_exempt_when=lambda: request.method == "OPTIONS"
-    )
-    app.limiter = limiter
-    
-    csrf = CSRFProtect(app)
-    csrf.exempt(auth_bp)
-    csrf.exempt(tenant_bp)
-    csrf.exempt(admin_bp)
-    csrf.exempt(caretaker_bp)
-    csrf.exempt(payment_bp)
-    csrf.exempt(rent_deposit_bp)
+    CSRFProtect(app)
 
     configure_logging(app)
     register_blueprints(app)
+    apply_rate_limit_budgets(app, limiter)
     register_error_handlers(app)
     register_cli_commands(app)
     register_request_logging(app)
+    init_payment_jobs(app)
     
     # Auto-seed database in production if empty (fixed version)
     # Auto-seeding disabled - use manual setup scripts
@@ -520,14 +419,25 @@ def create_app():
     return app
 
 
+# (module, blueprint attribute, url prefix). Route modules are imported when an
+# app is built, not when this module is imported.
+BLUEPRINTS = (
+    ("routes.auth_routes", "auth_bp", "/api/auth"),
+    ("routes.admin_routes", "admin_bp", "/api/admin"),
+    ("routes.caretaker_routes", "caretaker_bp", "/api/caretaker"),
+    ("routes.tenant_routes", "tenant_bp", "/api/tenant"),
+    ("routes.payment_routes", "payment_bp", "/api/payments"),
+    ("routes.rent_deposit", "rent_deposit_bp", "/api/rent-deposit"),
+)
+
+
 def register_blueprints(app: Flask) -> None:
     """Register all blueprints with the app."""
-    app.register_blueprint(auth_bp, url_prefix="/api/auth")
-    app.register_blueprint(admin_bp, url_prefix="/api/admin")
-    app.register_blueprint(caretaker_bp, url_prefix="/api/caretaker")
-    app.register_blueprint(tenant_bp, url_prefix="/api/tenant")
-    app.register_blueprint(payment_bp, url_prefix="/api/payments")
-    app.register_blueprint(rent_deposit_bp, url_prefix="/api/rent-deposit")
+    csrf = app.extensions["csrf"]
+    for module_name, attribute, url_prefix in BLUEPRINTS:
+        blueprint = getattr(importlib.import_module(module_name), attribute)
+        csrf.exempt(blueprint)  # JSON API authenticated by bearer tokens
+        app.register_blueprint(blueprint, url_prefix=url_prefix)
 
     @app.route("/", methods=["GET"])
     def root():
@@ -561,7 +471,7 @@ def register_blueprints(app: Flask) -> None:
             "timestamp": datetime.now(timezone.utc).isoformat()
         }), 200
     
-    @app.route("/api/test-cors", methods=["GET", "OPTIONS"])
+    @app.route("/api/test-cors", methods=["GET"])
     def test_cors():
         return jsonify({
             "success": True,
@@ -741,22 +651,103 @@ def register_cli_commands(app: Flask) -> None:
             db.session.commit()
             print(f"Seeded {len(properties)} properties.")
 
+    @app.cli.command("rebuild-ledger")
+    def rebuild_ledger():
+        """Recompute the monthly_ledger rollup from rent, deposit, water and payment rows."""
+        with app.app_context():
+            rows = MonthlyLedger.rebuild()
+        print(f"Rebuilt monthly ledger with {rows} rows.")
+
+    @app.cli.command("run-checks")
+    @click.option("--every", type=int, default=0,
+                  help="Repeat the sweep every N minutes instead of running once.")
+    def run_checks(every):
+        """Mark overdue rent and water bills and notify tenants (cron or --every)."""
+        import time
+
+        while True:
+            with app.app_context():
+                summary = run_overdue_checks()
+            if summary is None:
+                print("Overdue checks already running elsewhere; skipped.")
+            else:
+                print(f"Overdue checks completed: {summary}")
+
+            if every <= 0:
+                break
+            time.sleep(every * 60)
+
+    @app.cli.command("run-payment-jobs")
+    @click.option("--once", is_flag=True, help="Run the jobs that are due now and exit.")
+    def run_payment_jobs(once):
+        """Send queued STK pushes and apply M-Pesa callbacks (alongside or instead of the web workers' runner threads)."""
+        import time
+        from services.payment_jobs import run_cycle
 
-def configure_logging(app: Flask) -> None:
-    """Configure rotating log file output."""
-    if not os.path.exists("logs"):
-        os.makedirs("logs")
+        while True:
+            with app.app_context():
+                ran = run_cycle(app)
+            if ran:
+                print(f"Ran {ran} payment jobs.")
+            if once:
+                break
+            time.sleep(app.config["PAYMENT_JOB_POLL_SECONDS"])
+
+    @app.cli.command("reconcile-payments")
+    @click.option("--every", type=int, default=0,
+                  help="Repeat the sweep every N seconds instead of running once.")
+    def reconcile_payments(every):
+        """Ask Safaricom for the outcome of pending STK payments whose callback has not arrived."""
+        import time
+        from services.payment_reconciler import reconcile_pending
+
+        while True:
+            with app.app_context():
+                summary = reconcile_pending()
+            if summary is None:
+                print("Reconciliation already running elsewhere; skipped.")
+            else:
+                print(f"Reconciled pending payments: {dict(summary)}")
+
+            if every <= 0:
+                break
+            time.sleep(every)
 
-    handler = RotatingFileHandler(
-        "logs/joyce_suites.log", maxBytes=10 * 1024 * 1024, backupCount=10
-    )
-    formatter = logging.Formatter("%(asctime)s - %(levelname)s - %(message)s")
-    handler.setFormatter(formatter)
-    handler.setLevel(logging.INFO)
+    @app.cli.command("sync-replica")
+    def sync_replica():
+        """Copy the SQLite database into the SQLite read replica (local development)."""
+        from utils.read_replica import sync_sqlite_replica
 
-    app.logger.addHandler(handler)
-    app.logger.setLevel(logging.INFO)
-    app.logger.info(f"Joyce Suites API started - Env: {os.getenv('FLASK_ENV', 'development')}")
+        if not app.config.get("SQLALCHEMY_REPLICA_URI"):
+            raise click.ClickException("DATABASE_REPLICA_URL is not set.")
+        try:
+            path = sync_sqlite_replica(app)
+        except ValueError as e:
+            raise click.ClickException(str(e))
+        print(f"Replica refreshed: {path}")
+
+    @app.cli.command("serve")
+    @click.option("--bind", default=None, help="host:port to listen on (default 0.0.0.0:$PORT).")
+    @click.option("--workers", type=int, default=None, help="Worker processes (default WEB_CONCURRENCY or 2 x cores + 1).")
+    @click.option("--threads", type=int, default=None, help="Request threads per worker (default WSGI_THREADS).")
+    def serve_app(bind, workers, threads):
+        """Run the API under gunicorn with preloaded, multi-threaded workers."""
+        from utils.server import serve, default_workers
+
+        workers = workers or app.config["WSGI_WORKERS"] or default_workers()
+        threads = threads or app.config["WSGI_THREADS"]
+        bind = bind or f"0.0.0.0:{app.config['PORT']}"
+
+        print(f"Serving Joyce Suites API on {bind} with {workers} workers x {threads} threads")
+        serve(
+            lambda: create_app({"WSGI_WORKERS": workers, "WSGI_THREADS": threads, "REGISTER_MIGRATE": False}),
+            bind=bind,
+            workers=workers,
+            threads=threads,
+            timeout=app.config["WSGI_TIMEOUT"],
+            graceful_timeout=app.config["WSGI_GRACEFUL_TIMEOUT"],
+            max_requests=app.config["WSGI_MAX_REQUESTS"]
+        )
 
 
 def check_db_connection(app: Flask) -> bool:
@@ -769,18 +760,6 @@ def check_db_connection(app: Flask) -> bool:
         return False
 
 
-def register_request_logging(app: Flask) -> None:
-    """Log all incoming requests."""
-    @app.before_request
-    def log_request_info():
-        if request.method != "OPTIONS":
-            app.logger.info(
-                f"{request.method} {request.path} | "
-                f"IP: {request.remote_addr} | "
-                f"User-Agent: {request.headers.get('User-Agent', 'Unknown')[:50]}"
-            )
-
-
 def auto_seed_if_needed(app: Flask) -> None:
     """Automatically seed database if it's empty (only in production)."""
     if os.getenv("FLASK_ENV") != "production":
@@ -791,17 +770,23 @@ def auto_seed_if_needed(app: Flask) -> None:
             # Create tables first
             from models.base import db
             db.create_all()
-            app.logger.info("✅ Database tables created/verified")
+            app.logger.info("Database tables created/verified")
             
     except Exception as e:
-        app.logger.error(f"❌ Database initialization failed: {e}")
+        app.logger.error(f"Database initialization failed: {e}")
         # Don't raise the error to prevent app startup failure
 
 
-app = create_app()
+def __getattr__(name):
+    # `from app import app` and `flask --app app` build the app on first access
+    if name == "app":
+        globals()["app"] = create_app()
+        return globals()["app"]
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
 
 
 if __name__ == "__main__":
+    app = create_app()
     host = os.getenv("FLASK_HOST", "0.0.0.0")
     port = int(os.getenv("PORT", 5000))
     debug = os.getenv("FLASK_ENV", "development") == "development"
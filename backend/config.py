@@ -4,6 +4,35 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
+
+def _rate_limit_budgets():
+    """(per-blueprint limits, per-endpoint limits), overridable with RATELIMIT_* variables."""
+    if os.getenv("FLASK_ENV") == "production":
+        dashboard_limit = os.getenv("RATELIMIT_DASHBOARD", "1000 per hour;100 per minute")
+        login_limit = os.getenv("RATELIMIT_LOGIN", "10 per minute;50 per hour")
+        inquiry_limit = os.getenv("RATELIMIT_INQUIRY", "5 per minute;20 per hour")
+    else:
+        dashboard_limit = os.getenv("RATELIMIT_DASHBOARD", "5000 per hour")
+        login_limit = os.getenv("RATELIMIT_LOGIN", "200 per minute")
+        inquiry_limit = os.getenv("RATELIMIT_INQUIRY", "60 per minute")
+    mpesa_limit = os.getenv("RATELIMIT_MPESA_CALLBACKS", "300 per minute")
+
+    blueprint_limits = {
+        "admin": dashboard_limit,
+        "caretaker": dashboard_limit,
+        "tenant": dashboard_limit,
+        "rent_deposit": dashboard_limit
+    }
+    endpoint_limits = {
+        "auth.login": login_limit,
+        "auth.send_inquiry": inquiry_limit,
+        "payment.mpesa_validation": mpesa_limit,
+        "payment.mpesa_callback": mpesa_limit,
+        "payment.mpesa_confirmation": mpesa_limit
+    }
+    return blueprint_limits, endpoint_limits
+
+
 class BaseConfig:
     """Base configuration"""
     
@@ -26,23 +55,29 @@ class BaseConfig:
     
     SQLALCHEMY_TRACK_MODIFICATIONS = False
 
-    # Database engine options
-    engine_options = {
-        "pool_pre_ping": True,      # Verify connections before using
-        "pool_recycle": 3600,        # Recycle connections after 1 hour
-        "pool_size": 10,             # Number of connections to maintain
-        "max_overflow": 20,          # Max connections beyond pool_size
-        "pool_timeout": 30,          # Timeout for getting connection
-    }
-    
-    # Add PostgreSQL-specific connection args
-    if SQLALCHEMY_DATABASE_URI and SQLALCHEMY_DATABASE_URI.startswith("postgresql://"):
-        engine_options["connect_args"] = {
-            "connect_timeout": 10,   # Connection timeout in seconds
-            "application_name": "joyce_suites"
-        }
-    
-    SQLALCHEMY_ENGINE_OPTIONS = engine_options
+    # Engine/pool settings are chosen per dialect in utils/db_engine.py; anything
+    # set in SQLALCHEMY_ENGINE_OPTIONS overrides them
+    SQLALCHEMY_ENGINE_OPTIONS = {}
+    DB_POOL_TIMEOUT = int(os.getenv("DB_POOL_TIMEOUT", 30))
+    DB_POOL_RECYCLE = int(os.getenv("DB_POOL_RECYCLE", 1800))
+    DB_STATEMENT_TIMEOUT_MS = int(os.getenv("DB_STATEMENT_TIMEOUT_MS", 30000))  # Postgres; 0 disables
+    SQLITE_BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", 5000))
+    SQLITE_MMAP_SIZE = int(os.getenv("SQLITE_MMAP_SIZE", 64 * 1024 * 1024))
+
+    # Optional read replica for GET/HEAD requests (utils/read_replica.py). Clients
+    # read from the primary for READ_YOUR_WRITES_SECONDS after a successful write.
+    SQLALCHEMY_REPLICA_URI = os.getenv("DATABASE_REPLICA_URL")
+    READ_YOUR_WRITES_SECONDS = int(os.getenv("READ_YOUR_WRITES_SECONDS", 5))
+
+    # `flask serve` (gunicorn): worker processes (0 = 2 x cores + 1), threads per
+    # worker, and the database connection budget all workers share. Pool sizes
+    # are derived from these plus PAYMENT_JOB_WORKERS.
+    WSGI_WORKERS = int(os.getenv("WEB_CONCURRENCY", 0))
+    WSGI_THREADS = int(os.getenv("WSGI_THREADS", 4))
+    WSGI_TIMEOUT = int(os.getenv("WSGI_TIMEOUT", 120))
+    WSGI_GRACEFUL_TIMEOUT = int(os.getenv("WSGI_GRACEFUL_TIMEOUT", 30))
+    WSGI_MAX_REQUESTS = int(os.getenv("WSGI_MAX_REQUESTS", 0))  # Recycle workers after N requests (0 = never)
+    DB_MAX_CONNECTIONS = int(os.getenv("DB_MAX_CONNECTIONS", 30))
 
     if os.getenv("FLASK_ENV") == "production":
         SECRET_KEY = os.getenv("SECRET_KEY")
@@ -58,7 +93,29 @@ class BaseConfig:
     JWT_ALGORITHM = "HS256"
     JWT_EXPIRATION_HOURS = 24
 
+    # Logged-out tokens: "database" is shared by all workers, "memory" is per process
+    TOKEN_REVOCATION_BACKEND = os.getenv("TOKEN_REVOCATION_BACKEND", "database")
+    TOKEN_REVOCATION_SYNC_SECONDS = int(os.getenv("TOKEN_REVOCATION_SYNC_SECONDS", 5))
+    TOKEN_REVOCATION_MAX_ENTRIES = int(os.getenv("TOKEN_REVOCATION_MAX_ENTRIES", 100000))
+    # Already-verified tokens kept per process to skip repeat HMAC checks (0 disables)
+    JWT_VERIFY_CACHE_SIZE = int(os.getenv("JWT_VERIFY_CACHE_SIZE", 1024))
+
     CORS_ORIGINS = os.getenv("CORS_ORIGINS", "http://localhost:3000,https://joyce-suites.vercel.app,https://joyce-suites-jcfw.vercel.app,https://joyce-suites-git-main-steves-projects-d95e3bef.vercel.app,https://joyce-suites.onrender.com").split(",")
+    # How long browsers may reuse a preflight, and how many origin decisions are cached
+    CORS_MAX_AGE = int(os.getenv("CORS_MAX_AGE", 3600))
+    CORS_DECISION_CACHE_SIZE = int(os.getenv("CORS_DECISION_CACHE_SIZE", 256))
+
+    # Rate limiting. Counters are per process with memory://; sqlite:///<file>
+    # (in the instance folder) or redis://... share them between workers.
+    if os.getenv("FLASK_ENV") == "production":
+        RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "sqlite:///ratelimit.db")
+        RATELIMIT_DEFAULTS = ["200 per day", "50 per hour"]
+    else:
+        RATELIMIT_STORAGE_URI = os.getenv("RATELIMIT_STORAGE_URI", "memory://")
+        RATELIMIT_DEFAULTS = ["1000 per day", "200 per hour"]
+
+    # Budgets per blueprint (authenticated dashboards) and per public endpoint
+    RATELIMIT_BLUEPRINT_LIMITS, RATELIMIT_ENDPOINT_LIMITS = _rate_limit_budgets()
 
     PERMANENT_SESSION_LIFETIME = timedelta(hours=24)
     SESSION_COOKIE_HTTPONLY = True
@@ -66,6 +123,12 @@ class BaseConfig:
     
     SESSION_COOKIE_SECURE = os.getenv("FLASK_ENV") == "production"
 
+    # Logging: level switch, file target and access-log sampling (see utils/logging_config.py)
+    LOG_LEVEL = os.getenv("LOG_LEVEL", "INFO")
+    LOG_FILE = os.getenv("LOG_FILE", "logs/joyce_suites.log")
+    LOG_SAMPLE_RATE = float(os.getenv("LOG_SAMPLE_RATE", 1.0))
+    LOG_SAMPLE_RATES = os.getenv("LOG_SAMPLE_RATES", "")
+
     MAX_CONTENT_LENGTH = 16 * 1024 * 1024
     UPLOAD_FOLDER = os.path.join(os.path.dirname(__file__), 'uploads')
     
@@ -74,6 +137,10 @@ class BaseConfig:
     CLOUDINARY_API_SECRET = os.getenv("CLOUDINARY_API_SECRET")
     USE_CLOUDINARY = os.getenv("USE_CLOUDINARY", "false").lower() == "true"
 
+    # Write staff notification fan-out on a background thread after commit
+    NOTIFICATIONS_ASYNC = os.getenv("NOTIFICATIONS_ASYNC", "false").lower() == "true"
+    STAFF_RECIPIENT_CACHE_TTL = int(os.getenv("STAFF_RECIPIENT_CACHE_TTL", 300))
+
     JOYCE = {
         "CONSUMER_KEY": os.getenv("JOYCE_CONSUMER_KEY"),
         "CONSUMER_SECRET": os.getenv("JOYCE_CONSUMER_SECRET"),
@@ -90,6 +157,42 @@ class BaseConfig:
 
     CALLBACK_URL = os.getenv("CALLBACK_URL")
 
+    # Cached Daraja OAuth tokens are renewed this many seconds before they expire
+    MPESA_TOKEN_REFRESH_MARGIN = int(os.getenv("MPESA_TOKEN_REFRESH_MARGIN", 300))
+
+    # Daraja HTTP transport (services/http_transport.py): timeouts in seconds,
+    # retries for idempotent calls only, and the per-host circuit breaker
+    MPESA_CONNECT_TIMEOUT = float(os.getenv("MPESA_CONNECT_TIMEOUT", 3.05))
+    MPESA_READ_TIMEOUT = float(os.getenv("MPESA_READ_TIMEOUT", 10))
+    MPESA_QUERY_RETRIES = int(os.getenv("MPESA_QUERY_RETRIES", 2))
+    MPESA_RETRY_BACKOFF = float(os.getenv("MPESA_RETRY_BACKOFF", 0.25))
+    MPESA_BREAKER_FAILURES = int(os.getenv("MPESA_BREAKER_FAILURES", 5))
+    MPESA_BREAKER_RESET_SECONDS = int(os.getenv("MPESA_BREAKER_RESET_SECONDS", 30))
+
+    # STK pushes go through the payment_jobs queue (services/payment_jobs.py): runner
+    # threads per web worker (0 = only `flask run-payment-jobs`), attempts for pushes
+    # Safaricom did not accept, first retry delay, idle poll interval, and how long a
+    # running job is leased before it counts as abandoned
+    PAYMENT_JOB_WORKERS = int(os.getenv("PAYMENT_JOB_WORKERS", 2))
+    PAYMENT_JOB_MAX_ATTEMPTS = int(os.getenv("PAYMENT_JOB_MAX_ATTEMPTS", 3))
+    PAYMENT_JOB_RETRY_SECONDS = int(os.getenv("PAYMENT_JOB_RETRY_SECONDS", 5))
+    PAYMENT_JOB_POLL_SECONDS = int(os.getenv("PAYMENT_JOB_POLL_SECONDS", 5))
+    PAYMENT_JOB_LEASE_SECONDS = int(os.getenv("PAYMENT_JOB_LEASE_SECONDS", 120))
+
+    # Pending STK payments are reconciled server-side (services/payment_reconciler.py)
+    # by the job runner: how often, how old a payment must be before it is queried,
+    # batch size, concurrent Safaricom queries, and when an unanswered push is failed
+    PAYMENT_RECONCILE_INTERVAL = int(os.getenv("PAYMENT_RECONCILE_INTERVAL", 30))
+    PAYMENT_RECONCILE_MIN_AGE = int(os.getenv("PAYMENT_RECONCILE_MIN_AGE", 30))
+    PAYMENT_RECONCILE_BATCH = int(os.getenv("PAYMENT_RECONCILE_BATCH", 50))
+    PAYMENT_RECONCILE_CONCURRENCY = int(os.getenv("PAYMENT_RECONCILE_CONCURRENCY", 4))
+    PAYMENT_RECONCILE_EXPIRE_SECONDS = int(os.getenv("PAYMENT_RECONCILE_EXPIRE_SECONDS", 900))
+    # Longest ?wait= the payment status endpoint honours (each waiting request holds a thread)
+    PAYMENT_STATUS_MAX_WAIT = int(os.getenv("PAYMENT_STATUS_MAX_WAIT", 20))
+    # Callbacks and C2B confirmations are stored in mpesa_inbox and applied by the
+    # payment job runner (services/mpesa_inbox.py), this many per transaction
+    MPESA_INBOX_BATCH = int(os.getenv("MPESA_INBOX_BATCH", 200))
+
     if os.getenv("FLASK_ENV") == "production":
         AUTH_URL = "https://api.safaricom.co.ke/oauth/v1/generate?grant_type=client_credentials"
         STK_PUSH_URL = "https://api.safaricom.co.ke/mpesa/stkpush/v1/processrequest"
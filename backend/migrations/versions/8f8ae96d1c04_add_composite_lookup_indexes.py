@@ -0,0 +1,83 @@
+"""add composite lookup indexes
+
+Revision ID: 8f8ae96d1c04
+Revises: 5dfee6ac557d
+Create Date: 2026-10-17 10:03:47.551902
+
+"""
+from alembic import op
+import sqlalchemy as sa
+
+
+# revision identifiers, used by Alembic.
+revision = '8f8ae96d1c04'
+down_revision = '5dfee6ac557d'
+branch_labels = None
+depends_on = None
+
+
+INDEXES = [
+    ('leases', 'ix_leases_tenant_id_status', ['tenant_id', 'status']),
+    ('leases', 'ix_leases_property_id_status', ['property_id', 'status']),
+    ('payments', 'ix_payments_lease_id_status_payment_date', ['lease_id', 'status', 'payment_date']),
+    ('payments', 'ix_payments_lease_id_created_at', ['lease_id', 'created_at']),
+    ('notifications', 'ix_notifications_user_id_is_read_created_at', ['user_id', 'is_read', 'created_at']),
+    ('users', 'ix_users_role_is_active', ['role', 'is_active']),
+    ('users', 'ix_users_room_number', ['room_number']),
+    ('maintenance_requests', 'ix_maintenance_requests_reported_by_id_status', ['reported_by_id', 'status']),
+]
+
+# The unique constraints also serve the (tenant_id, year, month) lookups
+UNIQUE_CONSTRAINTS = [
+    ('rent_records', 'uq_rent_records_tenant_id_year_month', ['tenant_id', 'year', 'month']),
+    ('water_bills', 'uq_water_bills_tenant_id_year_month', ['tenant_id', 'year', 'month']),
+]
+
+
+def _existing(inspector, table):
+    names = {index['name'] for index in inspector.get_indexes(table)}
+    names.update(constraint['name'] for constraint in inspector.get_unique_constraints(table))
+    return names
+
+
+def upgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    # Tables created outside of migrations (db.create_all) may already have these
+    for table, name, columns in INDEXES:
+        if table in tables and name not in _existing(inspector, table):
+            op.create_index(name, table, columns, unique=False)
+
+    for table, name, columns in UNIQUE_CONSTRAINTS:
+        if table not in tables or name in _existing(inspector, table):
+            continue
+
+        duplicates = bind.execute(sa.text(
+            f"SELECT COUNT(*) FROM (SELECT 1 FROM {table} "
+            f"GROUP BY tenant_id, year, month HAVING COUNT(*) > 1) AS dup"
+        )).scalar()
+        if duplicates:
+            raise RuntimeError(
+                f"{table} has {duplicates} duplicate (tenant_id, year, month) groups; "
+                f"merge them before running this migration"
+            )
+
+        with op.batch_alter_table(table, schema=None) as batch_op:
+            batch_op.create_unique_constraint(name, columns)
+
+
+def downgrade():
+    bind = op.get_bind()
+    inspector = sa.inspect(bind)
+    tables = set(inspector.get_table_names())
+
+    for table, name, _ in UNIQUE_CONSTRAINTS:
+        if table in tables and name in _existing(inspector, table):
+            with op.batch_alter_table(table, schema=None) as batch_op:
+                batch_op.drop_constraint(name, type_='unique')
+
+    for table, name, _ in INDEXES:
+        if table in tables and name in _existing(inspector, table):
+            op.drop_index(name, table_name=table)
@@ -12,6 +12,10 @@ from .vacate_notice import VacateNotice, VACATE_STATUSES
 from .property_image import PropertyImage
 from .rent_deposit import RentRecord, DepositRecord, RentStatus, DepositStatus
 from .water_bill import WaterBill, WaterBillStatus
+from .monthly_ledger import MonthlyLedger, LEDGER_STREAMS
+from .revoked_token import RevokedToken
+from .payment_job import PaymentJob, JOB_KINDS, JOB_STATUSES
+from .mpesa_inbox import MpesaInboxMessage, INBOX_KINDS, INBOX_STATUSES
 
 __all__ = [
     'db',
@@ -31,6 +35,10 @@ __all__ = [
     'RentRecord',
     'DepositRecord',
     'WaterBill',
+    'MonthlyLedger',
+    'RevokedToken',
+    'PaymentJob',
+    'MpesaInboxMessage',
 
     'USER_ROLES',
     'PROPERTY_TYPES',
@@ -45,4 +53,9 @@ __all__ = [
     'RentStatus',
     'DepositStatus',
     'WaterBillStatus',
+    'LEDGER_STREAMS',
+    'JOB_KINDS',
+    'JOB_STATUSES',
+    'INBOX_KINDS',
+    'INBOX_STATUSES',
 ]
\ No newline at end of file
@@ -1,8 +1,54 @@
+from contextlib import contextmanager
 from datetime import datetime, timezone
 from flask_sqlalchemy import SQLAlchemy
+from flask_sqlalchemy.session import Session
+from sqlalchemy import Select, event
 from sqlalchemy_serializer import SerializerMixin
 
-db = SQLAlchemy()
+# Bind key of the optional read replica (SQLALCHEMY_REPLICA_URI)
+REPLICA_BIND = "replica"
+
+
+class RoutingSession(Session):
+    """
+    Session that sends SELECTs to the read replica while session.info["use_replica"]
+    is set (read-only requests) and nothing has been written yet. Flushes, DML and
+    everything after the first write in the session go to the primary.
+    """
+
+    def get_bind(self, mapper=None, clause=None, bind=None, **kwargs):
+        if bind is None and self.info.get("use_replica") and not self.info.get("wrote"):
+            if self._flushing or not isinstance(clause, Select):
+                if clause is not None and clause.is_dml:
+                    self.info["wrote"] = True
+            else:
+                replica = self._db.engines.get(REPLICA_BIND)
+                if replica is not None:
+                    return replica
+        return super().get_bind(mapper=mapper, clause=clause, bind=bind, **kwargs)
+
+
+@event.listens_for(RoutingSession, "before_flush")
+def _pin_to_primary(session, flush_context, instances):
+    session.info["wrote"] = True
+
+
+db = SQLAlchemy(session_options={"class_": RoutingSession})
+
+
+@contextmanager
+def read_from_primary():
+    """
+    Send the enclosed reads to the primary even in a read-only request, for
+    checks that must not see replica lag (e.g. token revocation).
+    """
+    session = db.session()
+    use_replica = session.info.pop("use_replica", None)
+    try:
+        yield
+    finally:
+        if use_replica:
+            session.info["use_replica"] = use_replica
 
 class BaseModel(db.Model):
     __abstract__ = True
@@ -10,6 +10,10 @@ LEASE_STATUSES = ("active", "terminated", "expired")
 
 class Lease(BaseModel, SerializerMixin):
     __tablename__ = 'leases'
+    __table_args__ = (
+        db.Index('ix_leases_tenant_id_status', 'tenant_id', 'status'),
+        db.Index('ix_leases_property_id_status', 'property_id', 'status'),
+    )
 
     tenant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     property_id = db.Column(db.Integer, db.ForeignKey('properties.id'), nullable=False)
@@ -10,6 +10,9 @@ MAINTENANCE_PRIORITIES = ("low", "normal", "high", "urgent")
 
 class MaintenanceRequest(BaseModel, SerializerMixin):
     __tablename__ = 'maintenance_requests'
+    __table_args__ = (
+        db.Index('ix_maintenance_requests_reported_by_id_status', 'reported_by_id', 'status'),
+    )
 
     title = db.Column(db.String(100), nullable=False)
     description = db.Column(db.Text, nullable=False)
@@ -0,0 +1,358 @@
+from collections import defaultdict
+from datetime import datetime, timezone
+from sqlalchemy import Column, Integer, String, ForeignKey, Numeric, Enum, UniqueConstraint, Index
+from sqlalchemy import event, func, inspect, select, update, insert
+from sqlalchemy.orm import Session
+from .base import db, BaseModel
+from .lease import Lease
+from .payment import Payment
+from .rent_deposit import RentRecord, DepositRecord
+from .water_bill import WaterBill
+
+LEDGER_STREAMS = ("rent", "deposit", "water", "payment")
+
+# Payment statuses that count as money received
+PAID_PAYMENT_STATUSES = ("paid", "completed")
+
+LEDGER_AMOUNTS = ("record_count", "amount_due", "amount_paid", "amount_refunded", "balance")
+
+
+class MonthlyLedger(BaseModel):
+    """
+    Pre-aggregated money totals per (property, tenant, year, month, stream).
+    Rows are kept in step with rent, deposit, water bill and payment changes
+    by the flush hook below; `rebuild()` recomputes them from scratch.
+    """
+    __tablename__ = 'monthly_ledger'
+    __table_args__ = (
+        UniqueConstraint('property_id', 'tenant_id', 'year', 'month', 'stream', name='uq_monthly_ledger_key'),
+        Index('ix_monthly_ledger_stream_period', 'stream', 'year', 'month'),
+    )
+
+    property_id = Column(Integer, ForeignKey('properties.id'), nullable=True)
+    tenant_id = Column(Integer, ForeignKey('users.id'), nullable=False)
+    year = Column(Integer, nullable=False)
+    month = Column(Integer, nullable=False)
+    stream = Column(Enum(*LEDGER_STREAMS, name='ledger_stream_enum'), nullable=False)
+
+    record_count = Column(Integer, nullable=False, default=0)
+    amount_due = Column(Numeric(12, 2), nullable=False, default=0)
+    amount_paid = Column(Numeric(12, 2), nullable=False, default=0)
+    amount_refunded = Column(Numeric(12, 2), nullable=False, default=0)
+    balance = Column(Numeric(12, 2), nullable=False, default=0)
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'property_id': self.property_id,
+            'tenant_id': self.tenant_id,
+            'year': self.year,
+            'month': self.month,
+            'stream': self.stream,
+            'record_count': self.record_count,
+            'amount_due': float(self.amount_due or 0),
+            'amount_paid': float(self.amount_paid or 0),
+            'amount_refunded': float(self.amount_refunded or 0),
+            'balance': float(self.balance or 0)
+        }
+
+    @staticmethod
+    def totals(stream, year=None, month=None, since=None):
+        """
+        Sum ledger rows for a stream, optionally for one month or from a
+        (year, month) onwards. Returns a dict of the summed amounts.
+        """
+        query = db.session.query(
+            func.coalesce(func.sum(MonthlyLedger.record_count), 0),
+            func.coalesce(func.sum(MonthlyLedger.amount_due), 0),
+            func.coalesce(func.sum(MonthlyLedger.amount_paid), 0),
+            func.coalesce(func.sum(MonthlyLedger.amount_refunded), 0),
+            func.coalesce(func.sum(MonthlyLedger.balance), 0)
+        ).filter(MonthlyLedger.stream == stream)
+
+        if year is not None:
+            query = query.filter(MonthlyLedger.year == year)
+        if month is not None:
+            query = query.filter(MonthlyLedger.month == month)
+        if since is not None:
+            since_year, since_month = since
+            query = query.filter(MonthlyLedger.year * 12 + MonthlyLedger.month >= since_year * 12 + since_month)
+
+        count, due, paid, refunded, balance = query.one()
+        return {
+            'record_count': int(count),
+            'amount_due': float(due),
+            'amount_paid': float(paid),
+            'amount_refunded': float(refunded),
+            'balance': float(balance)
+        }
+
+    @staticmethod
+    def monthly(stream, since):
+        """Per-month totals for a stream from (year, month) onwards: {(year, month): totals}."""
+        since_year, since_month = since
+        rows = db.session.query(
+            MonthlyLedger.year,
+            MonthlyLedger.month,
+            func.coalesce(func.sum(MonthlyLedger.record_count), 0),
+            func.coalesce(func.sum(MonthlyLedger.amount_paid), 0)
+        ).filter(
+            MonthlyLedger.stream == stream,
+            MonthlyLedger.year * 12 + MonthlyLedger.month >= since_year * 12 + since_month
+        ).group_by(MonthlyLedger.year, MonthlyLedger.month).all()
+
+        return {
+            (year, month): {'record_count': int(count), 'amount_paid': float(paid)}
+            for year, month, count, paid in rows
+        }
+
+    @staticmethod
+    def rebuild():
+        """Recompute the whole ledger from rent, deposit, water bill and payment rows."""
+        deltas = defaultdict(lambda: dict.fromkeys(LEDGER_AMOUNTS, 0))
+        lease_properties = dict(db.session.query(Lease.id, Lease.property_id).all())
+
+        for model in (RentRecord, DepositRecord, WaterBill, Payment):
+            for record in db.session.query(model).yield_per(500):
+                key, amounts = _contribution(record, _current_state(record), lease_properties)
+                if key is None:
+                    continue
+                for name, value in amounts.items():
+                    deltas[key][name] += value
+
+        db.session.query(MonthlyLedger).delete(synchronize_session=False)
+        now = datetime.now(timezone.utc)
+        rows = [
+            dict(zip(('property_id', 'tenant_id', 'year', 'month', 'stream'), key),
+                 created_at=now, updated_at=now, **amounts)
+            for key, amounts in deltas.items()
+        ]
+        if rows:
+            db.session.execute(insert(MonthlyLedger), rows)
+        db.session.commit()
+        return len(rows)
+
+
+# ---------------------------------------------------------------------------
+# Incremental maintenance
+# ---------------------------------------------------------------------------
+
+_TRACKED_FIELDS = {
+    RentRecord: ('tenant_id', 'property_id', 'year', 'month', 'amount_due', 'amount_paid', 'balance'),
+    DepositRecord: ('tenant_id', 'property_id', 'created_at', 'amount_required', 'amount_paid', 'refund_amount', 'balance'),
+    WaterBill: ('tenant_id', 'property_id', 'year', 'month', 'amount_due', 'amount_paid', 'balance'),
+    Payment: ('tenant_id', 'lease_id', 'status', 'amount', 'payment_date', 'created_at'),
+}
+
+
+def _as_float(value):
+    return float(value) if value is not None else 0.0
+
+
+def _current_state(record):
+    return {field: getattr(record, field) for field in _TRACKED_FIELDS[type(record)]}
+
+
+def _previous_state(record):
+    """Committed values of the tracked fields, taken from attribute history."""
+    state = inspect(record)
+    previous = {}
+    for field in _TRACKED_FIELDS[type(record)]:
+        history = state.attrs[field].history
+        if history.deleted:
+            previous[field] = history.deleted[0]
+        elif history.unchanged:
+            previous[field] = history.unchanged[0]
+        else:
+            previous[field] = getattr(record, field)
+    return previous
+
+
+def _contribution(record, values, lease_properties):
+    """Ledger key and amounts a record contributes in the given state."""
+    if isinstance(record, RentRecord):
+        stream = 'rent'
+        year, month = values['year'], values['month']
+        amounts = {
+            'amount_due': _as_float(values['amount_due']),
+            'amount_paid': _as_float(values['amount_paid']),
+            'amount_refunded': 0.0,
+            'balance': _as_float(values['balance'])
+        }
+        property_id = values['property_id']
+    elif isinstance(record, WaterBill):
+        stream = 'water'
+        year, month = values['year'], values['month']
+        amounts = {
+            'amount_due': _as_float(values['amount_due']),
+            'amount_paid': _as_float(values['amount_paid']),
+            'amount_refunded': 0.0,
+            'balance': _as_float(values['balance'])
+        }
+        property_id = values['property_id']
+    elif isinstance(record, DepositRecord):
+        stream = 'deposit'
+        created_at = values['created_at'] or datetime.now(timezone.utc)
+        year, month = created_at.year, created_at.month
+        amounts = {
+            'amount_due': _as_float(values['amount_required']),
+            'amount_paid': _as_float(values['amount_paid']),
+            'amount_refunded': _as_float(values['refund_amount']),
+            'balance': _as_float(values['balance'])
+        }
+        property_id = values['property_id']
+    else:
+        stream = 'payment'
+        when = values['payment_date'] or values['created_at'] or datetime.now(timezone.utc)
+        year, month = when.year, when.month
+        amount = _as_float(values['amount'])
+        amounts = {
+            'amount_due': 0.0,
+            'amount_paid': amount if values['status'] in PAID_PAYMENT_STATUSES else 0.0,
+            'amount_refunded': amount if values['status'] == 'refunded' else 0.0,
+            'balance': 0.0
+        }
+        property_id = lease_properties.get(values['lease_id'])
+
+    if values['tenant_id'] is None or year is None or month is None:
+        return None, None
+
+    amounts['record_count'] = 1
+    return (property_id, values['tenant_id'], year, month, stream), amounts
+
+
+def _upsert_statement(connection):
+    """INSERT ... ON CONFLICT (key) DO UPDATE for dialects that have it, else None."""
+    if connection.dialect.name == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert as dialect_insert
+    elif connection.dialect.name == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert as dialect_insert
+    else:
+        return None
+    return dialect_insert(MonthlyLedger.__table__)
+
+
+def apply_ledger_deltas(connection, deltas):
+    """
+    Add {key: {amount: delta}} to ledger rows with SET x = x + delta, inserting
+    rows that do not exist yet. On SQLite and PostgreSQL this is a single
+    INSERT ... ON CONFLICT DO UPDATE, so two transactions creating the same
+    row at once both land instead of one failing on the unique key.
+    """
+    table = MonthlyLedger.__table__
+    now = datetime.now(timezone.utc)
+    upsert = _upsert_statement(connection)
+
+    for (property_id, tenant_id, year, month, stream), amounts in deltas.items():
+        if not any(amounts.values()):
+            continue
+
+        row = dict(
+            property_id=property_id,
+            tenant_id=tenant_id,
+            year=year,
+            month=month,
+            stream=stream,
+            created_at=now,
+            updated_at=now,
+            **amounts
+        )
+        # NULLs never conflict on the unique key, so property-less rows take the slow path
+        if upsert is not None and property_id is not None:
+            statement = upsert.values(**row)
+            connection.execute(statement.on_conflict_do_update(
+                index_elements=['property_id', 'tenant_id', 'year', 'month', 'stream'],
+                set_={
+                    'updated_at': now,
+                    **{name: table.c[name] + statement.excluded[name] for name in amounts}
+                }
+            ))
+            continue
+
+        key_clause = [
+            table.c.property_id == property_id if property_id is not None else table.c.property_id.is_(None),
+            table.c.tenant_id == tenant_id,
+            table.c.year == year,
+            table.c.month == month,
+            table.c.stream == stream
+        ]
+        result = connection.execute(
+            update(table).where(*key_clause).values(
+                updated_at=now,
+                **{name: table.c[name] + value for name, value in amounts.items()}
+            )
+        )
+        if result.rowcount == 0:
+            connection.execute(insert(table).values(**row))
+
+
+def apply_bulk_rows(connection, stream, rows):
+    """
+    Fold rows written with bulk INSERT/UPDATE (which bypass the flush hook)
+    into the ledger. Each row needs property_id, tenant_id, year, month and
+    the amount fields; pass negative amounts to back a row out.
+    """
+    deltas = defaultdict(lambda: dict.fromkeys(LEDGER_AMOUNTS, 0))
+    for row in rows:
+        key = (row['property_id'], row['tenant_id'], row['year'], row['month'], stream)
+        for name in LEDGER_AMOUNTS:
+            deltas[key][name] += _as_float(row.get(name, 1 if name == 'record_count' else 0))
+    apply_ledger_deltas(connection, deltas)
+
+
+def _lease_properties(connection, lease_ids):
+    lease_ids = {lease_id for lease_id in lease_ids if lease_id is not None}
+    if not lease_ids:
+        return {}
+    rows = connection.execute(select(Lease.id, Lease.property_id).where(Lease.id.in_(lease_ids)))
+    return dict(rows.all())
+
+
+@event.listens_for(Session, 'after_flush')
+def _update_monthly_ledger(session, flush_context):
+    """Fold money changes from this flush into the ledger in the same transaction."""
+    changes = []
+    for record in session.new:
+        if type(record) in _TRACKED_FIELDS:
+            changes.append((record, None, _current_state(record)))
+    for record in session.dirty:
+        if type(record) in _TRACKED_FIELDS and session.is_modified(record, include_collections=False):
+            changes.append((record, _previous_state(record), _current_state(record)))
+    for record in session.deleted:
+        if type(record) in _TRACKED_FIELDS:
+            changes.append((record, _previous_state(record), None))
+
+    if not changes:
+        return
+
+    connection = session.connection()
+    lease_properties = _lease_properties(connection, [
+        state['lease_id']
+        for _, before, after in changes
+        for state in (before, after)
+        if state and 'lease_id' in state
+    ])
+
+    deltas = defaultdict(lambda: dict.fromkeys(LEDGER_AMOUNTS, 0))
+    for record, before, after in changes:
+        for values, sign in ((before, -1), (after, 1)):
+            if values is None:
+                continue
+            key, amounts = _contribution(record, values, lease_properties)
+            if key is None:
+                continue
+            for name, value in amounts.items():
+                deltas[key][name] += sign * value
+
+    apply_ledger_deltas(connection, deltas)
+
+
+def _track_old_value(target, value, oldvalue, initiator):
+    return value
+
+
+# Load the committed value before money fields are overwritten so the flush
+# hook can compute deltas even when the attribute was expired.
+for _model, _fields in _TRACKED_FIELDS.items():
+    for _field in _fields:
+        event.listen(getattr(_model, _field), 'set', _track_old_value, active_history=True, retval=True)
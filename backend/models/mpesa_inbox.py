@@ -0,0 +1,28 @@
+from .base import BaseModel, db
+
+INBOX_KINDS = ['stk_callback', 'c2b_confirmation']
+INBOX_STATUSES = ['received', 'applied', 'ignored', 'error']
+
+
+class MpesaInboxMessage(BaseModel):
+    """
+    A raw M-Pesa notification (STK callback or C2B confirmation), stored as
+    received before anything is done with it. The unique (kind, transaction_id)
+    key turns gateway retries into no-ops; the payload is never modified and
+    only the processing columns change once the message has been applied.
+    """
+    __tablename__ = 'mpesa_inbox'
+    __table_args__ = (
+        db.UniqueConstraint('kind', 'transaction_id', name='uq_mpesa_inbox_kind_transaction_id'),
+        db.Index('ix_mpesa_inbox_status_id', 'status', 'id'),
+    )
+
+    kind = db.Column(db.String(30), nullable=False)
+    transaction_id = db.Column(db.String(100), nullable=False)  # CheckoutRequestID or TransID
+    payload = db.Column(db.JSON, nullable=False)
+    status = db.Column(db.String(20), nullable=False, default='received')
+    processed_at = db.Column(db.DateTime(timezone=True))
+    note = db.Column(db.Text)  # Why it was ignored, or what went wrong
+
+    def __repr__(self):
+        return f'<MpesaInboxMessage {self.kind} {self.transaction_id} {self.status}>'
@@ -9,6 +9,9 @@ NOTIFICATION_TYPES = ("general", "urgent", "maintenance", "payment", "lease", "s
 
 class Notification(BaseModel, SerializerMixin):
     __tablename__ = "notifications"
+    __table_args__ = (
+        db.Index('ix_notifications_user_id_is_read_created_at', 'user_id', 'is_read', 'created_at'),
+    )
 
     user_id = db.Column(db.Integer, db.ForeignKey("users.id"), nullable=False)
     title = db.Column(db.String(200), nullable=False)
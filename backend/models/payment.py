@@ -6,6 +6,10 @@ PAYMENT_STATUSES = ['pending', 'completed', 'failed', 'refunded', 'cancelled', '
 
 class Payment(BaseModel, SerializerMixin):
     __tablename__ = 'payments'
+    __table_args__ = (
+        db.Index('ix_payments_lease_id_status_payment_date', 'lease_id', 'status', 'payment_date'),
+        db.Index('ix_payments_lease_id_created_at', 'lease_id', 'created_at'),
+    )
     
     tenant_id = db.Column(db.Integer, db.ForeignKey('users.id'), nullable=False)
     lease_id = db.Column(db.Integer, db.ForeignKey('leases.id'), nullable=True)
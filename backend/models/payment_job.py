@@ -0,0 +1,83 @@
+from datetime import datetime, timedelta, timezone
+from sqlalchemy import case, or_, select, update
+from .base import BaseModel, db
+
+JOB_KINDS = ['stk_push']
+JOB_STATUSES = ['queued', 'running', 'succeeded', 'failed']
+
+# last_error of a job reclaimed from a runner that stopped while it was running
+INTERRUPTED_ERROR = "Interrupted while sending; not resent to avoid a second prompt"
+
+
+class PaymentJob(BaseModel):
+    """
+    A unit of payment-gateway work (an STK push) done outside the request that
+    asked for it. Rows are claimed by one worker at a time; finished rows stay
+    as a record of what was sent and what came back.
+    """
+    __tablename__ = 'payment_jobs'
+    __table_args__ = (
+        db.Index('ix_payment_jobs_status_run_after', 'status', 'run_after'),
+    )
+
+    kind = db.Column(db.String(30), nullable=False, default='stk_push')
+    payment_id = db.Column(db.Integer, db.ForeignKey('payments.id'), nullable=False, index=True)
+    status = db.Column(db.String(20), nullable=False, default='queued')
+    payload = db.Column(db.JSON, nullable=False)
+    result = db.Column(db.JSON)
+    attempts = db.Column(db.Integer, nullable=False, default=0)
+    max_attempts = db.Column(db.Integer, nullable=False, default=3)
+    run_after = db.Column(db.DateTime(timezone=True), nullable=False, default=lambda: datetime.now(timezone.utc))
+    locked_by = db.Column(db.String(64))
+    locked_at = db.Column(db.DateTime(timezone=True))
+    last_error = db.Column(db.Text)
+
+    payment = db.relationship('Payment', foreign_keys=[payment_id])
+
+    @staticmethod
+    def claim_next(worker_id, lease_seconds):
+        """
+        Atomically mark the next due job as running for this worker and return
+        its id, or None. A job left running longer than lease_seconds by a
+        worker that died counts as due again; it is claimed with last_error set
+        to INTERRUPTED_ERROR, and any earlier error is cleared otherwise.
+        """
+        now = datetime.now(timezone.utc)
+        table = PaymentJob.__table__
+        candidate = select(table.c.id).where(
+            or_(
+                (table.c.status == 'queued') & (table.c.run_after <= now),
+                (table.c.status == 'running') & (table.c.locked_at < now - timedelta(seconds=lease_seconds))
+            )
+        ).order_by(table.c.run_after, table.c.id).limit(1)
+        if db.engine.dialect.name == 'postgresql':
+            candidate = candidate.with_for_update(skip_locked=True)
+
+        job_id = db.session.execute(
+            update(table).where(table.c.id == candidate.scalar_subquery()).values(
+                status='running',
+                locked_by=worker_id,
+                locked_at=now,
+                attempts=table.c.attempts + 1,
+                last_error=case((table.c.status == 'running', INTERRUPTED_ERROR), else_=None),
+                updated_at=now
+            ).returning(table.c.id)
+        ).scalar()
+        db.session.commit()
+        return job_id
+
+    def to_dict(self):
+        return {
+            'id': self.id,
+            'kind': self.kind,
+            'payment_id': self.payment_id,
+            'status': self.status,
+            'attempts': self.attempts,
+            'checkout_request_id': (self.result or {}).get('CheckoutRequestID'),
+            'error': self.last_error if self.status == 'failed' else None,
+            'created_at': self.created_at.isoformat() if self.created_at else None,
+            'updated_at': self.updated_at.isoformat() if self.updated_at else None
+        }
+
+    def __repr__(self):
+        return f'<PaymentJob {self.id}: {self.kind} {self.status}>'
@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Numeric, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Numeric, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .base import db, BaseModel
 import enum
@@ -21,6 +21,9 @@ class DepositStatus(enum.Enum):
 
 class RentRecord(BaseModel):
     __tablename__ = 'rent_records'
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'year', 'month', name='uq_rent_records_tenant_id_year_month'),
+    )
 
     tenant_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     property_id = Column(Integer, ForeignKey('properties.id'), nullable=False)
@@ -0,0 +1,22 @@
+from datetime import datetime, timezone
+from .base import BaseModel, db
+
+
+class RevokedToken(BaseModel):
+    """
+    A revoked JWT, keyed by its jti claim. Rows only matter until the token
+    would have expired anyway and are pruned after `expires_at`.
+    """
+    __tablename__ = "revoked_tokens"
+
+    jti = db.Column(db.String(64), nullable=False, unique=True)
+    expires_at = db.Column(db.DateTime(timezone=True), nullable=False, index=True)
+
+    @staticmethod
+    def prune(now=None):
+        """Delete revocations whose tokens have expired; returns the number removed."""
+        now = now or datetime.now(timezone.utc)
+        return RevokedToken.query.filter(RevokedToken.expires_at <= now).delete(synchronize_session=False)
+
+    def __repr__(self):
+        return f"<RevokedToken {self.jti}>"
@@ -12,6 +12,10 @@ USER_ROLES = ("tenant", "caretaker", "admin", "landlord")
 
 class User(BaseModel, SerializerMixin):
     __tablename__ = "users"
+    __table_args__ = (
+        db.Index('ix_users_role_is_active', 'role', 'is_active'),
+        db.Index('ix_users_room_number', 'room_number'),
+    )
 
     public_id = db.Column(db.String(50), unique=True, nullable=False, default=lambda: str(uuid.uuid4()))
     username = db.Column(db.String(100), unique=True, nullable=False)
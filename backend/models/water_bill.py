@@ -1,5 +1,5 @@
 from datetime import datetime, timezone
-from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Numeric, Enum
+from sqlalchemy import Column, Integer, String, Text, DateTime, Boolean, ForeignKey, Numeric, Enum, UniqueConstraint
 from sqlalchemy.orm import relationship
 from .base import db, BaseModel
 import enum
@@ -14,6 +14,9 @@ class WaterBillStatus(enum.Enum):
 
 class WaterBill(BaseModel):
     __tablename__ = 'water_bills'
+    __table_args__ = (
+        UniqueConstraint('tenant_id', 'year', 'month', name='uq_water_bills_tenant_id_year_month'),
+    )
 
     tenant_id = Column(Integer, ForeignKey('users.id'), nullable=False)
     property_id = Column(Integer, ForeignKey('properties.id'), nullable=False)
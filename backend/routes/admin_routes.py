@@ -9,11 +9,10 @@ Handles admin-specific operations:
 - Vacate notices management
 """
 
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from functools import wraps
 from datetime import datetime, timedelta, timezone
 from sqlalchemy import func, or_
-import traceback
 
 from models.base import db
 from models.user import User
@@ -25,8 +24,26 @@ from models.maintenance import MaintenanceRequest
 from models.notification import Notification
 from models.vacate_notice import VacateNotice
 from models.payment import Payment
-from routes.auth_routes import token_required
-from utils.finance import calculate_outstanding_balance
+from models.monthly_ledger import MonthlyLedger
+from routes.auth_routes import token_required, get_current_user
+from utils.finance import (
+    calculate_outstanding_balance,
+    calculate_outstanding_balances,
+    get_active_leases_by_tenant
+)
+from utils.db_engine import pool_metrics
+from utils.stats import (
+    deposit_monthly_trend,
+    deposit_summary,
+    lease_stats,
+    maintenance_stats,
+    payment_stats,
+    property_stats,
+    tenant_stats,
+    vacate_notice_stats,
+    water_bill_monthly_trend,
+    water_bill_summary
+)
 
 admin_bp = Blueprint("admin", __name__, url_prefix="/api/admin")
 
@@ -72,22 +89,26 @@ def handle_all_admin_options(path):
 def get_dashboard_stats():
     """Get dashboard statistics for admin"""
     try:
-        total_properties = Property.query.count()
-        vacant_properties = Property.query.filter_by(status='vacant').count()
-        reserved_properties = Property.query.filter_by(status='reserved').count()
-        occupied_properties = Property.query.filter_by(status='occupied').count()
+        properties = property_stats()
+        total_properties = properties['total']
+        vacant_properties = properties['vacant']
+        reserved_properties = properties['reserved']
+        occupied_properties = properties['occupied']
         
-        total_tenants = User.query.filter_by(role='tenant').count()
-        active_tenants = User.query.filter_by(role='tenant', is_active=True).count()
+        tenants = tenant_stats()
+        total_tenants = tenants['total']
+        active_tenants = tenants['active']
         
-        total_payments = Payment.query.count()
-        total_payments_amount = db.session.query(func.sum(Payment.amount)).filter_by(status='completed').scalar() or 0
-        pending_payments = Payment.query.filter_by(status='pending').count()
+        payments = payment_stats()
+        total_payments = payments['total_count']
+        total_payments_amount = payments['by_status'].get('completed', {}).get('amount', 0)
+        pending_payments = payments['by_status'].get('pending', {}).get('count', 0)
         
-        pending_maintenance = MaintenanceRequest.query.filter_by(status='pending').count()
+        pending_maintenance = maintenance_stats()['pending']
         
-        pending_vacate_notices = VacateNotice.query.filter_by(status='pending').count()
-        approved_vacate_notices = VacateNotice.query.filter_by(status='approved').count()
+        vacate_notices = vacate_notice_stats()
+        pending_vacate_notices = vacate_notices['pending']
+        approved_vacate_notices = vacate_notices['approved']
         
         recent_payments = Payment.query\
             .join(Lease, Payment.lease_id == Lease.id)\
@@ -165,8 +186,7 @@ def get_dashboard_stats():
         }), 200
         
     except Exception as e:
-        print(f"Error in get_dashboard_stats: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_dashboard_stats: {str(e)}")
         return jsonify({
             'success': False,
             'error': 'Server Error',
@@ -213,8 +233,7 @@ def get_admin_overview():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_admin_overview: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_admin_overview: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Overview error",
@@ -227,26 +246,15 @@ def get_financial_summary():
     """Get financial summary for admin dashboard."""
     try:
         today = datetime.now(timezone.utc).date()
-        first_day_of_month = today.replace(day=1)
-        last_day_of_month = (first_day_of_month.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
         
-        monthly_payments = db.session.query(func.sum(Payment.amount))\
-            .filter(
-                Payment.created_at >= first_day_of_month,
-                Payment.created_at <= last_day_of_month,
-                Payment.status == 'completed'
-            ).scalar() or 0
+        monthly_payments = MonthlyLedger.totals('payment', year=today.year, month=today.month)['amount_paid']
         
-        active_leases = Lease.query.filter_by(status='active').all()
-        total_monthly_rent = sum([float(lease.rent_amount or 0) for lease in active_leases])
+        total_monthly_rent = db.session.query(func.coalesce(func.sum(Lease.rent_amount), 0))\
+            .filter(Lease.status == 'active').scalar() or 0
         
-        outstanding_rent = max(0, total_monthly_rent - float(monthly_payments))
+        outstanding_rent = max(0, float(total_monthly_rent) - float(monthly_payments))
         
-        deposit_payments = db.session.query(func.sum(Payment.amount))\
-            .filter(
-                Payment.payment_type == 'deposit',
-                Payment.status == 'completed'
-            ).scalar() or 0
+        deposit_payments = MonthlyLedger.totals('deposit')['amount_paid']
         
         return jsonify({
             "success": True,
@@ -259,8 +267,7 @@ def get_financial_summary():
         }), 200
         
     except Exception as e:
-        print(f"Error in get_financial_summary: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_financial_summary: {str(e)}")
         return jsonify({
             "success": False,
             "error": "Server Error",
@@ -280,12 +287,12 @@ def get_all_tenants():
         
         pagination = tenants_query.paginate(page=page, per_page=per_page, error_out=False)
         
+        leases_by_tenant = get_active_leases_by_tenant([t.id for t in pagination.items])
+        balances = calculate_outstanding_balances(leases_by_tenant.values())
+        
         tenants_list = []
         for tenant in pagination.items:
-            current_lease = Lease.query.filter_by(
-                tenant_id=tenant.id, 
-                status='active'
-            ).first()
+            current_lease = leases_by_tenant.get(tenant.id)
             
             tenants_list.append({
                 "id": tenant.id,
@@ -297,7 +304,7 @@ def get_all_tenants():
                 "is_active": tenant.is_active,
                 "property": current_lease.property.name if current_lease and current_lease.property else None,
                 "rent_amount": float(current_lease.rent_amount) if current_lease and current_lease.rent_amount else 0,
-                "outstanding_balance": calculate_outstanding_balance(current_lease),
+                "outstanding_balance": balances.get(current_lease.id, 0.0) if current_lease else 0.0,
                 "created_at": tenant.created_at.isoformat() if tenant.created_at else None
             })
         
@@ -315,8 +322,7 @@ def get_all_tenants():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_all_tenants: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_all_tenants: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to get tenants",
@@ -333,7 +339,7 @@ def get_tenant_details(tenant_id):
         if not tenant:
             return jsonify({"success": False, "error": "Tenant not found"}), 404
         
-        lease = Lease.query.filter_by(tenant_id=tenant_id, status='active').first()
+        lease = get_active_leases_by_tenant([tenant_id]).get(tenant_id)
         
         payments = []
         if lease:
@@ -417,8 +423,7 @@ def get_tenant_details(tenant_id):
         }), 200
 
     except Exception as e:
-        print(f"Error in get_tenant_details: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_tenant_details: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to get tenant details",
@@ -487,8 +492,7 @@ def create_tenant():
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in create_tenant: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in create_tenant: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to create tenant",
@@ -538,8 +542,7 @@ def update_tenant(tenant_id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_tenant: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in update_tenant: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to update tenant",
@@ -580,8 +583,6 @@ def delete_tenant(tenant_id):
             except Exception as e:
                 db.session.rollback()
                 current_app.logger.error(f"Failed to terminate lease: {str(e)}")
-                import traceback
-                current_app.logger.error(f"Traceback: {traceback.format_exc()}")
                 return jsonify({
                     "success": False,
                     "error": f"Failed to terminate lease: {str(e)}"
@@ -633,8 +634,6 @@ def delete_tenant(tenant_id):
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error in delete_tenant: {str(e)}")
-        import traceback
-        current_app.logger.error(f"Traceback: {traceback.format_exc()}")
         return jsonify({
             "success": False, 
             "error": "Failed to delete tenant",
@@ -686,8 +685,7 @@ def get_all_contracts():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_all_contracts: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_all_contracts: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to get contracts",
@@ -769,8 +767,7 @@ def get_all_properties():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_all_properties: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_all_properties: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to get properties",
@@ -833,8 +830,7 @@ def get_all_maintenance():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_all_maintenance: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_all_maintenance: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to get maintenance requests",
@@ -847,13 +843,14 @@ def get_all_maintenance():
 def get_payment_report():
     """Generate payment report."""
     try:
-        total_payments = Payment.query.count()
-        successful_payments = Payment.query.filter(Payment.status.in_(['paid', 'completed'])).count()
-        pending_payments = Payment.query.filter(Payment.status.in_(['pending', 'unpaid'])).count()
-        failed_payments = Payment.query.filter_by(status='failed').count()
+        payments = payment_stats()
+        by_status = payments['by_status']
+        total_payments = payments['total_count']
+        successful_payments = sum(by_status.get(status, {}).get('count', 0) for status in ('paid', 'completed'))
+        pending_payments = sum(by_status.get(status, {}).get('count', 0) for status in ('pending', 'unpaid'))
+        failed_payments = by_status.get('failed', {}).get('count', 0)
         
-        total_amount = db.session.query(func.sum(Payment.amount))\
-            .filter(Payment.status.in_(['paid', 'completed'])).scalar() or 0
+        total_amount = sum(by_status.get(status, {}).get('amount', 0) for status in ('paid', 'completed'))
         
         recent = Payment.query\
             .join(Lease, Payment.lease_id == Lease.id)\
@@ -876,21 +873,18 @@ def get_payment_report():
                 'created_at': payment.created_at.isoformat() if payment.created_at else None
             })
         
+        now = datetime.now(timezone.utc)
+        months = [
+            ((now.year * 12 + now.month - 1 - i) // 12, (now.year * 12 + now.month - 1 - i) % 12 + 1)
+            for i in range(5, -1, -1)
+        ]
+        monthly_totals = MonthlyLedger.monthly('payment', since=months[0])
+        
         monthly_data = []
-        for i in range(5, -1, -1):
-            month_start = datetime.now(timezone.utc).replace(day=1) - timedelta(days=30*i)
-            month_end = (month_start.replace(day=28) + timedelta(days=4)).replace(day=1) - timedelta(days=1)
-            
-            month_total = db.session.query(func.sum(Payment.amount))\
-                .filter(
-                    Payment.created_at >= month_start,
-                    Payment.created_at <= month_end,
-                    Payment.status.in_(['paid', 'completed'])
-                ).scalar() or 0
-            
+        for year, month in months:
             monthly_data.append({
-                'month': month_start.strftime('%b %Y'),
-                'total': float(month_total)
+                'month': datetime(year, month, 1).strftime('%b %Y'),
+                'total': monthly_totals.get((year, month), {}).get('amount_paid', 0.0)
             })
         
         return jsonify({
@@ -907,8 +901,7 @@ def get_payment_report():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_payment_report: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_payment_report: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to generate report",
@@ -920,39 +913,28 @@ def get_payment_report():
 def get_occupancy_report():
     """Generate occupancy report."""
     try:
-        total_properties = Property.query.count()
-        active_leases = Lease.query.filter_by(status='active').count()
+        properties = property_stats()
+        total_properties = properties['total']
+        active_leases = lease_stats().get('active', 0)
         occupied_properties = active_leases
         vacant_properties = total_properties - occupied_properties
         
         occupancy_rate = (occupied_properties / total_properties * 100) if total_properties > 0 else 0
         
-        bedsitter_occupied = Property.query.filter_by(
-            property_type='bedsitter',
-            status='occupied'
-        ).count()
-        
-        bedsitter_vacant = Property.query.filter_by(
-            property_type='bedsitter',
-            status='vacant'
-        ).count()
+        bedsitter = properties['by_type'].get('bedsitter', {})
+        bedsitter_occupied = bedsitter.get('occupied', 0)
+        bedsitter_vacant = bedsitter.get('vacant', 0)
         
-        one_bedroom_occupied = Property.query.filter_by(
-            property_type='one_bedroom',
-            status='occupied'
-        ).count()
-        
-        one_bedroom_vacant = Property.query.filter_by(
-            property_type='one_bedroom',
-            status='vacant'
-        ).count()
+        one_bedroom = properties['by_type'].get('one_bedroom', {})
+        one_bedroom_occupied = one_bedroom.get('occupied', 0)
+        one_bedroom_vacant = one_bedroom.get('vacant', 0)
         
         return jsonify({
             "success": True,
             "report": {
                 "total_properties": total_properties,
                 "occupied": occupied_properties,
-                "reserved": Property.query.filter_by(status='reserved').count(),
+                "reserved": properties['reserved'],
                 "vacant": vacant_properties,
                 "active_leases": active_leases,
                 "occupancy_rate": round(occupancy_rate, 2),
@@ -972,8 +954,7 @@ def get_occupancy_report():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_occupancy_report: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_occupancy_report: {str(e)}")
         return jsonify({
             "success": False, 
             "error": "Failed to generate report",
@@ -1030,7 +1011,7 @@ def get_vacate_notices():
                     'updated_at': notice.updated_at.isoformat() if notice.updated_at else None
                 })
             except Exception as item_error:
-                print(f"Error processing vacate notice {notice.id}: {str(item_error)}")
+                current_app.logger.warning(f"Error processing vacate notice {notice.id}: {str(item_error)}")
                 continue
         
         return jsonify({
@@ -1047,8 +1028,7 @@ def get_vacate_notices():
         }), 200
         
     except Exception as e:
-        print(f"Error in get_vacate_notices: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_vacate_notices: {str(e)}")
         return jsonify({
             'success': False,
             'error': 'Server Error',
@@ -1121,8 +1101,7 @@ def update_vacate_notice(notice_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_vacate_notice: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in update_vacate_notice: {str(e)}")
         return jsonify({
             'success': False,
             'error': 'Server Error',
@@ -1146,8 +1125,7 @@ def delete_vacate_notice(notice_id):
         
     except Exception as e:
         db.session.rollback()
-        print(f"Error in delete_vacate_notice: {str(e)}")
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in delete_vacate_notice: {str(e)}")
         return jsonify({
             'success': False,
             'error': 'Server Error',
@@ -1293,67 +1271,23 @@ def get_admin_water_bill_summary():
         month = request.args.get('month', datetime.now().month, type=int)
         year = request.args.get('year', datetime.now().year, type=int)
         
-        # Get water bills for the specified month
-        water_bills = WaterBill.query.filter_by(month=month, year=year).all()
-        
-        # Calculate summary statistics
-        total_bills = len(water_bills)
-        total_amount_due = sum(float(bill.amount_due) for bill in water_bills)
-        total_amount_paid = sum(float(bill.amount_paid) for bill in water_bills)
-        total_balance = sum(float(bill.balance) for bill in water_bills)
-        
-        # Status breakdown
-        status_counts = {
-            'unpaid': len([b for b in water_bills if b.status == WaterBillStatus.UNPAID]),
-            'partially_paid': len([b for b in water_bills if b.status == WaterBillStatus.PARTIALLY_PAID]),
-            'paid': len([b for b in water_bills if b.status == WaterBillStatus.PAID]),
-            'overdue': len([b for b in water_bills if b.status == WaterBillStatus.OVERDUE])
-        }
-        
-        # Property breakdown
-        property_breakdown = {}
-        for bill in water_bills:
-            prop_name = bill.property.name if bill.property else 'Unknown'
-            if prop_name not in property_breakdown:
-                property_breakdown[prop_name] = {
-                    'total_bills': 0,
-                    'total_due': 0,
-                    'total_paid': 0,
-                    'total_balance': 0
-                }
-            property_breakdown[prop_name]['total_bills'] += 1
-            property_breakdown[prop_name]['total_due'] += float(bill.amount_due)
-            property_breakdown[prop_name]['total_paid'] += float(bill.amount_paid)
-            property_breakdown[prop_name]['total_balance'] += float(bill.balance)
-        
-        # Monthly trend (last 6 months)
-        monthly_trend = []
-        for i in range(6):
-            trend_month = (month - i - 1) % 12 + 1
-            trend_year = year if month - i - 1 > 0 else year - 1
-            
-            trend_bills = WaterBill.query.filter_by(month=trend_month, year=trend_year).all()
-            monthly_trend.append({
-                'month': trend_month,
-                'year': trend_year,
-                'total_bills': len(trend_bills),
-                'total_amount': sum(float(bill.amount_due) for bill in trend_bills),
-                'collected': sum(float(bill.amount_paid) for bill in trend_bills)
-            })
+        summary = water_bill_summary(month, year)
+        total_amount_due = summary['total_amount_due']
+        total_amount_paid = summary['total_amount_paid']
         
         return jsonify({
             'success': True,
             'summary': {
                 'month': month,
                 'year': year,
-                'total_bills': total_bills,
+                'total_bills': summary['total_bills'],
                 'total_amount_due': total_amount_due,
                 'total_amount_paid': total_amount_paid,
-                'total_balance': total_balance,
+                'total_balance': summary['total_balance'],
                 'collection_rate': (total_amount_paid / total_amount_due * 100) if total_amount_due > 0 else 0,
-                'status_counts': status_counts,
-                'property_breakdown': property_breakdown,
-                'monthly_trend': monthly_trend[::-1]  # Reverse to show oldest to newest
+                'status_counts': summary['status_counts'],
+                'property_breakdown': summary['property_breakdown'],
+                'monthly_trend': water_bill_monthly_trend(month, year)
             }
         }), 200
         
@@ -1530,7 +1464,7 @@ def delete_deposit(deposit_id):
 @admin_required
 def process_deposit_refund():
     """Process deposit refund (admin only)"""
-    current_user = db.session.get(User, request.user_id)
+    current_user = get_current_user()
     try:
         data = request.get_json()
         deposit_id = data.get('deposit_id')
@@ -1585,76 +1519,25 @@ def process_deposit_refund():
 def get_admin_deposit_summary():
     """Get comprehensive deposit summary for admin dashboard"""
     try:
-        # Get all deposit records
-        deposits = DepositRecord.query.all()
-        
-        # Calculate summary statistics
-        total_deposits = len(deposits)
-        total_amount_required = sum(float(d.amount_required) for d in deposits)
-        total_amount_paid = sum(float(d.amount_paid) for d in deposits)
-        total_refunded = sum(float(d.refund_amount) for d in deposits)
-        total_balance = sum(float(d.balance) for d in deposits)
-        
-        # Status breakdown
-        status_counts = {
-            'unpaid': len([d for d in deposits if d.status == DepositStatus.UNPAID]),
-            'paid': len([d for d in deposits if d.status == DepositStatus.PAID]),
-            'refunded': len([d for d in deposits if d.status == DepositStatus.REFUNDED]),
-            'partially_refunded': len([d for d in deposits if d.status == DepositStatus.PARTIALLY_REFUNDED])
-        }
-        
-        # Property breakdown
-        property_breakdown = {}
-        for deposit in deposits:
-            prop_name = deposit.property.name if deposit.property else 'Unknown'
-            if prop_name not in property_breakdown:
-                property_breakdown[prop_name] = {
-                    'total_deposits': 0,
-                    'total_required': 0,
-                    'total_paid': 0,
-                    'total_refunded': 0,
-                    'total_balance': 0,
-                    'status_counts': {'unpaid': 0, 'paid': 0, 'refunded': 0, 'partially_refunded': 0}
-                }
-            property_breakdown[prop_name]['total_deposits'] += 1
-            property_breakdown[prop_name]['total_required'] += float(deposit.amount_required)
-            property_breakdown[prop_name]['total_paid'] += float(deposit.amount_paid)
-            property_breakdown[prop_name]['total_refunded'] += float(deposit.refund_amount)
-            property_breakdown[prop_name]['total_balance'] += float(deposit.balance)
-            property_breakdown[prop_name]['status_counts'][deposit.status.value] += 1
-        
-        # Monthly trend (last 6 months)
-        monthly_trend = []
+        summary = deposit_summary()
+        total_amount_required = summary['total_amount_required']
+        total_amount_paid = summary['total_amount_paid']
+        total_refunded = summary['total_refunded']
         now = datetime.now(timezone.utc)
-        for i in range(6):
-            trend_month = (now.month - i - 1) % 12 + 1
-            trend_year = now.year if now.month - i - 1 > 0 else now.year - 1
-            
-            month_deposits = [d for d in deposits 
-                            if d.created_at and d.created_at.month == trend_month and d.created_at.year == trend_year]
-            
-            monthly_trend.append({
-                'month': trend_month,
-                'year': trend_year,
-                'total_deposits': len(month_deposits),
-                'total_amount': sum(float(d.amount_required) for d in month_deposits),
-                'collected': sum(float(d.amount_paid) for d in month_deposits),
-                'refunded': sum(float(d.refund_amount) for d in month_deposits)
-            })
         
         return jsonify({
             'success': True,
             'summary': {
-                'total_deposits': total_deposits,
+                'total_deposits': summary['total_deposits'],
                 'total_amount_required': total_amount_required,
                 'total_amount_paid': total_amount_paid,
                 'total_refunded': total_refunded,
-                'total_balance': total_balance,
+                'total_balance': summary['total_balance'],
                 'collection_rate': (total_amount_paid / total_amount_required * 100) if total_amount_required > 0 else 0,
                 'refund_rate': (total_refunded / total_amount_paid * 100) if total_amount_paid > 0 else 0,
-                'status_counts': status_counts,
-                'property_breakdown': property_breakdown,
-                'monthly_trend': monthly_trend[::-1]  # Reverse to show oldest to newest
+                'status_counts': summary['status_counts'],
+                'property_breakdown': summary['property_breakdown'],
+                'monthly_trend': deposit_monthly_trend(now.month, now.year)
             }
         }), 200
         
@@ -1704,6 +1587,19 @@ def export_deposits():
         current_app.logger.error(f"Error exporting deposits: {str(e)}")
         return jsonify({'success': False, 'error': f'Failed to export deposits: {str(e)}'}), 500
 
+@admin_bp.route('/db-pool', methods=['GET'])
+@admin_required
+def get_db_pool_metrics():
+    """Connection pool usage for this worker: size, checked out, overflow and peaks"""
+    return jsonify({'success': True, 'engines': pool_metrics()}), 200
+
+@admin_bp.route('/gateway-metrics', methods=['GET'])
+@admin_required
+def get_gateway_metrics():
+    """M-Pesa call latency, errors, retries and circuit state for this worker"""
+    from services.http_transport import transport_metrics
+    return jsonify({'success': True, **transport_metrics()}), 200
+
 @admin_bp.route('/seed-database', methods=['OPTIONS', 'POST'])
 @admin_required
 def seed_database():
@@ -7,7 +7,7 @@ Implements JWT-based authentication with role-based access control.
 Supported roles: Admin, Caretaker, Tenant
 """
 
-from flask import Blueprint, request, jsonify, current_app
+from flask import Blueprint, request, jsonify, current_app, g
 from werkzeug.security import generate_password_hash, check_password_hash
 from werkzeug.utils import secure_filename
 from functools import wraps
@@ -16,12 +16,17 @@ from datetime import datetime, timezone, timedelta
 from enum import Enum
 import jwt
 import os
+import hashlib
+import uuid
 from typing import Tuple, Dict, Any, Optional
 
 from models.base import db
 from models.user import User
 from models.notification import Notification
 from models.booking_inquiry import BookingInquiry
+from services.notification_service import notify_staff
+from utils.token_cache import get_verified_token_cache
+from utils.token_revocation import get_revocation_store
 
 auth_bp = Blueprint("auth", __name__, url_prefix="/api/auth")
 
@@ -37,8 +42,6 @@ class UserRole(Enum):
     TENANT = "tenant"
     LANDLORD = "landlord"
 
-blacklisted_tokens = set()
-
 def allowed_file(filename):
     return '.' in filename and \
            filename.rsplit('.', 1)[1].lower() in ALLOWED_EXTENSIONS
@@ -66,61 +69,124 @@ def validate_phone(phone: str) -> bool:
     return re.match(pattern, phone) is not None
 
 def generate_jwt_token(user_id: int, role: str) -> str:
-    """Generate a JWT token for authenticated user."""
+    """
+    Generate a compact JWT (sub, role, jti, exp) for an authenticated user.
+    Profile details are served by /profile rather than carried in every header.
+    """
     jwt_secret = current_app.config.get('JWT_SECRET') or os.getenv("JWT_SECRET", "dev-secret-key")
     
-    user = db.session.get(User, user_id)
-    
     payload = {
-        "user_id": user_id,
+        "sub": str(user_id),
         "role": role,
-        "email": user.email if user else None,
-        "full_name": user.full_name if user else None,
-        "room_number": user.room_number if user else None,
-        "photo_path": user.photo_path if user else None,
-        "is_active": user.is_active if user else False,
-        "iat": datetime.now(timezone.utc),
+        "jti": uuid.uuid4().hex,
         "exp": datetime.now(timezone.utc) + timedelta(hours=JWT_EXPIRATION_HOURS)
     }
     token = jwt.encode(payload, jwt_secret, algorithm=JWT_ALGORITHM)
     return token
 
+def token_jti(token: str, payload: Dict[str, Any]) -> str:
+    """Revocation key for a token; tokens issued before jti existed use their digest."""
+    return payload.get("jti") or hashlib.sha256(token.encode()).hexdigest()
+
+def token_user_id(payload: Dict[str, Any]) -> int:
+    """User id from the sub claim, or user_id on tokens issued before sub."""
+    return int(payload["sub"]) if "sub" in payload else payload["user_id"]
+
 def verify_jwt_token(token: str) -> Dict[str, Any]:
-    """Verify and decode JWT token."""
-    if token in blacklisted_tokens:
-        raise jwt.InvalidTokenError("Token has been blacklisted")
+    """
+    Verify and decode JWT token. Tokens already verified by this process are
+    served from a bounded LRU until they expire; revocation is always checked.
+    """
+    cache = get_verified_token_cache()
+    payload = cache.get(token)
     
-    jwt_secret = current_app.config.get('JWT_SECRET') or os.getenv("JWT_SECRET", "dev-secret-key")
-    payload = jwt.decode(token, jwt_secret, algorithms=[JWT_ALGORITHM])
+    if payload is None:
+        jwt_secret = current_app.config.get('JWT_SECRET') or os.getenv("JWT_SECRET", "dev-secret-key")
+        payload = jwt.decode(token, jwt_secret, algorithms=[JWT_ALGORITHM])
+        cache.put(token, payload)
+    
+    if get_revocation_store().is_revoked(token_jti(token, payload)):
+        cache.discard(token)
+        raise jwt.InvalidTokenError("Token has been blacklisted")
     return payload
 
+class Principal:
+    """The authenticated caller of the current request; the User row loads on first use."""
+
+    def __init__(self, request_obj, payload: Dict[str, Any]):
+        self.request = request_obj
+        self.payload = payload
+        self.user_id = token_user_id(payload)
+        self.role = payload["role"]
+        self._user = None
+        self._user_loaded = False
+
+    @property
+    def user(self) -> Optional[User]:
+        if not self._user_loaded:
+            self._user = db.session.get(User, self.user_id)
+            self._user_loaded = True
+        return self._user
+
+
+def current_principal() -> Optional[Principal]:
+    """The principal stored on flask.g for this request, if it has been authenticated."""
+    principal = g.get("principal")
+    # g outlives a request when tests hold an app context open across requests
+    if principal is not None and principal.request is request._get_current_object():
+        return principal
+    return None
+
+
+def get_current_user() -> Optional[User]:
+    """The authenticated user, loaded at most once per request."""
+    principal = current_principal()
+    return principal.user if principal else None
+
+
+def authenticate_request():
+    """
+    Decode the bearer token once per request and store the principal on g.
+    Returns an error response, or None when the request is authenticated.
+    """
+    if current_principal() is not None:
+        return None
+
+    token = None
+    
+    if "Authorization" in request.headers:
+        auth_header = request.headers["Authorization"]
+        try:
+            token = auth_header.split(" ")[1]
+        except IndexError:
+            return jsonify({"success": False, "error": "Invalid token format"}), 401
+    
+    if not token:
+        return jsonify({"success": False, "error": "Token is missing"}), 401
+    
+    try:
+        payload = verify_jwt_token(token)
+    except jwt.ExpiredSignatureError:
+        return jsonify({"success": False, "error": "Token has expired"}), 401
+    except jwt.InvalidTokenError as e:
+        return jsonify({"success": False, "error": f"Invalid token: {str(e)}"}), 401
+    
+    g.principal = Principal(request._get_current_object(), payload)
+    request.user_id = g.principal.user_id
+    request.user_role = g.principal.role
+    return None
+
+
 def token_required(f):
     """Decorator to require valid JWT token."""
     @wraps(f)
     def decorated(*args, **kwargs):
         if request.method == 'OPTIONS':
             return f(*args, **kwargs)
-            
-        token = None
         
-        if "Authorization" in request.headers:
-            auth_header = request.headers["Authorization"]
-            try:
-                token = auth_header.split(" ")[1]
-            except IndexError:
-                return jsonify({"success": False, "error": "Invalid token format"}), 401
-        
-        if not token:
-            return jsonify({"success": False, "error": "Token is missing"}), 401
-        
-        try:
-            payload = verify_jwt_token(token)
-            request.user_id = payload["user_id"]
-            request.user_role = payload["role"]
-        except jwt.ExpiredSignatureError:
-            return jsonify({"success": False, "error": "Token has expired"}), 401
-        except jwt.InvalidTokenError as e:
-            return jsonify({"success": False, "error": f"Invalid token: {str(e)}"}), 401
+        error = authenticate_request()
+        if error:
+            return error
         
         return f(*args, **kwargs)
     
@@ -336,7 +402,9 @@ def logout():
         token = auth_header.split(" ")[1] if " " in auth_header else None
         
         if token:
-            blacklisted_tokens.add(token)
+            payload = current_principal().payload
+            get_revocation_store().revoke(token_jti(token, payload), payload["exp"])
+            get_verified_token_cache().discard(token)
         
         return jsonify({"success": True, "message": "Logged out successfully"}), 200
     
@@ -349,7 +417,7 @@ def logout():
 def get_profile():
     """Get authenticated user's profile information."""
     try:
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({"success": False, "error": "User not found"}), 404
@@ -381,7 +449,7 @@ def update_profile():
     """Update authenticated user's profile information."""
     try:
         data = request.get_json()
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         
         if not user:
             return jsonify({"success": False, "error": "User not found"}), 404
@@ -418,44 +486,19 @@ def update_profile():
         return jsonify({"success": False, "error": f"Failed to update profile: {str(e)}"}), 500
 
 
-@auth_bp.route("/rooms/available", methods=["GET", "OPTIONS"])
+@auth_bp.route("/rooms/available", methods=["GET"])
 def get_available_rooms():
     """
     Get all available rooms for tenant registration.
     This is a public endpoint that doesn't require authentication.
     """
-    # Handle preflight OPTIONS request
-    if request.method == "OPTIONS":
-        response = current_app.make_default_options_response()
-        origin = request.headers.get('Origin')
-        if origin in ["https://joyce-suites.vercel.app", "https://joyce-suites-jcfw.vercel.app", "https://joyce-suites-git-main-steves-projects-d95e3bef.vercel.app"]:
-            response.headers.set('Access-Control-Allow-Origin', origin)
-            response.headers.set('Access-Control-Allow-Methods', 'GET, OPTIONS')
-            response.headers.set('Access-Control-Allow-Headers', 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin')
-            response.headers.set('Access-Control-Allow-Credentials', 'true')
-        else:
-            response.headers.set('Access-Control-Allow-Origin', '*')
-            response.headers.set('Access-Control-Allow-Methods', 'GET, OPTIONS')
-            response.headers.set('Access-Control-Allow-Headers', 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin')
-        return response
-    
     try:
         from models.property import Property
         
-        # Debug: Check total properties
-        total_properties = Property.query.count()
-        print(f"DEBUG: Total properties in database: {total_properties}")
-        
-        # Debug: Check all properties
-        all_properties = Property.query.all()
-        print(f"DEBUG: All properties: {[{'id': p.id, 'name': p.name, 'status': p.status} for p in all_properties]}")
-        
         vacant_rooms = Property.query.filter_by(status='vacant').all()
-        print(f"DEBUG: Vacant rooms found: {len(vacant_rooms)}")
         
         rooms_data = []
         for room in vacant_rooms:
-            print(f"DEBUG: Processing room: {room.name}, status: {room.status}")
             landlord_name = "Unknown"
             if room.landlord:
                 landlord_name = f"{room.landlord.first_name} {room.landlord.last_name}"
@@ -481,8 +524,6 @@ def get_available_rooms():
                 "status": room.status
             })
         
-        print(f"DEBUG: Rooms data to return: {rooms_data}")
-        
         return jsonify({
             "success": True,
             "count": len(rooms_data),
@@ -585,27 +626,12 @@ def delete_user(user_id: int):
         return jsonify({"success": False, "error": f"Failed to delete user: {str(e)}"}), 500
 
 
-@auth_bp.route("/inquiry", methods=["POST", "OPTIONS"])
+@auth_bp.route("/inquiry", methods=["POST"])
 def send_inquiry():
     """
     Public endpoint for sending inquiries/messages.
     Creates a notification for all admins and caretakers.
     """
-    # Handle preflight OPTIONS request
-    if request.method == "OPTIONS":
-        response = current_app.make_default_options_response()
-        origin = request.headers.get('Origin')
-        if origin in ["https://joyce-suites.vercel.app", "https://joyce-suites-jcfw.vercel.app", "https://joyce-suites-git-main-steves-projects-d95e3bef.vercel.app"]:
-            response.headers.set('Access-Control-Allow-Origin', origin)
-            response.headers.set('Access-Control-Allow-Methods', 'POST, OPTIONS')
-            response.headers.set('Access-Control-Allow-Headers', 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin')
-            response.headers.set('Access-Control-Allow-Credentials', 'true')
-        else:
-            response.headers.set('Access-Control-Allow-Origin', '*')
-            response.headers.set('Access-Control-Allow-Methods', 'POST, OPTIONS')
-            response.headers.set('Access-Control-Allow-Headers', 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin')
-        return response
-    
     try:
         data = request.get_json()
         
@@ -628,23 +654,13 @@ def send_inquiry():
         db.session.add(inquiry)
         db.session.commit()
             
-        recipients = User.query.filter(
-            User.role.in_([UserRole.ADMIN.value, UserRole.CARETAKER.value])
-        ).all()
-        
-        notifications = []
-        for recipient in recipients:
-            note = Notification(
-                user_id=recipient.id,
-                title=f"NEW BOOKING: {name}",
-                message=f"A new booking inquiry has been received. Please review and mark as paid when settled.\nContact: {email} {phone}",
-                notification_type="inquiry"
-            )
-            notifications.append(note)
-            
-        if notifications:
-            db.session.add_all(notifications)
-            db.session.commit()
+        notify_staff(
+            title=f"NEW BOOKING: {name}",
+            message=f"A new booking inquiry has been received. Please review and mark as paid when settled.\nContact: {email} {phone}",
+            notification_type="inquiry",
+            roles=(UserRole.ADMIN.value, UserRole.CARETAKER.value)
+        )
+        db.session.commit()
             
         return jsonify({
             "success": True, 
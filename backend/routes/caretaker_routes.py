@@ -1,7 +1,7 @@
-from flask import Blueprint, request, jsonify
+from flask import Blueprint, request, jsonify, current_app
 from functools import wraps
 from datetime import datetime, timezone
-from dateutil.relativedelta import relativedelta
+from sqlalchemy import and_, case, func, or_
 
 from models.base import db
 from models.user import User
@@ -13,7 +13,13 @@ from models.property import Property
 from routes.auth_routes import token_required
 from models.vacate_notice import VacateNotice
 from models.booking_inquiry import BookingInquiry
-from utils.finance import calculate_outstanding_balance
+from models.monthly_ledger import MonthlyLedger
+from utils.finance import (
+    calculate_outstanding_balances,
+    current_payment_period,
+    get_active_leases_by_tenant
+)
+from utils.stats import count_by, lease_stats, maintenance_stats, property_stats, vacate_notice_stats
 
 caretaker_bp = Blueprint("caretaker", __name__, url_prefix="/api/caretaker")
 
@@ -40,17 +46,16 @@ def caretaker_required(f):
 def get_overview():
     """Get caretaker dashboard overview."""
     try:
-        pending_maintenance = MaintenanceRequest.query.filter_by(status="pending").count()
-        in_progress_maintenance = MaintenanceRequest.query.filter_by(status="in_progress").count()
-        completed_today = MaintenanceRequest.query.filter(
-            MaintenanceRequest.status == "completed",
-            MaintenanceRequest.updated_at >= datetime.now().date()
-        ).count()
-
-        occupied_properties = Property.query.filter_by(status="occupied").count()
-        reserved_properties = Property.query.filter_by(status="reserved").count()
-        vacant_properties = Property.query.filter_by(status="vacant").count()
-        total_properties = Property.query.count()
+        maintenance = maintenance_stats()
+        pending_maintenance = maintenance["pending"]
+        in_progress_maintenance = maintenance["in_progress"]
+        completed_today = maintenance["completed_today"]
+
+        properties = property_stats()
+        occupied_properties = properties["occupied"]
+        reserved_properties = properties["reserved"]
+        vacant_properties = properties["vacant"]
+        total_properties = properties["total"]
 
         return jsonify({
             "success": True,
@@ -66,9 +71,7 @@ def get_overview():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_overview: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_overview: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -106,9 +109,7 @@ def create_maintenance_request():
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in create_maintenance_request: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in create_maintenance_request: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -116,15 +117,13 @@ def create_maintenance_request():
 @caretaker_required
 def get_dashboard():
     try:
-        pending_maintenance = MaintenanceRequest.query.filter_by(status="pending").count()
-        in_progress_maintenance = MaintenanceRequest.query.filter_by(status="in_progress").count()
-        completed_today = MaintenanceRequest.query.filter(
-            MaintenanceRequest.status == "completed",
-            MaintenanceRequest.updated_at >= datetime.now().date()
-        ).count()
-
-        occupied_properties = Lease.query.filter_by(status="active").count()
-        total_properties = Property.query.count()
+        maintenance = maintenance_stats()
+        pending_maintenance = maintenance["pending"]
+        in_progress_maintenance = maintenance["in_progress"]
+        completed_today = maintenance["completed_today"]
+
+        occupied_properties = lease_stats().get("active", 0)
+        total_properties = property_stats()["total"]
         vacant_properties = total_properties - occupied_properties
 
         recent_requests = MaintenanceRequest.query.order_by(
@@ -137,6 +136,7 @@ def get_dashboard():
                 "pending_maintenance": pending_maintenance,
                 "in_progress_maintenance": in_progress_maintenance,
                 "completed_today": completed_today,
+                "total_maintenance_requests": maintenance["total"],
                 "vacant_properties": vacant_properties,
                 "occupied_properties": occupied_properties,
                 "recent_requests": [r.to_dict() for r in recent_requests]
@@ -144,9 +144,7 @@ def get_dashboard():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_dashboard: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_dashboard: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -187,9 +185,7 @@ def get_maintenance_requests():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_maintenance_requests: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_maintenance_requests: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -216,9 +212,7 @@ def update_maintenance_status(req_id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_maintenance_status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in update_maintenance_status: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -254,9 +248,7 @@ def send_tenant_notification():
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in send_tenant_notification: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in send_tenant_notification: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -292,9 +284,7 @@ def get_available_rooms():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_available_rooms: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_available_rooms: {str(e)}")
         return jsonify({
             "success": False, 
             "error": str(e)
@@ -337,9 +327,7 @@ def get_occupied_rooms():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_occupied_rooms: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_occupied_rooms: {str(e)}")
         return jsonify({
             "success": False,
             "error": str(e)
@@ -397,9 +385,7 @@ def get_all_rooms():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_all_rooms: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_all_rooms: {str(e)}")
         return jsonify({
             "success": False,
             "error": str(e)
@@ -537,30 +523,12 @@ def debug_rooms():
         return jsonify({"success": False, "error": str(e)}), 500
 
 
-@caretaker_bp.route("/rooms/public", methods=["GET", "OPTIONS"])
+@caretaker_bp.route("/rooms/public", methods=["GET"])
 def get_public_rooms():
     """Public endpoint for tenant registration."""
-    # Handle preflight OPTIONS request
-    if request.method == "OPTIONS":
-        response = current_app.make_default_options_response()
-        origin = request.headers.get('Origin')
-        if origin in ["https://joyce-suites.vercel.app", "https://joyce-suites-jcfw.vercel.app", "https://joyce-suites-git-main-steves-projects-d95e3bef.vercel.app"]:
-            response.headers.set('Access-Control-Allow-Origin', origin)
-            response.headers.set('Access-Control-Allow-Methods', 'GET, OPTIONS')
-            response.headers.set('Access-Control-Allow-Headers', 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin')
-            response.headers.set('Access-Control-Allow-Credentials', 'true')
-        else:
-            response.headers.set('Access-Control-Allow-Origin', '*')
-            response.headers.set('Access-Control-Allow-Methods', 'GET, OPTIONS')
-            response.headers.set('Access-Control-Allow-Headers', 'content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin')
-        return response
-    
     try:
-        print("🔍 Debug: Starting get_public_rooms")
-        
         # Get all properties first
         all_properties = Property.query.all()
-        print(f"📊 Debug: Total properties in DB: {len(all_properties)}")
         
         properties_debug = []
         for prop in all_properties:
@@ -572,11 +540,9 @@ def get_public_rooms():
                 "rent_amount": float(prop.rent_amount) if prop.rent_amount else 0.0
             }
             properties_debug.append(prop_data)
-            print(f"  - ID: {prop.id}, Name: {prop.name}, Status: {prop.status}")
         
         # Get active leases
         active_leases = Lease.query.filter_by(status="active").all()
-        print(f"📋 Debug: Active leases: {len(active_leases)}")
         
         leases_debug = []
         for lease in active_leases:
@@ -587,19 +553,14 @@ def get_public_rooms():
                 "end_date": lease.end_date.strftime("%Y-%m-%d") if lease.end_date else None
             }
             leases_debug.append(lease_data)
-            print(f"  - Property ID: {lease.property_id}, Status: {lease.status}")
         
         occupied_property_ids = [lease.property_id for lease in Lease.query.filter_by(status="active").all()]
-        print(f"🚫 Debug: Occupied property IDs: {occupied_property_ids}")
         
         vacant_properties = Property.query.filter(
             ~Property.id.in_(occupied_property_ids),
             Property.status == "vacant"
         ).all()
         
-        print(f"✅ Debug: Vacant properties found: {len(vacant_properties)}")
-        for prop in vacant_properties:
-            print(f"  - ID: {prop.id}, Name: {prop.name}, Status: {prop.status}")
 
         rooms = []
         for prop in vacant_properties:
@@ -634,13 +595,10 @@ def get_public_rooms():
                 "vacant_properties_count": len(vacant_properties)
             }
         }
-        print(f"🎯 Debug: Final result: {result}")
         return jsonify(result), 200
 
     except Exception as e:
-        print(f"❌ Error in get_public_rooms: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_public_rooms: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -676,93 +634,88 @@ def get_pending_payments():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_pending_payments: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_pending_payments: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
 @caretaker_bp.route("/payments/all-tenants", methods=["GET"])
 @caretaker_required
 def get_all_tenants_payment_status():
-    """Get all tenants with their current month payment status."""
+    """
+    Get all tenants with their current month payment status.
+    Pass ?since=<ISO timestamp> to only receive tenants whose user, lease
+    or payment rows changed after that time.
+    """
     try:
-        today = datetime.now()
-        if today.day < 5:
-            current_month_start = (today.replace(day=1) - relativedelta(days=1)).replace(day=5, hour=0, minute=0, second=0, microsecond=0)
-        else:
-            current_month_start = today.replace(day=5, hour=0, minute=0, second=0, microsecond=0)
-        
-        next_month_start = current_month_start + relativedelta(months=1)
-        
-        print(f"Payment period: {current_month_start} to {next_month_start}")
-        
-        all_tenants = User.query.filter_by(role="tenant", is_active=True).all()
-        print(f"Found {len(all_tenants)} registered tenants")
-        
-        tenants_data = []
-
-        for tenant in all_tenants:
+        since = None
+        if request.args.get("since"):
             try:
-                print(f"Processing tenant {tenant.full_name}")
-                
-                lease = Lease.query.filter_by(
-                    tenant_id=tenant.id,
-                    status="active"
-                ).first()
-                    
-                is_paid = False
-                last_payment_date = None
-                lease_id = None
-                rent_amount = 0.0
-                
-                if lease:
-                    lease_id = lease.id
-                    try:
-                        rent_amount = float(lease.rent_amount) if lease.rent_amount else 0.0
-                    except (TypeError, ValueError):
-                        rent_amount = 0.0
-                        
-                    current_month_payment = Payment.query.filter(
-                        Payment.lease_id == lease.id,
-                        Payment.created_at >= current_month_start,
-                        Payment.created_at < next_month_start
-                    ).first()
-                    
-                    if not current_month_payment:
-                        current_month_payment = Payment.query.filter(
-                            Payment.lease_id == lease.id,
-                            Payment.payment_date >= current_month_start,
-                            Payment.payment_date < next_month_start
-                        ).first()
-                    
-                    if current_month_payment:
-                        is_paid = current_month_payment.status == "paid"
-                        
-                    last_payment = Payment.query.filter_by(
-                        lease_id=lease.id,
-                        status="paid"
-                    ).order_by(Payment.payment_date.desc()).first()
-                    
-                    if last_payment and last_payment.payment_date:
-                        last_payment_date = last_payment.payment_date.isoformat()
-                
-                tenant_data = {
-                    "tenant_id": tenant.id,
-                    "tenant_name": tenant.full_name or "Unknown",
-                    "room_number": tenant.room_number or "N/A",
-                    "rent_amount": rent_amount,
-                    "current_month_paid": is_paid,
-                    "last_payment_date": last_payment_date,
-                    "lease_id": lease_id,
-                    "has_active_lease": lease is not None
-                }
-                
-                tenants_data.append(tenant_data)
-                
-            except Exception as tenant_error:
-                print(f"Error processing tenant {tenant.id}: {str(tenant_error)}")
-                continue
+                since = datetime.fromisoformat(request.args["since"].replace("Z", "+00:00"))
+            except ValueError:
+                return jsonify({"success": False, "error": "since must be an ISO 8601 timestamp"}), 400
+            if since.tzinfo is None:
+                since = since.replace(tzinfo=timezone.utc)
+
+        server_time = datetime.now(timezone.utc)
+        current_month_start, next_month_start = current_payment_period()
+
+        # One active lease per tenant (the oldest, matching the previous .first())
+        active_lease_ids = db.session.query(
+            Lease.tenant_id.label("tenant_id"),
+            func.min(Lease.id).label("lease_id")
+        ).filter(Lease.status == "active").group_by(Lease.tenant_id).subquery()
+
+        in_period = or_(
+            and_(Payment.created_at >= current_month_start, Payment.created_at < next_month_start),
+            and_(Payment.payment_date >= current_month_start, Payment.payment_date < next_month_start)
+        )
+        payment_stats = db.session.query(
+            Payment.lease_id.label("lease_id"),
+            func.max(case((and_(Payment.status == "paid", in_period), 1), else_=0)).label("current_month_paid"),
+            func.max(case((Payment.status == "paid", Payment.payment_date))).label("last_payment_date"),
+            func.max(Payment.updated_at).label("last_activity")
+        ).group_by(Payment.lease_id).subquery()
+
+        query = db.session.query(
+            User.id,
+            User.first_name,
+            User.last_name,
+            User.room_number,
+            Lease.id,
+            Lease.rent_amount,
+            payment_stats.c.current_month_paid,
+            payment_stats.c.last_payment_date
+        ).outerjoin(
+            active_lease_ids, active_lease_ids.c.tenant_id == User.id
+        ).outerjoin(
+            Lease, Lease.id == active_lease_ids.c.lease_id
+        ).outerjoin(
+            payment_stats, payment_stats.c.lease_id == Lease.id
+        ).filter(
+            User.role == "tenant",
+            User.is_active == True
+        )
+
+        if since:
+            query = query.filter(or_(
+                User.updated_at > since,
+                Lease.updated_at > since,
+                payment_stats.c.last_activity > since
+            ))
+
+        tenants_data = []
+        for tenant_id, first_name, last_name, room_number, lease_id, rent_amount, paid, last_payment_date in query.order_by(User.id):
+            full_name = f"{first_name or ''} {last_name or ''}".strip()
+            tenants_data.append({
+                "tenant_id": tenant_id,
+                "tenant_name": full_name or "Unknown",
+                "room_number": room_number or "N/A",
+                "rent_amount": float(rent_amount) if rent_amount else 0.0,
+                "current_month_paid": bool(paid),
+                "last_payment_date": last_payment_date.isoformat() if last_payment_date else None,
+                "lease_id": lease_id,
+                "has_active_lease": lease_id is not None
+            })
 
         return jsonify({
             "success": True,
@@ -771,13 +724,13 @@ def get_all_tenants_payment_status():
             "current_period": {
                 "start": current_month_start.isoformat(),
                 "end": next_month_start.isoformat()
-            }
+            },
+            "since": since.isoformat() if since else None,
+            "server_time": server_time.isoformat()
         }), 200
 
     except Exception as e:
-        print(f"Error in get_all_tenants_payment_status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_all_tenants_payment_status: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -787,7 +740,7 @@ def mark_payment_status():
     """Manually mark a payment as paid or unpaid."""
     try:
         data = request.get_json()
-        print(f"Received payment mark request: {data}")
+        current_app.logger.debug(f"Received payment mark request: {data}")
         
         for field in ["tenant_id", "status", "amount"]:
             if field not in data:
@@ -804,6 +757,8 @@ def mark_payment_status():
         if not lease:
             return jsonify({"success": False, "error": "No active lease found for tenant"}), 404
         
+        from dateutil.relativedelta import relativedelta
+
         today = datetime.now()
         if today.day < 5:
             current_month_start = (today.replace(day=1) - relativedelta(days=1)).replace(day=5, hour=0, minute=0, second=0, microsecond=0)
@@ -824,7 +779,7 @@ def mark_payment_status():
             return jsonify({"success": False, "error": f"Invalid amount: {str(e)}"}), 400
         
         if existing_payment:
-            print(f"Updating existing payment {existing_payment.id}")
+            current_app.logger.debug(f"Updating existing payment {existing_payment.id}")
             existing_payment.status = data["status"]
             if data["status"] == "paid":
                 existing_payment.payment_date = datetime.now()
@@ -838,7 +793,7 @@ def mark_payment_status():
             db.session.commit()
             payment_result = existing_payment
         else:
-            print(f"Creating new payment record")
+            current_app.logger.debug("Creating new payment record")
             new_payment = Payment(
                 tenant_id=lease.tenant_id,
                 lease_id=lease.id,
@@ -865,9 +820,7 @@ def mark_payment_status():
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in mark_payment_status: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in mark_payment_status: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -912,34 +865,23 @@ def get_financial_summary():
             }
         }
         
+        current_month = datetime.now().month
+        current_year = datetime.now().year
+        
         # Try to get rent statistics
         try:
             from models.rent_deposit import RentRecord, RentStatus
-            current_month = datetime.now().month
-            current_year = datetime.now().year
-            
-            total_rent_records = RentRecord.query.count()
-            paid_rent = RentRecord.query.filter_by(status=RentStatus.PAID.value).count()
-            unpaid_rent = RentRecord.query.filter_by(status=RentStatus.UNPAID.value).count()
-            overdue_rent = RentRecord.query.filter_by(status=RentStatus.OVERDUE.value).count()
-            
-            current_month_rent = RentRecord.query.filter(
-                RentRecord.month == current_month,
-                RentRecord.year == current_year
-            ).all()
-            
-            current_month_paid = sum(float(r.amount_paid or 0) for r in current_month_rent)
-            current_month_due = sum(float(r.amount_due or 0) for r in current_month_rent)
-            current_month_balance = sum(float(r.balance or 0) for r in current_month_rent)
+            rent_counts = count_by(RentRecord.status)
+            current_month_rent = MonthlyLedger.totals('rent', year=current_year, month=current_month)
             
             financial_data['rent_stats'] = {
-                'total_records': total_rent_records,
-                'paid': paid_rent,
-                'unpaid': unpaid_rent,
-                'overdue': overdue_rent,
-                'current_month_paid': current_month_paid,
-                'current_month_due': current_month_due,
-                'current_month_balance': current_month_balance
+                'total_records': sum(rent_counts.values()),
+                'paid': rent_counts.get(RentStatus.PAID, 0),
+                'unpaid': rent_counts.get(RentStatus.UNPAID, 0),
+                'overdue': rent_counts.get(RentStatus.OVERDUE, 0),
+                'current_month_paid': current_month_rent['amount_paid'],
+                'current_month_due': current_month_rent['amount_due'],
+                'current_month_balance': current_month_rent['balance']
             }
         except Exception as rent_error:
             current_app.logger.warning(f"Rent stats not available: {str(rent_error)}")
@@ -947,21 +889,16 @@ def get_financial_summary():
         # Try to get deposit statistics
         try:
             from models.rent_deposit import DepositRecord, DepositStatus
-            total_deposits = DepositRecord.query.count()
-            paid_deposits = DepositRecord.query.filter_by(status=DepositStatus.PAID.value).count()
-            pending_deposits = DepositRecord.query.filter_by(status=DepositStatus.UNPAID.value).count()
-            refunded_deposits = DepositRecord.query.filter_by(status=DepositStatus.REFUNDED.value).count()
-            
-            total_deposit_amount = sum(float(d.amount_required or 0) for d in DepositRecord.query.all())
-            total_deposit_paid = sum(float(d.amount_paid or 0) for d in DepositRecord.query.all())
+            deposit_counts = count_by(DepositRecord.status)
+            deposit_totals = MonthlyLedger.totals('deposit')
             
             financial_data['deposit_stats'] = {
-                'total_deposits': total_deposits,
-                'paid': paid_deposits,
-                'pending': pending_deposits,
-                'refunded': refunded_deposits,
-                'total_amount': total_deposit_amount,
-                'total_paid': total_deposit_paid
+                'total_deposits': sum(deposit_counts.values()),
+                'paid': deposit_counts.get(DepositStatus.PAID, 0),
+                'pending': deposit_counts.get(DepositStatus.UNPAID, 0),
+                'refunded': deposit_counts.get(DepositStatus.REFUNDED, 0),
+                'total_amount': deposit_totals['amount_due'],
+                'total_paid': deposit_totals['amount_paid']
             }
         except Exception as deposit_error:
             current_app.logger.warning(f"Deposit stats not available: {str(deposit_error)}")
@@ -969,36 +906,38 @@ def get_financial_summary():
         # Try to get water bill statistics
         try:
             from models.water_bill import WaterBill, WaterBillStatus
-            total_water_bills = WaterBill.query.count()
-            paid_water_bills = WaterBill.query.filter_by(status=WaterBillStatus.PAID.value).count()
-            unpaid_water_bills = WaterBill.query.filter_by(status=WaterBillStatus.UNPAID.value).count()
-            overdue_water_bills = WaterBill.query.filter_by(status=WaterBillStatus.OVERDUE.value).count()
-            
-            total_water_amount = sum(float(w.amount_due or 0) for w in WaterBill.query.all())
-            total_water_paid = sum(float(w.amount_paid or 0) for w in WaterBill.query.all())
+            water_counts = count_by(WaterBill.status)
+            water_totals = MonthlyLedger.totals('water')
             
             financial_data['water_bill_stats'] = {
-                'total_bills': total_water_bills,
-                'paid': paid_water_bills,
-                'unpaid': unpaid_water_bills,
-                'overdue': overdue_water_bills,
-                'total_amount': total_water_amount,
-                'total_paid': total_water_paid
-            }
-            
-            # Overall Financial Summary
-            total_expected_revenue = financial_data['rent_stats']['current_month_due'] + total_deposit_amount + total_water_amount
-            total_actual_revenue = financial_data['rent_stats']['current_month_paid'] + total_deposit_paid + total_water_paid
-            total_outstanding = total_expected_revenue - total_actual_revenue
-            
-            financial_data['overall'] = {
-                'total_expected_revenue': total_expected_revenue,
-                'total_actual_revenue': total_actual_revenue,
-                'total_outstanding': total_outstanding
+                'total_bills': sum(water_counts.values()),
+                'paid': water_counts.get(WaterBillStatus.PAID, 0),
+                'unpaid': water_counts.get(WaterBillStatus.UNPAID, 0),
+                'overdue': water_counts.get(WaterBillStatus.OVERDUE, 0),
+                'total_amount': water_totals['amount_due'],
+                'total_paid': water_totals['amount_paid']
             }
         except Exception as water_error:
             current_app.logger.warning(f"Water bill stats not available: {str(water_error)}")
         
+        # Overall Financial Summary
+        total_expected_revenue = (
+            financial_data['rent_stats']['current_month_due']
+            + financial_data['deposit_stats']['total_amount']
+            + financial_data['water_bill_stats']['total_amount']
+        )
+        total_actual_revenue = (
+            financial_data['rent_stats']['current_month_paid']
+            + financial_data['deposit_stats']['total_paid']
+            + financial_data['water_bill_stats']['total_paid']
+        )
+        
+        financial_data['overall'] = {
+            'total_expected_revenue': total_expected_revenue,
+            'total_actual_revenue': total_actual_revenue,
+            'total_outstanding': total_expected_revenue - total_actual_revenue
+        }
+        
         return jsonify({
             'success': True,
             'data': financial_data,
@@ -1073,12 +1012,12 @@ def get_tenants():
         tenants_query = User.query.filter_by(role="tenant", is_active=True)
         pagination = tenants_query.paginate(page=page, per_page=per_page, error_out=False)
 
+        leases_by_tenant = get_active_leases_by_tenant([t.id for t in pagination.items])
+        balances = calculate_outstanding_balances(leases_by_tenant.values())
+
         tenants = []
         for tenant in pagination.items:
-            lease = Lease.query.filter_by(
-                tenant_id=tenant.id,
-                status="active"
-            ).first()
+            lease = leases_by_tenant.get(tenant.id)
 
             tenants.append({
                 "id": tenant.id,
@@ -1086,7 +1025,7 @@ def get_tenants():
                 "email": tenant.email,
                 "phone_number": tenant.phone_number,
                 "room_number": tenant.room_number,
-                "outstanding_balance": calculate_outstanding_balance(lease),
+                "outstanding_balance": balances.get(lease.id, 0.0) if lease else 0.0,
                 "is_active": tenant.is_active,
                 "created_at": tenant.created_at.isoformat() if tenant.created_at else None
             })
@@ -1103,9 +1042,7 @@ def get_tenants():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_tenants: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_tenants: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1159,9 +1096,7 @@ def get_vacate_notices():
         }), 200
 
     except Exception as e:
-        print(f"Error in get_vacate_notices: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_vacate_notices: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1226,9 +1161,7 @@ def create_vacate_notice():
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in create_vacate_notice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in create_vacate_notice: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1267,9 +1200,7 @@ def get_vacate_notice(notice_id):
         }), 200
 
     except Exception as e:
-        print(f"Error in get_vacate_notice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_vacate_notice: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1313,9 +1244,7 @@ def update_vacate_notice(notice_id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in update_vacate_notice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in update_vacate_notice: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1344,9 +1273,7 @@ def approve_vacate_notice(notice_id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in approve_vacate_notice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in approve_vacate_notice: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1375,9 +1302,7 @@ def reject_vacate_notice(notice_id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in reject_vacate_notice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in reject_vacate_notice: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1410,9 +1335,7 @@ def complete_vacate_notice(notice_id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in complete_vacate_notice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in complete_vacate_notice: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1441,9 +1364,7 @@ def delete_vacate_notice(notice_id):
 
     except Exception as e:
         db.session.rollback()
-        print(f"Error in delete_vacate_notice: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in delete_vacate_notice: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
@@ -1452,11 +1373,12 @@ def delete_vacate_notice(notice_id):
 def get_vacate_notices_summary():
     """Get summary of vacate notices by status."""
     try:
-        total = VacateNotice.query.count()
-        pending = VacateNotice.query.filter_by(status="pending").count()
-        approved = VacateNotice.query.filter_by(status="approved").count()
-        rejected = VacateNotice.query.filter_by(status="rejected").count()
-        completed = VacateNotice.query.filter_by(status="completed").count()
+        notices = vacate_notice_stats()
+        total = notices["total"]
+        pending = notices["pending"]
+        approved = notices["approved"]
+        rejected = notices["rejected"]
+        completed = notices["completed"]
 
         return jsonify({
             "success": True,
@@ -1469,9 +1391,7 @@ def get_vacate_notices_summary():
             }
         }), 200
     except Exception as e:
-        print(f"Error in get_vacate_notices_summary: {str(e)}")
-        import traceback
-        traceback.print_exc()
+        current_app.logger.exception(f"Error in get_vacate_notices_summary: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 @caretaker_bp.route("/inquiries", methods=["GET"])
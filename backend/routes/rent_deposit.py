@@ -1,7 +1,8 @@
 from flask import Blueprint, request, jsonify, current_app
-import traceback
 from datetime import datetime, timedelta, timezone
-from sqlalchemy import and_, or_
+from sqlalchemy import and_, or_, func, insert
+from sqlalchemy.exc import IntegrityError
+from sqlalchemy.orm import joinedload
 from models.base import db
 from models.user import User
 from models.property import Property
@@ -9,26 +10,13 @@ from models.lease import Lease
 from models.rent_deposit import RentRecord, DepositRecord, RentStatus, DepositStatus
 from models.water_bill import WaterBill, WaterBillStatus
 from models.notification import Notification
-from routes.auth_routes import token_required
-from functools import wraps
-
-def role_required(allowed_roles):
-    """Decorator requiring specific roles."""
-    def decorator(f):
-        @wraps(f)
-        @token_required
-        def decorated(*args, **kwargs):
-            if request.method == 'OPTIONS':
-                return f(*args, **kwargs)
-                
-            if request.user_role not in allowed_roles:
-                return jsonify({
-                    "success": False,
-                    "error": f"Access denied. Required roles: {', '.join(allowed_roles)}"
-                }), 403
-            return f(*args, **kwargs)
-        return decorated
-    return decorator
+from models.monthly_ledger import MonthlyLedger, apply_bulk_rows
+from routes.auth_routes import token_required, get_current_user
+from services.notification_service import notify_staff
+from utils import overdue_checks
+from utils.stats import count_by, deposit_summary
+from utils.water_readings import bill_summary, ingest_water_readings, parse_readings_csv
+from utils.auth import role_required
 
 rent_deposit_bp = Blueprint('rent_deposit', __name__)
 
@@ -38,7 +26,6 @@ rent_deposit_bp = Blueprint('rent_deposit', __name__)
 @role_required(['admin', 'caretaker'])
 def get_rent_records():
     """Get all rent records with optional filters"""
-    current_user = db.session.get(User, request.user_id)
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -84,10 +71,9 @@ def get_rent_records():
 @token_required
 def get_tenant_rent_records(tenant_id):
     """Get rent records for a specific tenant"""
-    current_user = db.session.get(User, request.user_id)
     try:
         # Check if user is admin, caretaker, or the tenant themselves
-        if current_user.role not in ['admin', 'caretaker'] and current_user.id != tenant_id:
+        if request.user_role not in ['admin', 'caretaker'] and request.user_id != tenant_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
         month = request.args.get('month', type=int)
@@ -107,7 +93,8 @@ def get_tenant_rent_records(tenant_id):
         }), 200
         
     except Exception as e:
-        traceback.print_exc()
+        import traceback
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
 
 
@@ -116,7 +103,6 @@ def get_tenant_rent_records(tenant_id):
 @role_required(['caretaker', 'admin'])
 def mark_rent_payment():
     """Mark rent payment by caretaker"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         
@@ -136,7 +122,7 @@ def mark_rent_payment():
         # Mark payment
         rent_record.mark_payment(
             amount_paid=amount_paid,
-            caretaker_id=current_user.id,
+            caretaker_id=request.user_id,
             payment_method=payment_method,
             payment_reference=payment_reference,
             notes=notes
@@ -151,8 +137,7 @@ def mark_rent_payment():
         
     except Exception as e:
         db.session.rollback()
-        import traceback
-        current_app.logger.error(f"Error in {request.path}: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -161,7 +146,6 @@ def mark_rent_payment():
 @role_required(['admin', 'caretaker'])
 def generate_monthly_rent():
     """Generate rent records for all active tenants for a specific month"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         month = data.get('month')
@@ -170,53 +154,93 @@ def generate_monthly_rent():
         if not month or not year:
             return jsonify({'error': 'month and year are required'}), 400
         
-        current_app.logger.info(f"DEBUG: Generating rent for {month}/{year}")
-        
-        # Get all active leases
-        active_leases = Lease.query.filter_by(status='active').all()
+        month, year = int(month), int(year)
+        due_date = datetime(year, month, 1) + timedelta(days=5)  # Due on 5th of month
+        now = datetime.now(timezone.utc)
         
-        generated_records = []
-        for lease in active_leases:
-            # Check if record already exists
-            existing_record = RentRecord.query.filter(
-                and_(
-                    RentRecord.tenant_id == lease.tenant_id,
-                    RentRecord.property_id == lease.property_id,
-                    RentRecord.month == month,
-                    RentRecord.year == year
-                )
-            ).first()
-            
-            if not existing_record:
-                # Create new rent record
-                due_date = datetime(year, month, 1) + timedelta(days=5)  # Due on 5th of month
-                
-                rent_record = RentRecord(
-                    tenant_id=lease.tenant_id,
-                    property_id=lease.property_id,
-                    lease_id=lease.id,
-                    due_date=due_date,
-                    amount_due=lease.rent_amount,
-                    balance=lease.rent_amount,
-                    month=month,
-                    year=year
-                )
-                
-                rent_record.calculate_balance()
-                db.session.add(rent_record)
-                generated_records.append(rent_record)
+        # A due date already in the past makes a fresh record overdue, as calculate_balance() would
+        unpaid_status = RentStatus.OVERDUE if due_date.replace(tzinfo=timezone.utc) < now else RentStatus.UNPAID
+        
+        # One active lease per tenant that has no rent record for this month yet (anti-join)
+        first_leases = db.session.query(
+            func.min(Lease.id).label('lease_id')
+        ).filter(Lease.status == 'active').group_by(Lease.tenant_id).subquery()
+        
+        existing = RentRecord.query.filter(
+            RentRecord.tenant_id == Lease.tenant_id,
+            RentRecord.month == month,
+            RentRecord.year == year
+        ).exists()
+        
+        pending_leases = db.session.query(
+            Lease.id, Lease.tenant_id, Lease.property_id, Lease.rent_amount
+        ).join(
+            first_leases, first_leases.c.lease_id == Lease.id
+        ).filter(~existing).all()
+        
+        rows = []
+        for lease_id, tenant_id, property_id, rent_amount in pending_leases:
+            amount_due = float(rent_amount or 0)
+            rows.append({
+                'tenant_id': tenant_id,
+                'property_id': property_id,
+                'lease_id': lease_id,
+                'due_date': due_date,
+                'amount_due': amount_due,
+                'amount_paid': 0.0,
+                'balance': amount_due,
+                'status': unpaid_status if amount_due > 0 else RentStatus.PAID,
+                'month': month,
+                'year': year,
+                'is_auto_calculated': True,
+                'last_calculated': now,
+                'created_at': now,
+                'updated_at': now
+            })
         
+        record_ids = []
+        if rows:
+            record_ids = list(db.session.scalars(insert(RentRecord).returning(RentRecord.id, sort_by_parameter_order=True), rows))
+            # Bulk inserts bypass the flush hook that maintains the ledger
+            apply_bulk_rows(db.session.connection(), 'rent', rows)
         db.session.commit()
         
-        return jsonify({
-            'message': f'Generated {len(generated_records)} rent records',
-            'records': [record.to_dict() for record in generated_records]
-        }), 200
+        response = {
+            'message': f'Generated {len(record_ids)} rent records',
+            'generated_count': len(record_ids),
+            'record_ids': record_ids,
+            'records': [
+                {
+                    'id': record_id,
+                    'tenant_id': row['tenant_id'],
+                    'property_id': row['property_id'],
+                    'lease_id': row['lease_id'],
+                    'amount_due': row['amount_due'],
+                    'status': row['status'].value,
+                    'month': month,
+                    'year': year
+                }
+                for record_id, row in zip(record_ids, rows)
+            ]
+        }
+        
+        # Full serialisation is opt-in; it loads tenant, property and caretaker per record
+        if request.args.get('detail') == 'full' and record_ids:
+            records = RentRecord.query.options(
+                joinedload(RentRecord.tenant),
+                joinedload(RentRecord.property),
+                joinedload(RentRecord.paid_by_caretaker)
+            ).filter(RentRecord.id.in_(record_ids)).all()
+            response['records'] = [record.to_dict() for record in records]
+        
+        return jsonify(response), 200
         
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': f'Rent records for {month}/{year} are already being generated'}), 409
     except Exception as e:
         db.session.rollback()
-        import traceback
-        current_app.logger.error(f"Error in {request.path}: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -249,11 +273,11 @@ def get_tenants_with_leases():
         return '', 200
         
     try:
-        current_app.logger.info("Fetching tenants with active leases...")
+        current_app.logger.debug("Fetching tenants with active leases...")
         
         # Get all tenants with active leases using a more robust query
         active_leases = Lease.query.filter_by(status='active').all()
-        current_app.logger.info(f"Found {len(active_leases)} active leases")
+        current_app.logger.debug(f"Found {len(active_leases)} active leases")
         
         tenants_data = []
         for lease in active_leases:
@@ -276,13 +300,13 @@ def get_tenants_with_leases():
                     'deposit_amount': lease.deposit_amount or 0
                 }
                 tenants_data.append(tenant_data)
-                current_app.logger.info(f"Added tenant: {tenant_name}, Room: {room_number}")
+                current_app.logger.debug(f"Added tenant: {tenant_name}, Room: {room_number}")
                 
             except Exception as e:
                 current_app.logger.error(f"Error processing lease {lease.id}: {str(e)}")
                 continue
         
-        current_app.logger.info(f"Successfully processed {len(tenants_data)} tenants")
+        current_app.logger.debug(f"Successfully processed {len(tenants_data)} tenants")
         return jsonify({
             'success': True,
             'tenants': tenants_data
@@ -301,7 +325,7 @@ def get_tenants_with_leases():
 def mark_rent_paid(rent_id):
     """Mark rent as paid by caretaker"""
     try:
-        current_user = db.session.get(User, request.user_id)
+        current_user = get_current_user()
         
         rent_record = RentRecord.query.get(rent_id)
         if not rent_record:
@@ -320,15 +344,12 @@ def mark_rent_paid(rent_id):
         db.session.add(notification)
         
         # Create notification for admin
-        admin_users = User.query.filter_by(role='admin').all()
-        for admin in admin_users:
-            admin_notification = Notification(
-                user_id=admin.id,
-                title='Rent Payment Marked',
-                message=f'Caretaker {current_user.full_name} marked rent for tenant {rent_record.tenant.full_name} as paid.',
-                notification_type='payment'
-            )
-            db.session.add(admin_notification)
+        notify_staff(
+            title='Rent Payment Marked',
+            message=f'Caretaker {current_user.full_name} marked rent for tenant {rent_record.tenant.full_name} as paid.',
+            notification_type='payment',
+            roles=('admin',)
+        )
         
         db.session.commit()
         
@@ -352,7 +373,7 @@ def mark_rent_paid(rent_id):
 def mark_rent_unpaid(rent_id):
     """Mark rent as unpaid by caretaker"""
     try:
-        current_user = db.session.get(User, request.user_id)
+        current_user = get_current_user()
         
         rent_record = RentRecord.query.get(rent_id)
         if not rent_record:
@@ -375,15 +396,12 @@ def mark_rent_unpaid(rent_id):
         db.session.add(notification)
         
         # Create notification for admin
-        admin_users = User.query.filter_by(role='admin').all()
-        for admin in admin_users:
-            admin_notification = Notification(
-                user_id=admin.id,
-                title='Rent Payment Marked Unpaid',
-                message=f'Caretaker {current_user.full_name} marked rent for tenant {rent_record.tenant.full_name} as unpaid.',
-                notification_type='payment'
-            )
-            db.session.add(admin_notification)
+        notify_staff(
+            title='Rent Payment Marked Unpaid',
+            message=f'Caretaker {current_user.full_name} marked rent for tenant {rent_record.tenant.full_name} as unpaid.',
+            notification_type='payment',
+            roles=('admin',)
+        )
         
         db.session.commit()
         
@@ -410,7 +428,6 @@ def get_deposit_records():
     if request.method == 'OPTIONS':
         return '', 200
         
-    current_user = db.session.get(User, request.user_id)
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -450,10 +467,9 @@ def get_deposit_records():
 @token_required
 def get_tenant_deposit_records(tenant_id):
     """Get deposit records for a specific tenant"""
-    current_user = db.session.get(User, request.user_id)
     try:
         # Check if user is admin, caretaker, or the tenant themselves
-        if current_user.role not in ['admin', 'caretaker'] and current_user.id != tenant_id:
+        if request.user_role not in ['admin', 'caretaker'] and request.user_id != tenant_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
         records = DepositRecord.query.filter(
@@ -465,7 +481,8 @@ def get_tenant_deposit_records(tenant_id):
         }), 200
         
     except Exception as e:
-        traceback.print_exc()
+        import traceback
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
 
 
@@ -474,7 +491,6 @@ def get_tenant_deposit_records(tenant_id):
 @role_required(['admin'])
 def mark_deposit_refund():
     """Mark deposit refund by admin"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         
@@ -494,7 +510,7 @@ def mark_deposit_refund():
         # Mark refund
         deposit_record.mark_refund(
             refund_amount=refund_amount,
-            admin_id=current_user.id,
+            admin_id=request.user_id,
             refund_method=refund_method,
             refund_reference=refund_reference,
             refund_notes=refund_notes
@@ -509,8 +525,7 @@ def mark_deposit_refund():
         
     except Exception as e:
         db.session.rollback()
-        import traceback
-        current_app.logger.error(f"Error in {request.path}: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -519,7 +534,6 @@ def mark_deposit_refund():
 @role_required(['admin', 'caretaker'])
 def create_deposit_record():
     """Create deposit record for a tenant"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         
@@ -563,8 +577,7 @@ def create_deposit_record():
         
     except Exception as e:
         db.session.rollback()
-        import traceback
-        current_app.logger.error(f"Error in {request.path}: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -574,7 +587,6 @@ def create_deposit_record():
 @role_required(['admin', 'caretaker'])
 def get_dashboard_summary():
     """Get dashboard summary for rent and deposits"""
-    current_user = db.session.get(User, request.user_id)
     try:
         # Get current month and year
         now = datetime.now()
@@ -582,50 +594,51 @@ def get_dashboard_summary():
         current_year = now.year
         
         # Rent statistics
-        total_rent_records = RentRecord.query.count()
-        paid_rent = RentRecord.query.filter_by(status=RentStatus.PAID).count()
-        unpaid_rent = RentRecord.query.filter_by(status=RentStatus.UNPAID).count()
-        overdue_rent = RentRecord.query.filter_by(status=RentStatus.OVERDUE).count()
+        rent_counts = count_by(RentRecord.status)
+        total_rent_records = sum(rent_counts.values())
+        paid_rent = rent_counts.get(RentStatus.PAID, 0)
+        unpaid_rent = rent_counts.get(RentStatus.UNPAID, 0)
+        overdue_rent = rent_counts.get(RentStatus.OVERDUE, 0)
         
         # Current month rent
-        current_month_rent = RentRecord.query.filter(
-            and_(
-                RentRecord.month == current_month,
-                RentRecord.year == current_year
-            )
-        ).all()
-        
-        current_month_paid = len([r for r in current_month_rent if r.status == RentStatus.PAID])
-        current_month_unpaid = len([r for r in current_month_rent if r.status != RentStatus.PAID])
+        current_month_rent = count_by(
+            RentRecord.status,
+            RentRecord.month == current_month,
+            RentRecord.year == current_year
+        )
+        current_month_paid = current_month_rent.get(RentStatus.PAID, 0)
+        current_month_unpaid = sum(current_month_rent.values()) - current_month_paid
         
         # Deposit statistics
-        total_deposit_records = DepositRecord.query.count()
-        paid_deposits = DepositRecord.query.filter_by(status=DepositStatus.PAID).count()
-        unpaid_deposits = DepositRecord.query.filter_by(status=DepositStatus.UNPAID).count()
-        refunded_deposits = DepositRecord.query.filter_by(status=DepositStatus.REFUNDED).count()
+        deposit_counts = count_by(DepositRecord.status)
+        total_deposit_records = sum(deposit_counts.values())
+        paid_deposits = deposit_counts.get(DepositStatus.PAID, 0)
+        unpaid_deposits = deposit_counts.get(DepositStatus.UNPAID, 0)
+        refunded_deposits = deposit_counts.get(DepositStatus.REFUNDED, 0)
         
         # Calculate totals
-        total_rent_due = sum([float(r.amount_due) for r in current_month_rent])
-        total_rent_collected = sum([float(r.amount_paid) for r in current_month_rent])
+        rent_totals = MonthlyLedger.totals('rent', year=current_year, month=current_month)
+        total_rent_due = rent_totals['amount_due']
+        total_rent_collected = rent_totals['amount_paid']
         
         # Water bill statistics
-        current_month_water = WaterBill.query.filter(
-            and_(
-                WaterBill.month == current_month,
-                WaterBill.year == current_year
-            )
-        ).all()
-        
-        total_water_records = WaterBill.query.count()
-        paid_water = WaterBill.query.filter_by(status=WaterBillStatus.PAID).count()
-        unpaid_water = WaterBill.query.filter_by(status=WaterBillStatus.UNPAID).count()
-        overdue_water = WaterBill.query.filter_by(status=WaterBillStatus.OVERDUE).count()
-        
-        current_month_water_paid = len([w for w in current_month_water if w.status == WaterBillStatus.PAID])
-        current_month_water_unpaid = len([w for w in current_month_water if w.status != WaterBillStatus.PAID])
+        water_counts = count_by(WaterBill.status)
+        total_water_records = sum(water_counts.values())
+        paid_water = water_counts.get(WaterBillStatus.PAID, 0)
+        unpaid_water = water_counts.get(WaterBillStatus.UNPAID, 0)
+        overdue_water = water_counts.get(WaterBillStatus.OVERDUE, 0)
+        
+        current_month_water = count_by(
+            WaterBill.status,
+            WaterBill.month == current_month,
+            WaterBill.year == current_year
+        )
+        current_month_water_paid = current_month_water.get(WaterBillStatus.PAID, 0)
+        current_month_water_unpaid = sum(current_month_water.values()) - current_month_water_paid
         
-        total_water_due = sum([float(w.amount_due) for w in current_month_water])
-        total_water_collected = sum([float(w.amount_paid) for w in current_month_water])
+        water_totals = MonthlyLedger.totals('water', year=current_year, month=current_month)
+        total_water_due = water_totals['amount_due']
+        total_water_collected = water_totals['amount_paid']
         
         return jsonify({
             'rent_summary': {
@@ -670,7 +683,6 @@ def get_dashboard_summary():
 @role_required(['admin', 'caretaker'])
 def get_water_bill_records():
     """Get all water bill records with optional filters"""
-    current_user = db.session.get(User, request.user_id)
     try:
         page = request.args.get('page', 1, type=int)
         per_page = request.args.get('per_page', 20, type=int)
@@ -725,10 +737,9 @@ def get_water_bill_records():
 @token_required
 def get_tenant_water_bills(tenant_id):
     """Get water bills for a specific tenant"""
-    current_user = db.session.get(User, request.user_id)
     try:
         # Check if user is admin, caretaker, or the tenant themselves
-        if current_user.role not in ['admin', 'caretaker'] and current_user.id != tenant_id:
+        if request.user_role not in ['admin', 'caretaker'] and request.user_id != tenant_id:
             return jsonify({'error': 'Unauthorized'}), 403
         
         month = request.args.get('month', type=int)
@@ -748,7 +759,8 @@ def get_tenant_water_bills(tenant_id):
         }), 200
         
     except Exception as e:
-        traceback.print_exc()
+        import traceback
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e), 'trace': traceback.format_exc()}), 500
 
 
@@ -757,7 +769,6 @@ def get_tenant_water_bills(tenant_id):
 @role_required(['caretaker', 'admin'])
 def create_water_bill():
     """Create water bill for tenant (caretaker simplified version)"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         
@@ -827,8 +838,7 @@ def create_water_bill():
         
     except Exception as e:
         db.session.rollback()
-        import traceback
-        current_app.logger.error(f"Error in {request.path}: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -837,85 +847,42 @@ def create_water_bill():
 @role_required(['caretaker'])
 def bulk_create_water_bills():
     """Bulk create water bills for all active tenants for a specific month"""
-    current_user = db.session.get(User, request.user_id)
     try:
-        data = request.get_json()
+        data, bills_data = _water_reading_payload('bills')  # Array of {tenant_id, property_id, lease_id, previous_reading, current_reading}
         
         month = data.get('month')
         year = data.get('year')
         reading_date = data.get('reading_date')
         unit_rate = data.get('unit_rate', 50.0)
-        bills_data = data.get('bills', [])  # Array of {tenant_id, property_id, lease_id, previous_reading, current_reading}
         
         if not all([month, year, reading_date]) or not bills_data:
             return jsonify({'error': 'month, year, reading_date, and bills data are required'}), 400
         
-        created_bills = []
-        errors = []
-        
-        for bill_data in bills_data:
-            try:
-                tenant_id = bill_data.get('tenant_id')
-                property_id = bill_data.get('property_id')
-                lease_id = bill_data.get('lease_id')
-                previous_reading = bill_data.get('previous_reading')
-                current_reading = bill_data.get('current_reading')
-                
-                if not all([tenant_id, property_id, lease_id, previous_reading, current_reading]):
-                    errors.append(f'Invalid data for tenant {tenant_id}')
-                    continue
-                
-                # Check if water bill already exists
-                existing_bill = WaterBill.query.filter(
-                    and_(
-                        WaterBill.tenant_id == tenant_id,
-                        WaterBill.month == month,
-                        WaterBill.year == year
-                    )
-                ).first()
-                
-                if existing_bill:
-                    errors.append(f'Water bill already exists for tenant {tenant_id}')
-                    continue
-                
-                # Create due date (15th of following month)
-                if month == 12:
-                    due_date = datetime(year + 1, 1, 15)
-                else:
-                    due_date = datetime(year, month + 1, 15)
-                
-                water_bill = WaterBill(
-                    tenant_id=tenant_id,
-                    property_id=property_id,
-                    lease_id=lease_id,
-                    month=month,
-                    year=year,
-                    reading_date=datetime.fromisoformat(reading_date),
-                    previous_reading=previous_reading,
-                    current_reading=current_reading,
-                    unit_rate=unit_rate,
-                    due_date=due_date
-                )
-                
-                water_bill.calculate_amount()
-                db.session.add(water_bill)
-                created_bills.append(water_bill)
-                
-            except Exception as e:
-                errors.append(f'Error creating bill for tenant {bill_data.get("tenant_id", "unknown")}: {str(e)}')
-        
+        month, year = int(month), int(year)
+        result = ingest_water_readings(
+            bills_data, month, year, unit_rate, request.user_id,
+            reading_date=datetime.fromisoformat(reading_date),
+            due_day=15,  # Due on 15th of following month
+            update_existing=False
+        )
         db.session.commit()
         
+        created = result['created']
         return jsonify({
-            'message': f'Created {len(created_bills)} water bills successfully',
-            'created_bills': [bill.to_dict() for bill in created_bills],
-            'errors': errors
+            'message': f'Created {len(created)} water bills successfully',
+            'created_bills': _ingested_bills(created, month, year),
+            'errors': result['errors']
         }), 201
         
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'error': str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'error': f'Water bills for {month}/{year} are already being recorded'}), 409
     except Exception as e:
         db.session.rollback()
-        import traceback
-        current_app.logger.error(f"Error in {request.path}: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
@@ -927,118 +894,62 @@ def run_overdue_checks():
     """
     Manually trigger checks for overdue payments (Rent & Water).
     Updates status to 'overdue' and sends notifications.
-    Typically run after the 5th of the month.
+    The same sweep runs on a schedule via `flask run-checks`.
     """
-    current_user = db.session.get(User, request.user_id)
     try:
-        from models import Notification
-        
-        now = datetime.now()
-        current_date = now.date()
-        
-        # 1. Check Overdue Rent
-        # Find unpaid/pending rent records where due_date < current_date
-        overdue_rent = RentRecord.query.filter(
-            and_(
-                RentRecord.status.in_([RentStatus.UNPAID, RentStatus.PENDING]),
-                RentRecord.due_date < current_date
-            )
-        ).all()
-        
-        rent_updates = 0
-        rent_notifications = 0
-        
-        for record in overdue_rent:
-            # Update status
-            record.status = RentStatus.OVERDUE
-            rent_updates += 1
-            
-            # Check if notification already sent today to avoid spamming
-            existing_notif = Notification.query.filter(
-                and_(
-                    Notification.user_id == record.tenant_id,
-                    Notification.type == 'payment_overdue',
-                    Notification.created_at >= datetime(now.year, now.month, now.day)
-                )
-            ).first()
-            
-            if not existing_notif:
-                # Create notification
-                notif = Notification(
-                    user_id=record.tenant_id,
-                    title="Rent Payment Overdue",
-                    message=f"Your rent payment of KES {record.balance:,.2f} for {record.month}/{record.year} is overdue. Please pay immediately.",
-                    type="payment_overdue",
-                    is_read=False
-                )
-                db.session.add(notif)
-                rent_notifications += 1
-
-        # 2. Check Overdue Water Bills
-        overdue_water = WaterBill.query.filter(
-            and_(
-                WaterBill.status.in_([WaterBillStatus.UNPAID, WaterBillStatus.PENDING]),
-                WaterBill.due_date < current_date
-            )
-        ).all()
-        
-        water_updates = 0
-        
-        for bill in overdue_water:
-            bill.status = WaterBillStatus.OVERDUE
-            water_updates += 1
-            
-            # Check existing notification
-            existing_notif = Notification.query.filter(
-                and_(
-                    Notification.user_id == bill.tenant_id,
-                    Notification.type == 'payment_overdue',
-                    Notification.message.like('%water bill%'),
-                    Notification.created_at >= datetime(now.year, now.month, now.day)
-                )
-            ).first()
-            
-            if not existing_notif:
-                notif = Notification(
-                    user_id=bill.tenant_id,
-                    title="Water Bill Overdue",
-                    message=f"Your water bill of KES {bill.balance:,.2f} for {bill.month}/{bill.year} is overdue.",
-                    type="payment_overdue",
-                    is_read=False
-                )
-                db.session.add(notif)
-
-        db.session.commit()
+        summary = overdue_checks.run_overdue_checks()
+        if summary is None:
+            return jsonify({'error': 'Overdue checks are already running'}), 409
         
         return jsonify({
             'message': 'Overdue checks completed successfully',
-            'summary': {
-                'rent_records_updated': rent_updates,
-                'rent_notifications_sent': rent_notifications,
-                'water_bills_updated': water_updates
-            }
+            'summary': summary
         }), 200
 
     except Exception as e:
         db.session.rollback()
-        import traceback
-        current_app.logger.error(f"Error in {request.path}: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Error in {request.path}: {str(e)}")
         return jsonify({'error': str(e)}), 500
 
 
 # Water Bill Management Routes for Caretakers
+def _water_reading_payload(readings_key):
+    """
+    Request fields and readings from a JSON body, or from a multipart form
+    with a CSV file of meter readings under 'file'.
+    """
+    upload = request.files.get('file')
+    if upload is not None:
+        return request.form.to_dict(), parse_readings_csv(upload)
+
+    data = request.get_json() or {}
+    return data, data.get(readings_key, [])
+
+
+def _ingested_bills(rows, month, year):
+    """Light views of ingested bills, or full to_dict() output with ?detail=full."""
+    if request.args.get('detail') != 'full' or not rows:
+        return [bill_summary(row, month, year) for row in rows]
+
+    bills = WaterBill.query.options(
+        joinedload(WaterBill.tenant),
+        joinedload(WaterBill.property),
+        joinedload(WaterBill.paid_by_caretaker),
+        joinedload(WaterBill.recorded_by_caretaker)
+    ).filter(WaterBill.id.in_([row['id'] for row in rows])).all()
+    return [bill.to_dict() for bill in bills]
+
+
 @rent_deposit_bp.route('/water-bill/record-readings', methods=['POST'])
 @token_required
 @role_required(['admin', 'caretaker'])
 def record_water_readings():
-    """Record water readings for all tenants for a specific month"""
-    current_user = db.session.get(User, request.user_id)
+    """Record water readings for all tenants for a specific month (JSON or CSV upload)"""
     try:
-        data = request.get_json()
+        data, readings = _water_reading_payload('readings')  # List of {tenant_id, current_reading, previous_reading}
         month = data.get('month')
         year = data.get('year')
         unit_rate = data.get('unit_rate', 50.0)  # Default rate per unit
-        readings = data.get('readings', [])  # List of {tenant_id, current_reading, previous_reading}
         
         if not month or not year:
             return jsonify({'success': False, 'error': 'Month and year are required'}), 400
@@ -1046,75 +957,26 @@ def record_water_readings():
         if not readings:
             return jsonify({'success': False, 'error': 'At least one reading is required'}), 400
         
-        created_bills = []
-        updated_bills = []
-        errors = []
-        
-        for reading_data in readings:
-            try:
-                tenant_id = reading_data.get('tenant_id')
-                current_reading = reading_data.get('current_reading')
-                previous_reading = reading_data.get('previous_reading', 0)
-                
-                if not tenant_id or current_reading is None:
-                    errors.append(f"Invalid reading data for tenant {tenant_id}")
-                    continue
-                
-                # Get tenant's active lease
-                active_lease = Lease.query.filter_by(
-                    tenant_id=tenant_id, 
-                    status='active'
-                ).first()
-                
-                if not active_lease:
-                    errors.append(f"No active lease found for tenant {tenant_id}")
-                    continue
-                
-                # Check if water bill already exists for this month/year
-                existing_bill = WaterBill.query.filter_by(
-                    tenant_id=tenant_id,
-                    month=month,
-                    year=year
-                ).first()
-                
-                if existing_bill:
-                    # Update existing bill
-                    existing_bill.current_reading = current_reading
-                    existing_bill.previous_reading = previous_reading
-                    existing_bill.unit_rate = unit_rate
-                    existing_bill.recorded_by_caretaker_id = current_user.id
-                    existing_bill.calculate_amount()
-                    updated_bills.append(existing_bill)
-                else:
-                    # Create new water bill
-                    water_bill = WaterBill.create_monthly_bill(
-                        tenant=active_lease.tenant,
-                        property=active_lease.property,
-                        lease=active_lease,
-                        current_reading=current_reading,
-                        previous_reading=previous_reading,
-                        unit_rate=unit_rate,
-                        caretaker_id=current_user.id,
-                        month=month,
-                        year=year
-                    )
-                    db.session.add(water_bill)
-                    created_bills.append(water_bill)
-                    
-            except Exception as e:
-                errors.append(f"Error processing reading for tenant {tenant_id}: {str(e)}")
-        
+        month, year = int(month), int(year)
+        result = ingest_water_readings(readings, month, year, unit_rate, request.user_id)
         db.session.commit()
         
+        created, updated = result['created'], result['updated']
         return jsonify({
             'success': True,
-            'message': f'Processed {len(created_bills + updated_bills)} water bills successfully',
-            'created_bills': len(created_bills),
-            'updated_bills': len(updated_bills),
-            'errors': errors,
-            'bills': [bill.to_dict() for bill in created_bills + updated_bills]
+            'message': f'Processed {len(created) + len(updated)} water bills successfully',
+            'created_bills': len(created),
+            'updated_bills': len(updated),
+            'errors': result['errors'],
+            'bills': _ingested_bills(created + updated, month, year)
         }), 200
         
+    except ValueError as e:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': str(e)}), 400
+    except IntegrityError:
+        db.session.rollback()
+        return jsonify({'success': False, 'error': f'Water readings for {month}/{year} are already being recorded'}), 409
     except Exception as e:
         db.session.rollback()
         current_app.logger.error(f"Error recording water readings: {str(e)}")
@@ -1177,7 +1039,6 @@ def get_tenants_for_water_readings():
 @role_required(['admin', 'caretaker'])
 def mark_water_bill_payment():
     """Mark water bill payment for a tenant"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         bill_id = data.get('bill_id')
@@ -1196,7 +1057,7 @@ def mark_water_bill_payment():
         # Record payment
         water_bill.mark_payment(
             amount_paid=amount_paid,
-            caretaker_id=current_user.id,
+            caretaker_id=request.user_id,
             payment_method=payment_method,
             payment_reference=payment_reference,
             notes=notes
@@ -1391,7 +1252,6 @@ def get_tenants_for_deposits():
 @role_required(['admin', 'caretaker'])
 def mark_deposit_payment():
     """Mark deposit payment for a tenant"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         deposit_id = data.get('deposit_id')
@@ -1411,7 +1271,7 @@ def mark_deposit_payment():
         # Record payment
         deposit_record.mark_payment(
             amount_paid=amount_paid,
-            caretaker_id=current_user.id,
+            caretaker_id=request.user_id,
             payment_method=payment_method,
             payment_reference=payment_reference,
             notes=notes
@@ -1447,7 +1307,6 @@ def mark_deposit_payment():
 @role_required(['admin', 'caretaker'])
 def update_deposit_status():
     """Update deposit status (mark as paid/unpaid)"""
-    current_user = db.session.get(User, request.user_id)
     try:
         data = request.get_json()
         deposit_id = data.get('deposit_id')
@@ -1475,7 +1334,7 @@ def update_deposit_status():
             
             deposit_record.mark_payment(
                 amount_paid=amount_paid,
-                caretaker_id=current_user.id,
+                caretaker_id=request.user_id,
                 payment_method=payment_method,
                 payment_reference=payment_reference,
                 notes=notes
@@ -1533,49 +1392,20 @@ def update_deposit_status():
 def get_deposit_summary():
     """Get deposit summary statistics"""
     try:
-        # Get all deposit records
-        deposit_records = DepositRecord.query.all()
-        
-        total_deposits = len(deposit_records)
-        total_amount_required = sum(float(record.amount_required) for record in deposit_records)
-        total_amount_paid = sum(float(record.amount_paid) for record in deposit_records)
-        total_balance = sum(float(record.balance) for record in deposit_records)
-        
-        status_counts = {
-            'unpaid': len([r for r in deposit_records if r.status == DepositStatus.UNPAID]),
-            'paid': len([r for r in deposit_records if r.status == DepositStatus.PAID]),
-            'refunded': len([r for r in deposit_records if r.status == DepositStatus.REFUNDED]),
-            'partially_refunded': len([r for r in deposit_records if r.status == DepositStatus.PARTIALLY_REFUNDED])
-        }
-        
-        # Property breakdown
-        property_breakdown = {}
-        for record in deposit_records:
-            prop_name = record.property.name if record.property else 'Unknown'
-            if prop_name not in property_breakdown:
-                property_breakdown[prop_name] = {
-                    'total_deposits': 0,
-                    'total_required': 0,
-                    'total_paid': 0,
-                    'total_balance': 0,
-                    'status_counts': {'unpaid': 0, 'paid': 0, 'refunded': 0, 'partially_refunded': 0}
-                }
-            property_breakdown[prop_name]['total_deposits'] += 1
-            property_breakdown[prop_name]['total_required'] += float(record.amount_required)
-            property_breakdown[prop_name]['total_paid'] += float(record.amount_paid)
-            property_breakdown[prop_name]['total_balance'] += float(record.balance)
-            property_breakdown[prop_name]['status_counts'][record.status.value] += 1
+        summary = deposit_summary()
+        total_amount_required = summary['total_amount_required']
+        total_amount_paid = summary['total_amount_paid']
         
         return jsonify({
             'success': True,
             'summary': {
-                'total_deposits': total_deposits,
+                'total_deposits': summary['total_deposits'],
                 'total_amount_required': total_amount_required,
                 'total_amount_paid': total_amount_paid,
-                'total_balance': total_balance,
+                'total_balance': summary['total_balance'],
                 'collection_rate': (total_amount_paid / total_amount_required * 100) if total_amount_required > 0 else 0,
-                'status_counts': status_counts,
-                'property_breakdown': property_breakdown
+                'status_counts': summary['status_counts'],
+                'property_breakdown': summary['property_breakdown']
             }
         }), 200
         
@@ -3,21 +3,24 @@ from functools import wraps
 from datetime import datetime, timedelta, timezone
 import base64
 import os
-import traceback
+import time
+from sqlalchemy import select
 
 from models.base import db
 from models.user import User
 from models.lease import Lease
 from models.payment import Payment
+from models.payment_job import PaymentJob
 from models.maintenance import MaintenanceRequest
 from models.notification import Notification
 from models.vacate_notice import VacateNotice
 from models.property import Property
 from models.rent_deposit import DepositRecord
-from routes.auth_routes import token_required
-from services.mpesa_service import MpesaService
-from config import Config
-from utils.finance import calculate_outstanding_balance
+from routes.auth_routes import token_required, get_current_user
+from services.notification_service import notify_staff
+from services.payment_jobs import enqueue_stk_push
+from services.payment_reconciler import wait_for_status_change
+from utils.finance import calculate_outstanding_balance, get_active_leases_by_tenant
 
 tenant_bp = Blueprint("tenant", __name__)
 
@@ -99,14 +102,14 @@ def get_account_details_backend(room_number):
 def dashboard():
     """Get tenant dashboard overview."""
     try:
-        current_app.logger.info(f"🔍 Fetching dashboard for user_id: {request.user_id}")
+        current_app.logger.debug(f"Fetching dashboard for user_id: {request.user_id}")
         
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         if not user:
-            current_app.logger.error(f"❌ User not found: {request.user_id}")
+            current_app.logger.error(f"User not found: {request.user_id}")
             return jsonify({"success": False, "error": "User not found"}), 404
 
-        active_lease = Lease.query.filter_by(tenant_id=user.id, status='active').first()
+        active_lease = get_active_leases_by_tenant([user.id]).get(user.id)
         
         recent_payments = []
         if active_lease:
@@ -148,7 +151,7 @@ def dashboard():
 
         outstanding_balance = calculate_outstanding_balance(active_lease)
 
-        current_app.logger.info(f"✅ Dashboard data loaded for {user.email}")
+        current_app.logger.debug(f"Dashboard data loaded for {user.email}")
         
         return jsonify({
             "success": True,
@@ -170,7 +173,7 @@ def dashboard():
         }), 200
 
     except Exception as e:
-        current_app.logger.error(f"❌ Dashboard error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Dashboard error: {str(e)}")
         return jsonify({"success": False, "error": f"Dashboard error: {str(e)}"}), 500
 
 
@@ -179,7 +182,7 @@ def dashboard():
 def get_tenant_profile():
     """Get tenant profile information."""
     try:
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         if not user:
             return jsonify({"success": False, "error": "User not found"}), 404
         
@@ -199,7 +202,7 @@ def get_tenant_profile():
             }
         }), 200
     except Exception as e:
-        current_app.logger.error(f"❌ Profile error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Profile error: {str(e)}")
         return jsonify({"success": False, "error": f"Profile error: {str(e)}"}), 500
 
 
@@ -208,7 +211,7 @@ def get_tenant_profile():
 def get_payment_details():
     """Get payment details for current tenant's room"""
     try:
-        current_app.logger.info(f"💰 Fetching payment details for user_id: {request.user_id}")
+        current_app.logger.debug(f"Fetching payment details for user_id: {request.user_id}")
         
         lease = Lease.query.filter_by(
             tenant_id=request.user_id,
@@ -216,14 +219,14 @@ def get_payment_details():
         ).first()
         
         if not lease:
-            current_app.logger.warning(f"❌ No active lease found for user_id: {request.user_id}")
+            current_app.logger.warning(f"No active lease found for user_id: {request.user_id}")
             return jsonify({
                 "success": False,
                 "error": "No active lease found. Please sign your lease agreement first."
             }), 404
         
         if not lease.signed_by_tenant:
-            current_app.logger.warning(f"⚠️ Lease {lease.id} not signed yet")
+            current_app.logger.warning(f"Lease {lease.id} not signed yet")
             return jsonify({
                 "success": False,
                 "error": "Please sign your lease agreement before accessing payment details"
@@ -232,7 +235,7 @@ def get_payment_details():
         property = db.session.get(Property, lease.property_id)
         
         if not property:
-            current_app.logger.warning(f"❌ Property not found for lease_id: {lease.id}")
+            current_app.logger.warning(f"Property not found for lease_id: {lease.id}")
             return jsonify({
                 "success": False,
                 "error": "Property not found"
@@ -240,7 +243,7 @@ def get_payment_details():
         
         room_number = property.name.replace("Room ", "").strip()
         
-        current_app.logger.info(f"✅ Payment details found - Room: {room_number}, Rent: {property.rent_amount}")
+        current_app.logger.debug(f"Payment details found - Room: {room_number}, Rent: {property.rent_amount}")
         
         return jsonify({
             "success": True,
@@ -256,7 +259,7 @@ def get_payment_details():
         }), 200
         
     except Exception as e:
-        current_app.logger.error(f"❌ Payment details error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Payment details error: {str(e)}")
         return jsonify({
             "success": False,
             "error": f"Error fetching payment details: {str(e)}"
@@ -268,12 +271,12 @@ def get_payment_details():
 def get_lease_details():
     """Get current lease details."""
     try:
-        current_app.logger.info(f"📄 Fetching lease details for user_id: {request.user_id}")
+        current_app.logger.debug(f"Fetching lease details for user_id: {request.user_id}")
         
         lease = Lease.query.filter_by(tenant_id=request.user_id, status='active').first()
         
         if not lease:
-            current_app.logger.info(f"ℹ️ No active lease found for user_id: {request.user_id}")
+            current_app.logger.debug(f"No active lease found for user_id: {request.user_id}")
             return jsonify({
                 "success": True,
                 "message": "No active lease",
@@ -301,7 +304,7 @@ def get_lease_details():
             } if property else None
         }
 
-        current_app.logger.info(f"✅ Lease data loaded for user_id: {request.user_id}")
+        current_app.logger.debug(f"Lease data loaded for user_id: {request.user_id}")
         
         return jsonify({
             "success": True,
@@ -310,7 +313,7 @@ def get_lease_details():
         }), 200
 
     except Exception as e:
-        current_app.logger.error(f"❌ Lease error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Lease error: {str(e)}")
         return jsonify({"success": False, "error": f"Lease error: {str(e)}"}), 500
 
 
@@ -320,19 +323,19 @@ def sign_lease():
     """Sign lease agreement with digital signature. Auto-creates if missing."""
     try:
         data = request.get_json()
-        current_app.logger.info(f"✍️ Lease signing attempt for user_id: {request.user_id}")
+        current_app.logger.info(f"Lease signing attempt for user_id: {request.user_id}")
         
         if not data.get('signature'):
-            current_app.logger.error("❌ Signature is required")
+            current_app.logger.error("Signature is required")
             return jsonify({"success": False, "error": "Signature is required"}), 400
         
         if not data.get('terms_accepted'):
-            current_app.logger.error("❌ Must accept terms and conditions")
+            current_app.logger.error("Must accept terms and conditions")
             return jsonify({"success": False, "error": "Must accept terms and conditions"}), 400
         
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         if not user:
-            current_app.logger.error(f"❌ User not found: {request.user_id}")
+            current_app.logger.error(f"User not found: {request.user_id}")
             return jsonify({"success": False, "error": "User not found"}), 404
         
         lease = Lease.query.filter_by(
@@ -341,10 +344,10 @@ def sign_lease():
         ).first()
         
         if not lease:
-            current_app.logger.info(f"ℹ️ No active lease found, creating one for user_id: {request.user_id}")
+            current_app.logger.info(f"No active lease found, creating one for user_id: {request.user_id}")
             
             if not user.room_number:
-                current_app.logger.error("❌ No room number assigned to user")
+                current_app.logger.error("No room number assigned to user")
                 return jsonify({
                     "success": False, 
                     "error": "No room assigned. Please contact admin."
@@ -352,7 +355,7 @@ def sign_lease():
             
             account_details = get_account_details_backend(user.room_number)
             if not account_details:
-                current_app.logger.error(f"❌ Invalid room number: {user.room_number}")
+                current_app.logger.error(f"Invalid room number: {user.room_number}")
                 return jsonify({
                     "success": False, 
                     "error": f"Invalid room number: {user.room_number}"
@@ -362,7 +365,7 @@ def sign_lease():
             property = Property.query.filter_by(name=property_name).first()
             
             if not property:
-                current_app.logger.info(f"✅ Creating property: {property_name}")
+                current_app.logger.info(f"Creating property: {property_name}")
                 property = Property(
                     name=property_name,
                     property_type=account_details['room_type'],
@@ -374,9 +377,9 @@ def sign_lease():
                 )
                 db.session.add(property)
                 db.session.commit()
-                current_app.logger.info(f"✅ Created property: {property_name}")
+                current_app.logger.info(f"Created property: {property_name}")
             else:
-                current_app.logger.info(f"✅ Using existing property: {property_name}")
+                current_app.logger.info(f"Using existing property: {property_name}")
             
             lease = Lease(
                 tenant_id=user.id,
@@ -391,10 +394,10 @@ def sign_lease():
             )
             db.session.add(lease)
             db.session.commit()
-            current_app.logger.info(f"✅ Created lease: {lease.id}")
+            current_app.logger.info(f"Created lease: {lease.id}")
         
         if lease.signed_by_tenant:
-            current_app.logger.warning(f"⚠️ Lease {lease.id} already signed")
+            current_app.logger.warning(f"Lease {lease.id} already signed")
             return jsonify({"success": False, "error": "Lease already signed"}), 400
         
         signature_data = data['signature']
@@ -415,27 +418,20 @@ def sign_lease():
         
         db.session.commit()
         
-        current_app.logger.info(f"✅ Lease {lease.id} signed successfully by user_id: {request.user_id}")
+        current_app.logger.info(f"Lease {lease.id} signed successfully by user_id: {request.user_id}")
         
         try:
             property = db.session.get(Property, lease.property_id)
             
-            caretakers = User.query.filter_by(role='caretaker').all()
-            admins = User.query.filter_by(role='admin').all()
-            
-            for recipient in caretakers + admins:
-                notification = Notification(
-                    user_id=recipient.id,
-                    title=f"Lease Signed - Room {property.name if property else 'N/A'}",
-                    message=f"Tenant {user.full_name} has signed the lease agreement for Room {user.room_number}",
-                    notification_type='lease_signed'
-                )
-                db.session.add(notification)
-            
+            notify_staff(
+                title=f"Lease Signed - Room {property.name if property else 'N/A'}",
+                message=f"Tenant {user.full_name} has signed the lease agreement for Room {user.room_number}",
+                notification_type='lease'
+            )
             db.session.commit()
-            current_app.logger.info(f"📢 Notifications created for lease signing")
+            current_app.logger.debug("Notifications created for lease signing")
         except Exception as notif_error:
-            current_app.logger.error(f"⚠️ Failed to create notifications: {notif_error}")
+            current_app.logger.error(f"Failed to create notifications: {notif_error}")
         
         property = db.session.get(Property, lease.property_id) if lease.property_id else None
         
@@ -456,14 +452,14 @@ def sign_lease():
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"❌ Lease signing error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Lease signing error: {str(e)}")
         return jsonify({"success": False, "error": f"Error signing lease: {str(e)}"}), 500
 
 
 @tenant_bp.route("/stk-push", methods=["POST"])
 @tenant_required
 def initiate_mpesa_payment():
-    """Initiate M-Pesa STK Push."""
+    """Queue an M-Pesa STK Push; the payment job sends it and records the CheckoutRequestID."""
     try:
         data = request.get_json()
         phone_number = data.get('phone_number')
@@ -476,7 +472,7 @@ def initiate_mpesa_payment():
         if not lease:
             return jsonify({"success": False, "error": "No active lease found"}), 404
             
-        mpesa_service = MpesaService(Config)
+        user = get_current_user()
         
         # Automate account details based on room number
         account_details = get_account_details_backend(user.room_number)
@@ -487,42 +483,42 @@ def initiate_mpesa_payment():
         account_reference = account_details['account_number']
         description = f"Rent payment for Room {user.room_number}"
         
-        response_data, error = mpesa_service.initiate_stk_push(
-            phone_number=phone_number,
-            amount=amount,
-            shortcode=shortcode,
-            account_reference=account_reference,
-            description=description
-        )
-        
-        if error:
-            return jsonify({"success": False, "error": error}), 400
-            
-        # Create pending payment record
+        # Create pending payment record; the job fills in checkout_request_id
         payment = Payment(
             tenant_id=request.user_id,
             lease_id=lease.id,
             amount=amount,
             status='pending',
             payment_method='M-Pesa',
-            checkout_request_id=response_data.get('CheckoutRequestID'),
             description=description
         )
         db.session.add(payment)
+        job = enqueue_stk_push(payment, phone_number, shortcode, account_reference, description)
         db.session.commit()
         
         return jsonify({
             "success": True, 
-            "message": "STK Push initiated successfully. Please enter your PIN on your phone.",
-            "checkout_request_id": payment.checkout_request_id
-        }), 200
+            "message": "STK Push requested. You will receive a prompt on your phone shortly; enter your PIN to pay.",
+            "job_id": job.id,
+            "payment_id": payment.id
+        }), 202
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"STK Push error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"STK Push error: {str(e)}")
         return jsonify({"success": False, "error": str(e)}), 500
 
 
+@tenant_bp.route("/payment-jobs/<int:job_id>", methods=["GET"])
+@tenant_required
+def get_payment_job(job_id):
+    """Progress of a queued STK Push: queued, running, succeeded (with checkout_request_id) or failed."""
+    job = db.session.get(PaymentJob, job_id)
+    if not job or job.payment.tenant_id != request.user_id:
+        return jsonify({"success": False, "error": "Payment job not found"}), 404
+    return jsonify({"success": True, "job": job.to_dict()}), 200
+
+
 @tenant_bp.route("/payments", methods=["GET"])
 @tenant_required
 def get_payment_history():
@@ -553,7 +549,7 @@ def get_payment_history():
         }), 200
 
     except Exception as e:
-        current_app.logger.error(f"❌ Payments error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Payments error: {str(e)}")
         return jsonify({"success": False, "error": f"Payments error: {str(e)}"}), 500
 
 
@@ -563,12 +559,12 @@ def create_maintenance_request():
     """Create maintenance request."""
     try:
         data = request.get_json() or {}
-        current_app.logger.info(f"🔧 Creating maintenance request for user_id: {request.user_id}")
+        current_app.logger.info(f"Creating maintenance request for user_id: {request.user_id}")
         
         if not data.get('title') or not data.get('description'):
             return jsonify({"success": False, "error": "Title and description required"}), 400
 
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         lease = Lease.query.filter_by(tenant_id=request.user_id, status='active').first()
         
         property_id = None
@@ -594,25 +590,18 @@ def create_maintenance_request():
         db.session.add(new_request)
         db.session.commit()
 
-        current_app.logger.info(f"✅ Maintenance request created: {new_request.id}")
+        current_app.logger.info(f"Maintenance request created: {new_request.id}")
         
         try:
-            caretakers = User.query.filter_by(role='caretaker').all()
-            admins = User.query.filter_by(role='admin').all()
-            
-            for recipient in caretakers + admins:
-                notification = Notification(
-                    user_id=recipient.id,
-                    title=f"New Maintenance Request - {data['title'][:50]}",
-                    message=f"Tenant {user.full_name} submitted: {data['description'][:100]}...",
-                    notification_type='maintenance'
-                )
-                db.session.add(notification)
-            
+            notify_staff(
+                title=f"New Maintenance Request - {data['title'][:50]}",
+                message=f"Tenant {user.full_name} submitted: {data['description'][:100]}...",
+                notification_type='maintenance'
+            )
             db.session.commit()
-            current_app.logger.info(f"📢 Notifications created for maintenance request")
+            current_app.logger.debug("Notifications created for maintenance request")
         except Exception as notif_error:
-            current_app.logger.error(f"⚠️ Failed to create notifications: {notif_error}")
+            current_app.logger.error(f"Failed to create notifications: {notif_error}")
         
         request_data = {
             "id": new_request.id,
@@ -631,7 +620,7 @@ def create_maintenance_request():
 
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"❌ Maintenance error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Maintenance error: {str(e)}")
         return jsonify({"success": False, "error": f"Request failed: {str(e)}"}), 500
 
 
@@ -661,7 +650,7 @@ def get_maintenance_requests():
         }), 200
 
     except Exception as e:
-        current_app.logger.error(f"❌ Maintenance list error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Maintenance list error: {str(e)}")
         return jsonify({"success": False, "error": f"Failed to fetch: {str(e)}"}), 500
 
 
@@ -680,7 +669,7 @@ def maintenance_requests_combined():
 def get_room_details(unit_number):
     """Get room details for a specific unit."""
     try:
-        current_app.logger.info(f"🏠 Fetching room details for unit: {unit_number}, user_id: {request.user_id}")
+        current_app.logger.debug(f"Fetching room details for unit: {unit_number}, user_id: {request.user_id}")
         
         property = Property.query.filter_by(name=f"Room {unit_number}").first()
         
@@ -725,7 +714,7 @@ def get_room_details(unit_number):
         }), 200
         
     except Exception as e:
-        current_app.logger.error(f"❌ Room details error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Room details error: {str(e)}")
         return jsonify({"success": False, "error": f"Error fetching room: {str(e)}"}), 500
 
 
@@ -735,7 +724,7 @@ def submit_vacate_notice():
     """Submit vacate notice (30-day notice required)."""
     try:
         data = request.get_json()
-        current_app.logger.info(f"🚪 Submitting vacate notice for user_id: {request.user_id}")
+        current_app.logger.info(f"Submitting vacate notice for user_id: {request.user_id}")
         
         if not data.get('intended_move_date'):
             return jsonify({"success": False, "error": "Intended move date is required"}), 400
@@ -776,28 +765,21 @@ def submit_vacate_notice():
         db.session.add(notice)
         db.session.commit()
         
-        current_app.logger.info(f"✅ Vacate notice created: {notice.id}")
+        current_app.logger.info(f"Vacate notice created: {notice.id}")
         
         try:
-            user = db.session.get(User, request.user_id)
+            user = get_current_user()
             property = db.session.get(Property, lease.property_id) if lease.property_id else None
             
-            caretakers = User.query.filter_by(role='caretaker').all()
-            admins = User.query.filter_by(role='admin').all()
-            
-            for recipient in caretakers + admins:
-                notification = Notification(
-                    user_id=recipient.id,
-                    title=f"Vacate Notice - Room {property.name if property else 'N/A'}",
-                    message=f"Tenant {user.full_name} submitted vacate notice for {move_date.isoformat()}. Reason: {data.get('reason', 'No reason provided')}",
-                    notification_type='vacate_notice'
-                )
-                db.session.add(notification)
-            
+            notify_staff(
+                title=f"Vacate Notice - Room {property.name if property else 'N/A'}",
+                message=f"Tenant {user.full_name} submitted vacate notice for {move_date.isoformat()}. Reason: {data.get('reason', 'No reason provided')}",
+                notification_type='lease'
+            )
             db.session.commit()
-            current_app.logger.info(f"📢 Notifications created for vacate notice")
+            current_app.logger.debug("Notifications created for vacate notice")
         except Exception as notif_error:
-            current_app.logger.error(f"⚠️ Failed to create notifications: {notif_error}")
+            current_app.logger.error(f"Failed to create notifications: {notif_error}")
         
         return jsonify({
             "success": True,
@@ -813,7 +795,7 @@ def submit_vacate_notice():
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"❌ Vacate notice error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Vacate notice error: {str(e)}")
         return jsonify({"success": False, "error": f"Error submitting notice: {str(e)}"}), 500
 
 
@@ -854,7 +836,7 @@ def get_vacate_notices():
         }), 200
         
     except Exception as e:
-        current_app.logger.error(f"❌ Vacate notices error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Vacate notices error: {str(e)}")
         return jsonify({"success": False, "error": f"Error fetching notices: {str(e)}"}), 500
 
 
@@ -878,7 +860,7 @@ def cancel_vacate_notice(notice_id):
         db.session.delete(notice)
         db.session.commit()
         
-        current_app.logger.info(f"✅ Vacate notice {notice_id} cancelled")
+        current_app.logger.info(f"Vacate notice {notice_id} cancelled")
         
         return jsonify({
             "success": True,
@@ -887,7 +869,7 @@ def cancel_vacate_notice(notice_id):
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"❌ Cancel notice error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Cancel notice error: {str(e)}")
         return jsonify({"success": False, "error": f"Error cancelling notice: {str(e)}"}), 500
 
 
@@ -916,7 +898,7 @@ def get_notifications():
         }), 200
 
     except Exception as e:
-        current_app.logger.error(f"❌ Notifications error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Notifications error: {str(e)}")
         return jsonify({"success": False, "error": f"Failed to fetch: {str(e)}"}), 500
 
 
@@ -939,7 +921,7 @@ def mark_notification_read(notification_id):
 
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"❌ Mark read error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Mark read error: {str(e)}")
         return jsonify({"success": False, "error": f"Update failed: {str(e)}"}), 500
 
 
@@ -976,7 +958,7 @@ def get_room_pricing(room_number):
         }), 200
         
     except Exception as e:
-        current_app.logger.error(f"❌ Room pricing error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Room pricing error: {str(e)}")
         return jsonify({
             "success": False,
             "error": f"Error fetching room: {str(e)}"
@@ -996,7 +978,7 @@ def get_lease_preview(room_id):
                 "error": "Room not found"
             }), 404
         
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         
         landlord_name = "JOYCE MUTHONI MATHEA"
         landlord_phone = "0758 999322"
@@ -1043,7 +1025,7 @@ def get_lease_preview(room_id):
         }), 200
         
     except Exception as e:
-        current_app.logger.error(f"❌ Lease preview error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Lease preview error: {str(e)}")
         return jsonify({
             "success": False,
             "error": f"Error fetching preview: {str(e)}"
@@ -1055,9 +1037,9 @@ def get_lease_preview(room_id):
 def create_lease():
     """Create a new lease for the tenant."""
     try:
-        current_app.logger.info(f"📝 Creating lease for user_id: {request.user_id}")
+        current_app.logger.info(f"Creating lease for user_id: {request.user_id}")
         
-        user = db.session.get(User, request.user_id)
+        user = get_current_user()
         if not user:
             return jsonify({"success": False, "error": "User not found"}), 404
         
@@ -1100,7 +1082,7 @@ def create_lease():
             )
             db.session.add(property)
             db.session.commit()
-            current_app.logger.info(f"✅ Created property: {property_name}")
+            current_app.logger.info(f"Created property: {property_name}")
         
         new_lease = Lease(
             tenant_id=user.id,
@@ -1117,7 +1099,7 @@ def create_lease():
         db.session.add(new_lease)
         db.session.commit()
         
-        current_app.logger.info(f"✅ Lease created for user_id: {request.user_id}, lease_id: {new_lease.id}")
+        current_app.logger.info(f"Lease created for user_id: {request.user_id}, lease_id: {new_lease.id}")
         
         return jsonify({
             "success": True,
@@ -1134,7 +1116,7 @@ def create_lease():
         
     except Exception as e:
         db.session.rollback()
-        current_app.logger.error(f"❌ Lease creation error: {str(e)}\n{traceback.format_exc()}")
+        current_app.logger.exception(f"Lease creation error: {str(e)}")
         return jsonify({"success": False, "error": f"Error creating lease: {str(e)}"}), 500
 
 
@@ -1150,69 +1132,43 @@ def tenant_health():
 @tenant_bp.route("/payment-status/<checkout_id>", methods=["GET"])
 @tenant_required
 def check_payment_status(checkout_id):
-    """Query Safaricom for STK Push status."""
+    """
+    Status of an STK Push payment, from the local row only. The callback and the
+    reconciler keep it current. With ?wait=N (seconds) a pending payment is held
+    until its status changes or N seconds pass.
+    """
     try:
-        payment = Payment.query.filter_by(checkout_request_id=checkout_id).first()
-        if not payment:
-            return jsonify({"success": False, "error": "Payment record not found"}), 404
-            
-        if payment.status in ['paid', 'completed']:
-            return jsonify({
-                "success": True, 
-                "status": payment.status,
-                "message": "Payment already confirmed as successful"
-            }), 200
-            
-        lease = db.session.get(Lease, payment.lease_id)
-        if not lease:
-            return jsonify({"success": False, "error": "Lease not found"}), 404
-            
-        property = db.session.get(Property, lease.property_id)
-        if not property or not property.paybill_number:
-            return jsonify({"success": False, "error": "Property paybill configuration missing"}), 400
-            
-        mpesa_service = MpesaService(Config)
-        response_data, error = mpesa_service.query_stk_status(checkout_id, property.paybill_number)
-        
-        if error:
-            return jsonify({"success": False, "error": error}), 400
+        wait = min(request.args.get("wait", 0, type=float), current_app.config.get("PAYMENT_STATUS_MAX_WAIT", 20))
+        deadline = time.monotonic() + max(0, wait)
+        
+        while True:
+            payment = db.session.execute(
+                select(Payment.status, Payment.notes, Payment.reference_number).where(
+                    Payment.checkout_request_id == checkout_id,
+                    Payment.tenant_id == request.user_id
+                )
+            ).first()
+            if not payment:
+                return jsonify({"success": False, "error": "Payment record not found"}), 404
             
-        result_code = response_data.get("ResultCode")
-        
-        if str(result_code) == "0":
-            payment.status = 'paid'
-            # In Safaricom STK Query, receipt is not always in the same place as callback
-            # But we can update the status at least.
-            db.session.commit()
-            return jsonify({
-                "success": True, 
-                "status": "paid",
-                "message": "Payment confirmed successfully"
-            }), 200
-        elif str(result_code) == "1032":
-            payment.status = 'cancelled'
-            db.session.commit()
-            return jsonify({
-                "success": True, 
-                "status": "cancelled",
-                "message": "Request cancelled by user"
-            }), 200
-        elif str(result_code) in ["1", "1037"]:
-            # 1: record not found (expired), 1037: timeout
-            return jsonify({
-                "success": True, 
-                "status": "pending",
-                "message": "Payment still pending or expired. Please check your phone."
-            }), 200
-        else:
-            payment.status = 'failed'
-            payment.notes = response_data.get("ResultDesc")
-            db.session.commit()
-            return jsonify({
-                "success": True, 
-                "status": "failed",
-                "message": response_data.get("ResultDesc")
-            }), 200
+            remaining = deadline - time.monotonic()
+            if payment.status != 'pending' or remaining <= 0:
+                break
+            db.session.rollback()  # End the read snapshot so the next read sees new commits
+            wait_for_status_change(min(remaining, 1.0))
+        
+        messages = {
+            'paid': "Payment confirmed successfully",
+            'completed': "Payment confirmed successfully",
+            'cancelled': "Request cancelled by user",
+            'pending': "Payment still pending. Please check your phone."
+        }
+        return jsonify({
+            "success": True,
+            "status": payment.status,
+            "receipt": payment.reference_number,
+            "message": messages.get(payment.status, payment.notes or "Payment failed")
+        }), 200
             
     except Exception as e:
         current_app.logger.error(f"Payment status query error: {str(e)}")
@@ -1225,7 +1181,7 @@ def check_payment_status(checkout_id):
 def get_tenant_deposit_status():
     """Get tenant's deposit status"""
     try:
-        current_user = db.session.get(User, request.user_id)
+        current_user = get_current_user()
         
         # Get tenant's active lease
         active_lease = Lease.query.filter_by(
@@ -1267,7 +1223,7 @@ def get_tenant_deposit_status():
 def get_tenant_deposit_payment_history():
     """Get tenant's deposit payment history"""
     try:
-        current_user = db.session.get(User, request.user_id)
+        current_user = get_current_user()
         
         # Get tenant's active lease
         active_lease = Lease.query.filter_by(
@@ -1335,7 +1291,7 @@ def get_tenant_deposit_payment_history():
 def upload_photo():
     """Upload tenant profile photo."""
     try:
-        current_user = db.session.get(User, request.user_id)
+        current_user = get_current_user()
         if not current_user:
             return jsonify({"success": False, "error": "User not found"}), 404
 
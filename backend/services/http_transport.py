@@ -0,0 +1,245 @@
+"""
+HTTP transport for payment-gateway calls (Safaricom Daraja).
+
+- One pooled requests.Session per host and process, so calls reuse
+  keep-alive connections instead of a new TCP + TLS handshake each time.
+- Every call has a connect and a read timeout; nothing can pin a request
+  thread on a slow gateway.
+- Idempotent calls (OAuth, STK status queries) are retried a bounded number of
+  times with exponential backoff and full jitter, on connection errors,
+  timeouts, 429 and 5xx. STK pushes are never retried: a retry could charge
+  the tenant twice.
+- A per-host circuit breaker fails calls fast after repeated failures and
+  lets a single probe through once the cool-down has passed.
+- Per-call latency, error and retry counters, see transport_metrics().
+"""
+
+import os
+import random
+import threading
+import time
+from collections import deque
+from urllib.parse import urlsplit
+
+import requests
+from requests.adapters import HTTPAdapter
+
+RETRY_STATUSES = frozenset({429, 500, 502, 503, 504})
+
+
+class CircuitOpenError(requests.exceptions.ConnectionError):
+    """Raised without calling the gateway while its circuit is open."""
+
+
+class CircuitBreaker:
+    """Closed -> open after `failure_threshold` consecutive failures -> half-open after `reset_timeout`."""
+
+    def __init__(self, failure_threshold=5, reset_timeout=30):
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self._failures = 0
+        self._opened_at = None
+        self._probing = False
+        self._lock = threading.Lock()
+
+    @property
+    def state(self):
+        with self._lock:
+            if self._opened_at is None:
+                return "closed"
+            if time.monotonic() - self._opened_at >= self.reset_timeout:
+                return "half_open"
+            return "open"
+
+    def allow(self):
+        """Whether a call may go out now; in half-open state only one probe at a time."""
+        with self._lock:
+            if self._opened_at is None:
+                return True
+            if time.monotonic() - self._opened_at < self.reset_timeout or self._probing:
+                return False
+            self._probing = True
+            return True
+
+    def record_success(self):
+        with self._lock:
+            self._failures = 0
+            self._opened_at = None
+            self._probing = False
+
+    def record_failure(self):
+        with self._lock:
+            self._failures += 1
+            if self._probing or self._failures >= self.failure_threshold:
+                self._opened_at = time.monotonic()
+            self._probing = False
+
+    def release_probe(self):
+        """Let another probe through after one ended without an outcome (e.g. an unexpected error)."""
+        with self._lock:
+            self._probing = False
+
+
+class LatencyMetrics:
+    """Call counts, errors, retries and latency percentiles per call name."""
+
+    def __init__(self, window=500):
+        self.window = window
+        self._calls = {}
+        self._lock = threading.Lock()
+
+    def record(self, name, duration_ms, error=False, retried=False, short_circuited=False):
+        with self._lock:
+            stats = self._calls.get(name)
+            if stats is None:
+                stats = self._calls[name] = {
+                    "calls": 0, "errors": 0, "retries": 0, "short_circuited": 0,
+                    "max_ms": 0.0, "recent": deque(maxlen=self.window)
+                }
+            stats["calls"] += 1
+            stats["errors"] += int(error)
+            stats["retries"] += int(retried)
+            stats["short_circuited"] += int(short_circuited)
+            if not short_circuited:
+                stats["max_ms"] = max(stats["max_ms"], duration_ms)
+                stats["recent"].append(duration_ms)
+
+    def snapshot(self):
+        result = {}
+        with self._lock:
+            for name, stats in self._calls.items():
+                recent = sorted(stats["recent"])
+                entry = {key: value for key, value in stats.items() if key != "recent"}
+                if recent:
+                    entry["p50_ms"] = round(recent[len(recent) // 2], 2)
+                    entry["p95_ms"] = round(recent[min(len(recent) - 1, int(len(recent) * 0.95))], 2)
+                entry["max_ms"] = round(entry["max_ms"], 2)
+                result[name] = entry
+        return result
+
+
+class HttpTransport:
+    """Pooled, timeout-bounded HTTP calls with retries for idempotent requests and a breaker per host."""
+
+    def __init__(self, connect_timeout=3.05, read_timeout=10, retries=2, backoff=0.25,
+                 failure_threshold=5, reset_timeout=30, pool_size=10):
+        self.timeout = (connect_timeout, read_timeout)
+        self.retries = retries
+        self.backoff = backoff
+        self.failure_threshold = failure_threshold
+        self.reset_timeout = reset_timeout
+        self.pool_size = pool_size
+        self.metrics = LatencyMetrics()
+        self._sessions = {}
+        self._breakers = {}
+        self._pid = os.getpid()
+        self._lock = threading.Lock()
+
+    def _host_state(self, host):
+        with self._lock:
+            if self._pid != os.getpid():
+                # Forked worker (gunicorn preload): never share the parent's sockets
+                self._sessions.clear()
+                self._pid = os.getpid()
+            session = self._sessions.get(host)
+            if session is None:
+                session = requests.Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=self.pool_size, max_retries=0)
+                session.mount("https://", adapter)
+                session.mount("http://", adapter)
+                self._sessions[host] = session
+            breaker = self._breakers.get(host)
+            if breaker is None:
+                breaker = self._breakers[host] = CircuitBreaker(self.failure_threshold, self.reset_timeout)
+            return session, breaker
+
+    def breaker_for(self, url):
+        return self._host_state(urlsplit(url).netloc)[1]
+
+    def request(self, method, url, name=None, idempotent=False, **kwargs):
+        """Send a request; raises CircuitOpenError, requests exceptions, or returns the response."""
+        session, breaker = self._host_state(urlsplit(url).netloc)
+        name = name or f"{method} {urlsplit(url).path}"
+        kwargs.setdefault("timeout", self.timeout)
+        attempts = 1 + (self.retries if idempotent else 0)
+
+        for attempt in range(attempts):
+            if not breaker.allow():
+                self.metrics.record(name, 0, error=True, short_circuited=True)
+                raise CircuitOpenError(f"{urlsplit(url).netloc} is unavailable (circuit open)")
+
+            started = time.perf_counter()
+            try:
+                response = session.request(method, url, **kwargs)
+            except requests.exceptions.RequestException as e:
+                # Any transport-level failure (incl. ChunkedEncodingError) counts, so a
+                # half-open probe always ends; only connection errors and timeouts are retried
+                breaker.record_failure()
+                self.metrics.record(name, (time.perf_counter() - started) * 1000, error=True, retried=attempt > 0)
+                retryable = isinstance(e, (requests.exceptions.ConnectionError, requests.exceptions.Timeout))
+                if not retryable or attempt + 1 >= attempts:
+                    raise
+            except BaseException:
+                breaker.release_probe()
+                raise
+            else:
+                failed = response.status_code >= 500
+                if failed:
+                    breaker.record_failure()
+                else:
+                    breaker.record_success()
+                self.metrics.record(name, (time.perf_counter() - started) * 1000, error=failed, retried=attempt > 0)
+                if response.status_code not in RETRY_STATUSES or attempt + 1 >= attempts:
+                    return response
+                response.close()
+
+            # Full jitter keeps retries from many workers from arriving in step
+            time.sleep(random.uniform(0, self.backoff * (2 ** attempt)))
+
+    def get(self, url, **kwargs):
+        return self.request("GET", url, **kwargs)
+
+    def post(self, url, **kwargs):
+        return self.request("POST", url, **kwargs)
+
+    def snapshot(self):
+        with self._lock:
+            breakers = dict(self._breakers)
+        return {
+            "calls": self.metrics.snapshot(),
+            "circuits": {host: breaker.state for host, breaker in breakers.items()}
+        }
+
+
+_transports = {}
+_transports_lock = threading.Lock()
+
+
+def get_transport(config):
+    """The process-wide transport for these settings (a Config class or the app config)."""
+    setting = config.get if isinstance(config, dict) else lambda key, default: getattr(config, key, default)
+    options = (
+        ("connect_timeout", setting("MPESA_CONNECT_TIMEOUT", 3.05)),
+        ("read_timeout", setting("MPESA_READ_TIMEOUT", 10)),
+        ("retries", setting("MPESA_QUERY_RETRIES", 2)),
+        ("backoff", setting("MPESA_RETRY_BACKOFF", 0.25)),
+        ("failure_threshold", setting("MPESA_BREAKER_FAILURES", 5)),
+        ("reset_timeout", setting("MPESA_BREAKER_RESET_SECONDS", 30))
+    )
+    with _transports_lock:
+        transport = _transports.get(options)
+        if transport is None:
+            transport = _transports[options] = HttpTransport(**dict(options))
+        return transport
+
+
+def transport_metrics():
+    """Metrics of every transport in this process."""
+    with _transports_lock:
+        transports = list(_transports.values())
+    merged = {"calls": {}, "circuits": {}}
+    for transport in transports:
+        snapshot = transport.snapshot()
+        merged["calls"].update(snapshot["calls"])
+        merged["circuits"].update(snapshot["circuits"])
+    return merged
@@ -0,0 +1,352 @@
+"""
+Durable inbox for M-Pesa STK callbacks and C2B confirmations.
+
+The callback endpoints only store the raw payload (one INSERT, keyed by
+CheckoutRequestID or TransID) and acknowledge Safaricom; a retried delivery
+hits the unique key and is dropped. process_inbox(), run by the payment job
+runner, applies the stored messages in batches of MPESA_INBOX_BATCH: one
+query each for the payments, tenants, leases and receipts involved, one
+savepoint per message, one commit per batch, and notifications only when a
+payment actually changes.
+
+A message is applied exactly once: only one process drains the inbox at a
+time (see utils.locks), and a message leaves the 'received' state in the same
+transaction that records its payment.
+"""
+
+from collections import Counter
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import select
+from sqlalchemy.exc import IntegrityError
+from models.base import db
+from models.lease import Lease
+from models.mpesa_inbox import MpesaInboxMessage
+from models.payment import Payment
+from models.user import User
+from services.notification_service import notify_staff, notify_users
+from services.payment_reconciler import stk_outcome
+from utils.locks import exclusive_lock
+
+# Arbitrary key for pg_try_advisory_xact_lock, distinct from the other sweeps
+_ADVISORY_LOCK_KEY = 7305153
+
+# Paybill account prefixes, e.g. JOYCE001 or LAWRENCE011
+BILL_REF_PREFIXES = ("JOYCE", "LAWRENCE")
+
+
+def room_number_from_bill_ref(bill_ref):
+    """Room number in a C2B account number (JOYCE001 -> '1'), or None."""
+    bill_ref = (bill_ref or "").upper().strip()
+    for prefix in BILL_REF_PREFIXES:
+        if bill_ref.startswith(prefix):
+            try:
+                return str(int(bill_ref[len(prefix):]))
+            except ValueError:
+                return None
+    return None
+
+
+def _insert_ignoring_duplicates():
+    """INSERT ... ON CONFLICT DO NOTHING for the inbox table, where the dialect has it."""
+    dialect = db.session.get_bind(mapper=MpesaInboxMessage).dialect.name
+    if dialect == 'postgresql':
+        from sqlalchemy.dialects.postgresql import insert
+    elif dialect == 'sqlite':
+        from sqlalchemy.dialects.sqlite import insert
+    else:
+        return None
+    table = MpesaInboxMessage.__table__
+    return insert(table).on_conflict_do_nothing(index_elements=['kind', 'transaction_id']).returning(table.c.id)
+
+
+def record(kind, transaction_id, payload):
+    """
+    Store a received message; it is processed once the caller commits.
+    Returns False when the same (kind, transaction_id) was already stored.
+    """
+    now = datetime.now(timezone.utc)
+    row = {
+        'kind': kind,
+        'transaction_id': str(transaction_id),
+        'payload': payload,
+        'status': 'received',
+        'created_at': now,
+        'updated_at': now
+    }
+
+    statement = _insert_ignoring_duplicates()
+    if statement is not None:
+        stored = db.session.execute(statement, row).scalar() is not None
+    else:
+        try:
+            with db.session.begin_nested():
+                db.session.add(MpesaInboxMessage(**row))
+            stored = True
+        except IntegrityError:
+            stored = False
+
+    if stored:
+        db.session().info['mpesa_inbox_received'] = True
+    return stored
+
+
+def parse_stk_callback(payload):
+    """
+    The fields the processor uses from an STK callback body. Raises ValueError
+    when the body does not have the shape Safaricom sends.
+    """
+    callback = payload.get("Body") if isinstance(payload, dict) else None
+    callback = callback.get("stkCallback") if isinstance(callback, dict) else None
+    if not isinstance(callback, dict):
+        raise ValueError("Body.stkCallback is missing")
+    checkout_request_id = callback.get("CheckoutRequestID")
+    if not checkout_request_id or not isinstance(checkout_request_id, str):
+        raise ValueError("Body.stkCallback.CheckoutRequestID is missing")
+    if not isinstance(callback.get("ResultCode"), (int, str)):
+        raise ValueError("Body.stkCallback.ResultCode is missing")
+
+    metadata = {}
+    callback_metadata = callback.get("CallbackMetadata", {})
+    items = callback_metadata.get("Item", []) if isinstance(callback_metadata, dict) else None
+    if not isinstance(items, list) or not all(isinstance(item, dict) and "Name" in item for item in items):
+        raise ValueError("Body.stkCallback.CallbackMetadata.Item must be a list of {Name, Value}")
+    for item in items:
+        metadata[item["Name"]] = item.get("Value")
+
+    receipt = metadata.get("MpesaReceiptNumber")
+    return {
+        "checkout_request_id": checkout_request_id,
+        "result_code": callback["ResultCode"],
+        "result_desc": callback.get("ResultDesc"),
+        "metadata": metadata,
+        "receipt": str(receipt) if receipt else None
+    }
+
+
+def parse_c2b_confirmation(payload):
+    """The fields the processor uses from a C2B confirmation. Raises ValueError when malformed."""
+    if not isinstance(payload, dict):
+        raise ValueError("Confirmation body must be an object")
+    trans_id = payload.get("TransID")
+    if not trans_id or not isinstance(trans_id, str):
+        raise ValueError("TransID is missing")
+    try:
+        amount = float(payload.get("TransAmount"))
+    except (TypeError, ValueError):
+        raise ValueError(f"Invalid TransAmount: {payload.get('TransAmount')!r}")
+    bill_ref = payload.get("BillRefNumber")
+    if bill_ref is not None and not isinstance(bill_ref, str):
+        raise ValueError("BillRefNumber must be a string")
+    return {
+        "trans_id": trans_id,
+        "amount": amount,
+        "bill_ref": bill_ref,
+        "room_number": room_number_from_bill_ref(bill_ref),
+        "phone": payload.get("MSISDN")
+    }
+
+
+def _finish(message, status, note=None):
+    message.status = status
+    message.note = note
+    message.processed_at = datetime.now(timezone.utc)
+
+
+def _apply_stk_callback(message, result, payment, known_receipts):
+    """Apply one parsed callback; returns (staff notifications, receipts it recorded)."""
+    if payment is None:
+        # Not ours, or the push's job has not recorded its CheckoutRequestID yet;
+        # the reconciliation sweep settles the latter
+        _finish(message, 'ignored', "No payment for this CheckoutRequestID")
+        return [], []
+
+    status, note = stk_outcome(result["result_code"], result["result_desc"])
+    receipt = result["receipt"]
+
+    if status == 'paid' and payment.status == 'paid' and not payment.reference_number:
+        # The sweep marked it paid before the callback brought the receipt
+        payment.reference_number = receipt
+        payment.details = result["metadata"]
+        _finish(message, 'applied')
+        return [], [receipt] if receipt else []
+
+    # A success that arrives after the sweep expired the push is still money received
+    late_success = status == 'paid' and payment.status == 'failed'
+    if payment.status != 'pending' and not late_success:
+        _finish(message, 'ignored', f"Payment already {payment.status}")
+        return [], []
+
+    if status == 'paid' and receipt in known_receipts:
+        if not late_success:
+            payment.status = 'cancelled'
+            payment.notes = f"Receipt {receipt} was already recorded from the C2B confirmation"
+        _finish(message, 'ignored', f"Receipt {receipt} was already recorded from the C2B confirmation")
+        return [], []
+
+    if status == 'paid':
+        payment.status = 'paid'
+        payment.reference_number = receipt
+        payment.details = result["metadata"]
+        if late_success:
+            payment.notes = f"Confirmed by a late callback after: {payment.notes}"
+        notify_users(
+            [payment.tenant_id], "Payment Successful",
+            f"Your payment of KES {payment.amount} has been received. Receipt: {receipt}", 'payment'
+        )
+        _finish(message, 'applied')
+        return [(
+            "New Payment Received",
+            f"Payment of KES {payment.amount} received from tenant ID {payment.tenant_id}. Receipt: {receipt}"
+        )], [receipt]
+
+    payment.status = status or 'failed'
+    payment.notes = note or result["result_desc"]
+    if payment.status == 'failed':
+        notify_users(
+            [payment.tenant_id], "Payment Failed",
+            f"Your payment request failed: {payment.notes}", 'payment'
+        )
+    _finish(message, 'applied')
+    return [], []
+
+
+def _apply_c2b_confirmation(message, result, tenant, lease, known_receipts):
+    """Apply one parsed confirmation; returns (staff notifications, receipts it recorded)."""
+    trans_id = result["trans_id"]
+    if trans_id in known_receipts:
+        _finish(message, 'ignored', "Receipt already recorded")
+        return [], []
+    if tenant is None:
+        _finish(message, 'ignored', f"No active tenant for account {result['bill_ref']!r}")
+        return [], []
+
+    amount, room_num = result["amount"], result["room_number"]
+    db.session.add(Payment(
+        tenant_id=tenant.id,
+        lease_id=lease.id if lease else None,
+        amount=amount,
+        status='paid',
+        payment_method='M-Pesa (C2B)',
+        reference_number=trans_id,
+        description=f"C2B Payment for Room {room_num}",
+        details={'phone': result["phone"]},
+        payment_date=datetime.now()
+    ))
+    notify_users(
+        [tenant.id], "Payment Received",
+        f"We have received your payment of KES {amount} via Paybill. Receipt: {trans_id}", 'payment'
+    )
+    _finish(message, 'applied')
+    return [(
+        "New C2B Payment",
+        f"KES {amount} received from {tenant.full_name} (Room {room_num}). Receipt: {trans_id}"
+    )], [trans_id]
+
+
+def _load_batch(parsed):
+    """One query each for the payments, tenants, leases and known receipts of a batch."""
+    stk = [result for kind, result in parsed.values() if kind == 'stk_callback']
+    c2b = [result for kind, result in parsed.values() if kind == 'c2b_confirmation']
+
+    # Row locks keep the reconciliation sweep off these payments until we commit
+    payments = {
+        payment.checkout_request_id: payment
+        for payment in db.session.scalars(
+            select(Payment).where(Payment.checkout_request_id.in_([r["checkout_request_id"] for r in stk]))
+            .order_by(Payment.id).with_for_update()
+        )
+    } if stk else {}
+
+    tenants = {}
+    rooms = {r["room_number"] for r in c2b if r["room_number"]}
+    if rooms:
+        for tenant in db.session.scalars(
+            select(User).where(User.room_number.in_(rooms), User.role == 'tenant', User.is_active.is_(True))
+            .order_by(User.id)
+        ):
+            tenants.setdefault(tenant.room_number, tenant)
+
+    leases = {}
+    if tenants:
+        for lease in db.session.scalars(
+            select(Lease).where(Lease.tenant_id.in_([t.id for t in tenants.values()]), Lease.status == 'active')
+            .order_by(Lease.id)
+        ):
+            leases.setdefault(lease.tenant_id, lease)
+
+    # Receipts already on a payment: a C2B confirmation for an STK payment is not a second payment
+    receipts = {r["trans_id"] for r in c2b} | {r["receipt"] for r in stk if r["receipt"]}
+    known_receipts = set(db.session.scalars(
+        select(Payment.reference_number).where(Payment.reference_number.in_(receipts))
+    )) if receipts else set()
+    return payments, tenants, leases, known_receipts
+
+
+_PARSERS = {'stk_callback': parse_stk_callback, 'c2b_confirmation': parse_c2b_confirmation}
+
+
+def process_inbox(limit=None):
+    """
+    Apply one batch of received inbox messages in arrival order.
+    Returns a Counter of outcomes, or None if another process is draining the inbox.
+
+    Each message is applied in its own savepoint: one that cannot be applied
+    is marked 'error' with the reason instead of holding up the rest.
+    """
+    with exclusive_lock('mpesa-inbox', _ADVISORY_LOCK_KEY) as acquired:
+        if not acquired:
+            db.session.rollback()
+            return None
+
+        messages = db.session.scalars(
+            select(MpesaInboxMessage).where(MpesaInboxMessage.status == 'received')
+            .order_by(MpesaInboxMessage.id)
+            .limit(limit or current_app.config.get('MPESA_INBOX_BATCH', 200))
+        ).all()
+        if not messages:
+            db.session.commit()
+            return Counter()
+
+        parsed = {}
+        for message in messages:
+            try:
+                parsed[message.id] = (message.kind, _PARSERS[message.kind](message.payload))
+            except (KeyError, ValueError) as e:
+                _finish(message, 'error', f"Malformed {message.kind}: {e}")
+        payments, tenants, leases, known_receipts = _load_batch(parsed)
+
+        staff_messages = []
+        # STK callbacks first, so a confirmation for the same receipt finds it recorded
+        for message in sorted(messages, key=lambda m: (m.kind != 'stk_callback', m.id)):
+            if message.id not in parsed:
+                continue
+            kind, result = parsed[message.id]
+            try:
+                with db.session.begin_nested():
+                    if kind == 'stk_callback':
+                        staff, receipts = _apply_stk_callback(
+                            message, result, payments.get(result["checkout_request_id"]), known_receipts
+                        )
+                    else:
+                        tenant = tenants.get(result["room_number"])
+                        staff, receipts = _apply_c2b_confirmation(
+                            message, result, tenant, leases.get(tenant.id) if tenant else None, known_receipts
+                        )
+            except Exception as e:
+                current_app.logger.exception(f"M-Pesa inbox message {message.id} could not be applied")
+                _finish(message, 'error', f"{type(e).__name__}: {e}")
+                continue
+            staff_messages.extend(staff)
+            known_receipts.update(receipts)
+
+        for title, text in staff_messages:
+            notify_staff(title, text, 'payment')
+
+        summary = Counter(message.status for message in messages)
+        db.session.commit()
+
+    errors = summary.get('error')
+    if errors:
+        current_app.logger.error(f"{errors} M-Pesa inbox messages could not be applied")
+    return summary
@@ -1,14 +1,127 @@
-import requests
 import base64
 from datetime import datetime
 import json
+import threading
+import time
 from flask import current_app
 
+
+def _http():
+    """requests, imported on the first M-Pesa call rather than at app startup."""
+    import requests
+    return requests
+
+
+def _transport(config):
+    """The pooled gateway transport (imports requests on first use)."""
+    from services.http_transport import get_transport
+    return get_transport(config)
+
+
+class AccessTokenCache:
+    """
+    Daraja OAuth tokens shared by every request in the process, one per
+    (OAuth URL, shortcode, consumer key).
+
+    Concurrent misses for the same shortcode make a single OAuth call: the
+    others wait on its lock and reuse the result. A token is refreshed once it
+    is within the refresh margin of expiry; while that refresh is in flight,
+    other requests keep using the still-valid token instead of waiting.
+    """
+
+    def __init__(self):
+        self._entries = {}  # key -> (token, refresh_at, expires_at)
+        self._locks = {}
+        self._guard = threading.Lock()
+
+    def _lock_for(self, key):
+        with self._guard:
+            return self._locks.setdefault(key, threading.Lock())
+
+    def get(self, key, fetch, refresh_margin):
+        """Cached token for key; fetch() -> (token, expires_in seconds) is called on a miss."""
+        entry = self._entries.get(key)
+        now = time.monotonic()
+        if entry and now < entry[1]:
+            return entry[0]
+
+        lock = self._lock_for(key)
+        still_valid = entry is not None and now < entry[2]
+        if still_valid:
+            if not lock.acquire(blocking=False):
+                return entry[0]  # Another request is refreshing it
+        else:
+            lock.acquire()
+
+        try:
+            entry = self._entries.get(key)
+            now = time.monotonic()
+            if entry and now < entry[1]:
+                return entry[0]
+
+            token, expires_in = fetch()
+            if not token:
+                return entry[0] if entry and now < entry[2] else None
+
+            expires_at = now + expires_in
+            refresh_at = max(now, expires_at - refresh_margin)
+            self._entries[key] = (token, refresh_at, expires_at)
+            return token
+        finally:
+            lock.release()
+
+    def invalidate(self, key, token=None):
+        """Drop the cached token (only if it is still `token`, when given)."""
+        with self._guard:
+            entry = self._entries.get(key)
+            if entry and (token is None or entry[0] == token):
+                del self._entries[key]
+
+    def clear(self):
+        with self._guard:
+            self._entries.clear()
+
+
+token_cache = AccessTokenCache()
+
+
+class StkPushError(Exception):
+    """
+    An STK Push that did not get an accepted response. `retryable`: Safaricom
+    certainly never saw it. `uncertain`: it may have been accepted anyway
+    (connection lost after sending, read timeout, 5xx), so it must not be resent.
+    """
+
+    def __init__(self, message, retryable=False, uncertain=False):
+        super().__init__(message)
+        self.retryable = retryable
+        self.uncertain = uncertain
+
+
+def _never_sent(error):
+    """Whether a requests error happened before the request could reach the gateway."""
+    from urllib3.exceptions import ConnectTimeoutError, NewConnectionError
+    from services.http_transport import CircuitOpenError
+
+    requests = _http()
+    if isinstance(error, (CircuitOpenError, requests.exceptions.ConnectTimeout)):
+        return True
+    # Connection refused / DNS failure: urllib3's reason inside the MaxRetryError requests wraps
+    reason = getattr(error.args[0], "reason", None) if error.args else None
+    return isinstance(reason, (NewConnectionError, ConnectTimeoutError))
+
+
 class MpesaService:
+    # Daraja tokens last an hour; used when the OAuth response has no expires_in
+    DEFAULT_TOKEN_TTL = 3599
+
     def __init__(self, config):
+        self.config = config
         self.auth_url = config.AUTH_URL
         self.stk_push_url = config.STK_PUSH_URL
+        self.stk_query_url = self.stk_push_url.replace("stkpush/v1/processrequest", "stkpushquery/v1/query")
         self.callback_url = config.CALLBACK_URL
+        self.token_refresh_margin = getattr(config, "MPESA_TOKEN_REFRESH_MARGIN", 300)
         
     def _get_credentials(self, shortcode):
         """Get credentials based on shortcode or landlord name."""
@@ -27,8 +140,8 @@ class MpesaService:
                 current_app.config['LAWRENCE']['PASSKEY']
             )
 
-    def get_access_token(self, consumer_key, consumer_secret):
-        """Generate M-Pesa access token."""
+    def request_access_token(self, consumer_key, consumer_secret):
+        """Fetch a new M-Pesa access token: (token, expires_in seconds), or (None, 0) on failure."""
         try:
             auth_string = f"{consumer_key}:{consumer_secret}"
             encoded_auth = base64.b64encode(auth_string.encode()).decode()
@@ -37,61 +150,110 @@ class MpesaService:
                 "Authorization": f"Basic {encoded_auth}"
             }
             
-            response = requests.get(self.auth_url, headers=headers)
+            response = _transport(self.config).get(self.auth_url, headers=headers, name="mpesa.oauth", idempotent=True)
             response.raise_for_status()
             
-            return response.json().get("access_token")
+            data = response.json()
+            return data.get("access_token"), int(data.get("expires_in") or self.DEFAULT_TOKEN_TTL)
         except Exception as e:
             current_app.logger.error(f"Failed to get M-Pesa token: {str(e)}")
-            return None
+            return None, 0
 
-    def initiate_stk_push(self, phone_number, amount, shortcode, account_reference, description):
-        """Initiate STK Push request."""
-        try:
-            consumer_key, consumer_secret, passkey = self._get_credentials(shortcode)
-            
-            access_token = self.get_access_token(consumer_key, consumer_secret)
-            if not access_token:
-                return None, "Failed to authenticate with Safaricom"
+    def _token_key(self, shortcode, consumer_key):
+        return (self.auth_url, str(shortcode), consumer_key)
 
-            timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
-            password_string = f"{shortcode}{passkey}{timestamp}"
-            password = base64.b64encode(password_string.encode()).decode()
+    def get_access_token(self, consumer_key, consumer_secret, shortcode=None):
+        """M-Pesa access token for the shortcode, from the process-wide cache when still fresh."""
+        return token_cache.get(
+            self._token_key(shortcode, consumer_key),
+            lambda: self.request_access_token(consumer_key, consumer_secret),
+            self.token_refresh_margin
+        )
+
+    def _post_with_token(self, url, payload, shortcode, consumer_key, consumer_secret, name, idempotent=False):
+        """
+        POST to Daraja with a cached token; a 401 drops the token and retries once
+        with a new one. Only idempotent calls are retried on gateway errors.
+        """
+        key = self._token_key(shortcode, consumer_key)
+        response = None
+        for _ in range(2):
+            access_token = self.get_access_token(consumer_key, consumer_secret, shortcode)
+            if not access_token:
+                return None
 
             headers = {
                 "Authorization": f"Bearer {access_token}",
                 "Content-Type": "application/json"
             }
+            response = _transport(self.config).post(url, json=payload, headers=headers, name=name, idempotent=idempotent)
+            if response.status_code != 401:
+                break
+            token_cache.invalidate(key, access_token)
+        return response
 
-            # Ensure phone starts with 254
-            if phone_number.startswith("0"):
-                phone_number = "254" + phone_number[1:]
-            elif not phone_number.startswith("254"):
-                phone_number = "254" + phone_number
+    def send_stk_push(self, phone_number, amount, shortcode, account_reference, description):
+        """
+        Send an STK Push request and return Safaricom's response.
 
-            payload = {
-                "BusinessShortCode": shortcode,
-                "Password": password,
-                "Timestamp": timestamp,
-                "TransactionType": "CustomerPayBillOnline",
-                "Amount": int(amount),
-                "PartyA": phone_number,
-                "PartyB": shortcode,
-                "PhoneNumber": phone_number,
-                "CallBackURL": self.callback_url,
-                "AccountReference": account_reference,
-                "TransactionDesc": description
-            }
+        Raises StkPushError. `retryable` is True only when Safaricom certainly did
+        not see the push (no token, circuit open, connect timeout, connection
+        refused), so sending it again cannot prompt the tenant twice. A lost
+        connection, read timeout or 5xx is `uncertain`: leave it to the
+        reconciliation sweep rather than resend.
+        """
+        requests = _http()
+        consumer_key, consumer_secret, passkey = self._get_credentials(shortcode)
 
-            response = requests.post(self.stk_push_url, json=payload, headers=headers)
-            response.raise_for_status()
-            
-            return response.json(), None
-            
-        except requests.exceptions.HTTPError as e:
-            error_msg = response.json().get("errorMessage", str(e))
-            current_app.logger.error(f"M-Pesa API Error: {error_msg}")
-            return None, error_msg
+        timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
+        password_string = f"{shortcode}{passkey}{timestamp}"
+        password = base64.b64encode(password_string.encode()).decode()
+
+        # Ensure phone starts with 254
+        if phone_number.startswith("0"):
+            phone_number = "254" + phone_number[1:]
+        elif not phone_number.startswith("254"):
+            phone_number = "254" + phone_number
+
+        payload = {
+            "BusinessShortCode": shortcode,
+            "Password": password,
+            "Timestamp": timestamp,
+            "TransactionType": "CustomerPayBillOnline",
+            "Amount": int(amount),
+            "PartyA": phone_number,
+            "PartyB": shortcode,
+            "PhoneNumber": phone_number,
+            "CallBackURL": self.callback_url,
+            "AccountReference": account_reference,
+            "TransactionDesc": description
+        }
+
+        try:
+            response = self._post_with_token(self.stk_push_url, payload, shortcode, consumer_key, consumer_secret,
+                                             name="mpesa.stk_push")
+        except requests.exceptions.RequestException as e:
+            if _never_sent(e):
+                raise StkPushError(str(e), retryable=True) from e
+            raise StkPushError(str(e), uncertain=True) from e
+
+        if response is None:
+            raise StkPushError("Failed to authenticate with Safaricom", retryable=True)
+        if response.status_code >= 400:
+            try:
+                error_msg = response.json().get("errorMessage") or response.reason
+            except ValueError:
+                error_msg = response.reason
+            raise StkPushError(error_msg, uncertain=response.status_code >= 500)
+        return response.json()
+
+    def initiate_stk_push(self, phone_number, amount, shortcode, account_reference, description):
+        """Initiate STK Push request; returns (response, None) or (None, error message)."""
+        try:
+            return self.send_stk_push(phone_number, amount, shortcode, account_reference, description), None
+        except StkPushError as e:
+            current_app.logger.error(f"M-Pesa API Error: {str(e)}")
+            return None, str(e)
         except Exception as e:
             current_app.logger.error(f"STK Push failed: {str(e)}")
             return None, str(e)
@@ -126,20 +288,11 @@ class MpesaService:
         """Query STK Push status."""
         try:
             consumer_key, consumer_secret, passkey = self._get_credentials(shortcode)
-            
-            access_token = self.get_access_token(consumer_key, consumer_secret)
-            if not access_token:
-                return None, "Failed to authenticate with Safaricom"
 
             timestamp = datetime.now().strftime("%Y%m%d%H%M%S")
             password_string = f"{shortcode}{passkey}{timestamp}"
             password = base64.b64encode(password_string.encode()).decode()
 
-            headers = {
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            }
-
             payload = {
                 "BusinessShortCode": shortcode,
                 "Password": password,
@@ -147,12 +300,10 @@ class MpesaService:
                 "CheckoutRequestID": checkout_request_id
             }
 
-            # Safaricom query URL
-            query_url = "https://sandbox.safaricom.co.ke/mpesa/stkpushquery/v1/query" 
-            if "api.safaricom" in self.stk_push_url:
-                query_url = "https://api.safaricom.co.ke/mpesa/stkpushquery/v1/query"
-
-            response = requests.post(query_url, json=payload, headers=headers)
+            response = self._post_with_token(self.stk_query_url, payload, shortcode, consumer_key, consumer_secret,
+                                             name="mpesa.stk_query", idempotent=True)
+            if response is None:
+                return None, "Failed to authenticate with Safaricom"
             response.raise_for_status()
             
             return response.json(), None
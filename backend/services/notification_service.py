@@ -0,0 +1,202 @@
+"""
+Notification Service Module
+
+Fans notifications out to many users with a single bulk INSERT. Staff
+recipient ids are cached per process and invalidated when a transaction
+that added, removed, or changed the role or active status of a user commits.
+
+With NOTIFICATIONS_ASYNC enabled, rows are handed to a background worker
+once the caller's transaction commits, so request handlers do not pay for
+the fan-out; rows queued inside a savepoint that rolls back are dropped.
+Otherwise they are written in the caller's transaction.
+"""
+
+import atexit
+import queue
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy import event, inspect, insert
+from sqlalchemy.orm import Session, object_session
+from models.base import db
+from models.notification import Notification, NOTIFICATION_TYPES
+from models.user import User
+
+STAFF_ROLES = ("admin", "caretaker")
+
+# Safety net for changes made outside the ORM (bulk updates, other processes)
+RECIPIENT_CACHE_TTL = 300
+
+_recipient_cache = {}
+_recipient_lock = threading.Lock()
+
+
+def staff_recipient_ids(roles=STAFF_ROLES):
+    """Ids of active users with any of the given roles, cached per process."""
+    key = tuple(sorted(roles))
+    now = time.monotonic()
+
+    with _recipient_lock:
+        cached = _recipient_cache.get(key)
+        if cached and cached[0] > now:
+            return cached[1]
+
+    ids = tuple(db.session.scalars(
+        db.select(User.id).where(User.role.in_(key), User.is_active.is_(True)).order_by(User.id)
+    ))
+    ttl = current_app.config.get("STAFF_RECIPIENT_CACHE_TTL", RECIPIENT_CACHE_TTL)
+
+    with _recipient_lock:
+        _recipient_cache[key] = (now + ttl, ids)
+    return ids
+
+
+def invalidate_recipient_cache():
+    """Forget cached recipient ids; the next fan-out reloads them."""
+    with _recipient_lock:
+        _recipient_cache.clear()
+
+
+def notify_users(user_ids, title, message, notification_type="general"):
+    """
+    Create one notification per user with a single bulk INSERT.
+    Rows become visible when the caller's transaction commits.
+    Returns the number of notifications queued.
+    """
+    if notification_type not in NOTIFICATION_TYPES:
+        raise ValueError(f"Invalid notification type: {notification_type}. Must be one of {NOTIFICATION_TYPES}")
+
+    user_ids = list(dict.fromkeys(uid for uid in user_ids if uid is not None))
+    if not user_ids:
+        return 0
+
+    now = datetime.now(timezone.utc)
+    rows = [
+        {
+            "user_id": user_id,
+            "title": title,
+            "message": message,
+            "notification_type": notification_type,
+            "is_read": False,
+            "created_at": now,
+            "updated_at": now
+        }
+        for user_id in user_ids
+    ]
+
+    if current_app.config.get("NOTIFICATIONS_ASYNC"):
+        # Handed to the worker by the after_commit hook below
+        db.session().info.setdefault("pending_notifications", []).extend(rows)
+    else:
+        db.session.execute(insert(Notification), rows)
+    return len(rows)
+
+
+def notify_staff(title, message, notification_type="general", roles=STAFF_ROLES):
+    """Notify every active admin and caretaker (or the given roles)."""
+    return notify_users(staff_recipient_ids(roles), title, message, notification_type)
+
+
+# ---------------------------------------------------------------------------
+# Background delivery
+# ---------------------------------------------------------------------------
+
+class _NotificationWorker:
+    """Single daemon thread writing queued notification batches."""
+
+    def __init__(self):
+        self._queue = queue.Queue()
+        self._thread = None
+        self._lock = threading.Lock()
+
+    def submit(self, app, rows):
+        with self._lock:
+            if self._thread is None or not self._thread.is_alive():
+                self._thread = threading.Thread(target=self._run, name="notification-worker", daemon=True)
+                self._thread.start()
+        self._queue.put((app, rows))
+
+    def _run(self):
+        while True:
+            app, rows = self._queue.get()
+            try:
+                with app.app_context():
+                    try:
+                        db.session.execute(insert(Notification), rows)
+                        db.session.commit()
+                    except Exception as e:
+                        db.session.rollback()
+                        app.logger.error(f"Failed to write {len(rows)} notifications: {str(e)}")
+                    finally:
+                        db.session.remove()
+            finally:
+                self._queue.task_done()
+
+    def drain(self):
+        """Block until queued batches are written (used at exit and in tests)."""
+        if self._thread is not None and self._thread.is_alive():
+            self._queue.join()
+
+
+_worker = _NotificationWorker()
+drain = _worker.drain
+atexit.register(drain)
+
+
+@event.listens_for(Session, "after_transaction_create")
+def _mark_savepoint(session, transaction):
+    if transaction.nested:
+        pending = session.info.get("pending_notifications", ())
+        session.info.setdefault("notification_savepoints", []).append(len(pending))
+
+
+@event.listens_for(Session, "after_commit")
+def _dispatch_pending(session):
+    if session.in_nested_transaction():
+        # A released savepoint: the outer transaction can still roll back
+        session.info["notification_savepoints"].pop()
+        return
+    session.info.pop("notification_savepoints", None)
+    if session.info.pop("staff_changed", False):
+        invalidate_recipient_cache()
+    rows = session.info.pop("pending_notifications", None)
+    if rows:
+        _worker.submit(current_app._get_current_object(), rows)
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_pending(session, previous_transaction):
+    if previous_transaction.nested:
+        # Drop only what was queued inside the rolled-back savepoint
+        mark = session.info["notification_savepoints"].pop()
+        del session.info.get("pending_notifications", [])[mark:]
+        return
+    for key in ("notification_savepoints", "staff_changed", "pending_notifications"):
+        session.info.pop(key, None)
+
+
+# ---------------------------------------------------------------------------
+# Cache invalidation
+# ---------------------------------------------------------------------------
+
+# Flush hooks only flag the session: clearing the cache before the commit would
+# let another thread reload and cache the old recipients for the full TTL.
+
+def _flag_staff_change(target):
+    session = object_session(target)
+    if session is not None:
+        session.info["staff_changed"] = True
+
+
+@event.listens_for(User, "after_insert")
+@event.listens_for(User, "after_delete")
+def _user_added_or_removed(mapper, connection, target):
+    _flag_staff_change(target)
+
+
+@event.listens_for(User, "after_update")
+def _user_updated(mapper, connection, target):
+    state = inspect(target)
+    if state.attrs.role.history.has_changes() or state.attrs.is_active.history.has_changes():
+        _flag_staff_change(target)
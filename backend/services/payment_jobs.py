@@ -0,0 +1,239 @@
+"""
+Durable job queue for STK pushes.
+
+The tenant's request writes a pending Payment and a PaymentJob in one
+transaction and returns the job id; it never waits on Safaricom. Jobs are run
+by PAYMENT_JOB_WORKERS threads per app in each web worker (started on the
+app's first non-testing request, woken as soon as a job is committed) and/or
+by `flask run-payment-jobs` in a separate process. Any number of runners can share the
+table: PaymentJob.claim_next gives each job to exactly one of them.
+
+A push is only sent again when Safaricom certainly never saw it (see
+MpesaService.send_stk_push). When it may have been accepted (lost
+connection, 5xx, or a runner that died mid-push) the job is failed without
+resending, so the tenant is never prompted twice, and the payment is left
+pending for the reconciliation sweep.
+
+Each runner cycle also applies the M-Pesa inbox (services/mpesa_inbox.py)
+and, when due, the pending-payment reconciliation sweep.
+"""
+
+import atexit
+import os
+import socket
+import threading
+import weakref
+from datetime import datetime, timedelta, timezone
+from flask import current_app, has_app_context
+from sqlalchemy import event
+from sqlalchemy.orm import Session
+from config import Config
+from models.base import db
+from models.payment_job import PaymentJob, INTERRUPTED_ERROR
+from services.mpesa_inbox import process_inbox
+from services.mpesa_service import MpesaService, StkPushError
+from services.payment_reconciler import reconcile_if_due
+
+
+def enqueue_stk_push(payment, phone_number, shortcode, account_reference, description):
+    """Add an STK push job for a pending payment; it is queued when the caller commits."""
+    job = PaymentJob(
+        kind='stk_push',
+        payment=payment,
+        payload={
+            'phone_number': phone_number,
+            'amount': float(payment.amount),
+            'shortcode': str(shortcode),
+            'account_reference': account_reference,
+            'description': description
+        },
+        max_attempts=current_app.config.get('PAYMENT_JOB_MAX_ATTEMPTS', 3)
+    )
+    db.session.add(job)
+    db.session().info['payment_jobs_enqueued'] = True
+    return job
+
+
+def _retry_or_fail(job, error, retryable):
+    job.last_error = error
+    if retryable and job.attempts < job.max_attempts:
+        delay = current_app.config.get('PAYMENT_JOB_RETRY_SECONDS', 5) * 2 ** (job.attempts - 1)
+        job.status = 'queued'
+        job.run_after = datetime.now(timezone.utc) + timedelta(seconds=delay)
+        return
+
+    job.status = 'failed'
+    job.payment.status = 'failed'
+    job.payment.notes = f"STK push failed: {error}"
+
+
+def _leave_to_reconciler(job, error):
+    """
+    The push may have reached Safaricom: never resend it. The payment stays
+    pending; the reconciliation sweep settles it from the callback, a status
+    query or, without a CheckoutRequestID, by expiring it.
+    """
+    job.status = 'failed'
+    job.last_error = error
+    job.payment.notes = f"STK push outcome unknown: {error}"
+
+
+def run_job(job_id, service=None):
+    """Send one claimed job's STK push and record the outcome on the job and its payment."""
+    job = db.session.get(PaymentJob, job_id)
+    try:
+        if job.last_error == INTERRUPTED_ERROR:
+            # The previous runner stopped mid-push; Safaricom may already have prompted the tenant
+            _leave_to_reconciler(job, INTERRUPTED_ERROR)
+        else:
+            result = (service or MpesaService(Config)).send_stk_push(**job.payload)
+            job.status = 'succeeded'
+            job.result = result
+            job.last_error = None
+            job.payment.checkout_request_id = result.get('CheckoutRequestID')
+    except StkPushError as e:
+        current_app.logger.warning(f"STK push job {job.id} attempt {job.attempts} failed: {str(e)}")
+        if e.uncertain:
+            _leave_to_reconciler(job, str(e))
+        else:
+            _retry_or_fail(job, str(e), e.retryable)
+    except Exception as e:
+        current_app.logger.exception(f"STK push job {job.id} crashed: {str(e)}")
+        _retry_or_fail(job, str(e), retryable=False)
+
+    job.locked_by = None
+    db.session.commit()
+    return job
+
+
+def run_pending(worker_id=None, limit=None, service=None):
+    """Claim and run due jobs until none are left (or `limit` ran); returns how many ran."""
+    worker_id = worker_id or f"{socket.gethostname()}:{os.getpid()}:{threading.get_ident()}"
+    lease = current_app.config.get('PAYMENT_JOB_LEASE_SECONDS', 120)
+    ran = 0
+    while limit is None or ran < limit:
+        job_id = PaymentJob.claim_next(worker_id, lease)
+        if job_id is None:
+            break
+        try:
+            run_job(job_id, service)
+        except Exception as e:
+            db.session.rollback()
+            current_app.logger.exception(f"Payment job {job_id} could not be recorded: {str(e)}")
+        ran += 1
+    return ran
+
+
+def run_cycle(app):
+    """One runner pass: due STK pushes, received M-Pesa messages, then the sweep if due."""
+    ran = run_pending()
+    process_inbox()
+    reconcile_if_due(app)
+    return ran
+
+
+class _JobRunner:
+    """
+    One app's PAYMENT_JOB_WORKERS daemon threads in this process, polling the
+    queue and woken on enqueue or when an M-Pesa message arrives.
+    """
+
+    def __init__(self, app):
+        self.app = app
+        self._wake = threading.Event()
+        self._stopping = threading.Event()
+        self._threads = []
+        self._pid = None
+        self._lock = threading.Lock()
+
+    def start(self):
+        with self._lock:
+            if self._pid == os.getpid():
+                return
+            # First use in this process (after any fork): start fresh threads
+            self._pid = os.getpid()
+            self._stopping.clear()
+            self._threads = [
+                threading.Thread(target=self._run, name=f"payment-jobs-{i}", daemon=True)
+                for i in range(self.app.config.get('PAYMENT_JOB_WORKERS', 2))
+            ]
+            for thread in self._threads:
+                thread.start()
+
+    def wake(self):
+        self._wake.set()
+
+    def _run(self):
+        app = self.app
+        poll = app.config.get('PAYMENT_JOB_POLL_SECONDS', 5)
+        while not self._stopping.is_set():
+            with app.app_context():
+                try:
+                    run_cycle(app)
+                except Exception as e:
+                    db.session.rollback()
+                    app.logger.error(f"Payment job runner error: {str(e)}")
+                finally:
+                    db.session.remove()
+            self._wake.wait(poll)
+            self._wake.clear()
+
+    def stop(self, timeout=10):
+        """Let running jobs finish (up to timeout) and stop polling; the runner does not restart."""
+        with self._lock:
+            self._pid = os.getpid()
+            self._stopping.set()
+            self._wake.set()
+            threads = list(self._threads)
+        for thread in threads:
+            thread.join(timeout)
+
+
+_runners = weakref.WeakSet()
+
+
+def stop(timeout=10):
+    """Stop every app's runner threads in this process."""
+    for runner in list(_runners):
+        runner.stop(timeout)
+
+
+atexit.register(stop)
+
+
+def wake():
+    """Wake the current app's runner threads, if it has any."""
+    runner = current_app.extensions.get('payment_jobs') if has_app_context() else None
+    if runner is not None:
+        runner.wake()
+
+
+def init_payment_jobs(app):
+    """Give the app its own job runner, started on its first non-testing request."""
+    if app.config.get('PAYMENT_JOB_WORKERS', 2) <= 0:
+        return
+
+    runner = app.extensions['payment_jobs'] = _JobRunner(app)
+    _runners.add(runner)
+
+    @app.before_request
+    def start_payment_job_runner():
+        # Tests run jobs explicitly with run_pending()
+        if not app.testing:
+            runner.start()
+
+
+# Session.info flags meaning the runner has new work once the transaction commits
+_WAKE_FLAGS = ('payment_jobs_enqueued', 'mpesa_inbox_received')
+
+
+@event.listens_for(Session, "after_commit")
+def _wake_runner(session):
+    if [flag for flag in _WAKE_FLAGS if session.info.pop(flag, None)]:
+        wake()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_enqueued(session, previous_transaction):
+    for flag in _WAKE_FLAGS:
+        session.info.pop(flag, None)
@@ -0,0 +1,235 @@
+"""
+Server-side reconciliation of pending STK payments.
+
+Instead of every tenant's browser asking Safaricom for its payment status,
+one sweep at a time (per deployment) takes the pending payments older than
+PAYMENT_RECONCILE_MIN_AGE seconds, queries them with at most
+PAYMENT_RECONCILE_CONCURRENCY calls in flight (sharing the cached OAuth
+token), and records the outcome on the Payment row. The callback usually
+gets there first; the sweep catches lost or late callbacks.
+
+The status endpoint only reads the local row. wait_for_status_change() lets
+it long-poll: it wakes as soon as a commit in this process changes a
+payment's status, and re-reads the row at least once a second to see changes
+made by other processes.
+"""
+
+import threading
+import time
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor
+from datetime import datetime, timedelta, timezone
+from flask import current_app
+from sqlalchemy import event, inspect, select
+from sqlalchemy.orm import Session
+from config import Config
+from models.base import db
+from models.lease import Lease
+from models.notification import Notification
+from models.payment import Payment
+from models.payment_job import PaymentJob
+from models.property import Property
+from services.mpesa_service import MpesaService
+from utils.locks import exclusive_lock
+
+# Arbitrary key for the sweep's advisory lock, distinct from the overdue checks
+_ADVISORY_LOCK_KEY = 7305152
+
+# STK query ResultCodes that mean "not finished yet" (1037: no response from the phone yet)
+PENDING_RESULT_CODES = ("1", "1037")
+
+
+def stk_outcome(result_code, result_desc):
+    """(new payment status, note) for an STK ResultCode; status is None while still pending."""
+    code = str(result_code)
+    if code == "0":
+        return 'paid', None
+    if code == "1032":
+        return 'cancelled', "Request cancelled by user"
+    if code in PENDING_RESULT_CODES:
+        return None, result_desc
+    return 'failed', result_desc
+
+
+def _shortcodes(payment_ids):
+    """Paybill each payment was pushed to: from its job, else from its lease's property."""
+    shortcodes = dict(db.session.execute(
+        select(PaymentJob.payment_id, PaymentJob.payload).where(
+            PaymentJob.payment_id.in_(payment_ids), PaymentJob.status == 'succeeded'
+        )
+    ).all())
+    shortcodes = {payment_id: payload.get('shortcode') for payment_id, payload in shortcodes.items()}
+
+    missing = [payment_id for payment_id in payment_ids if not shortcodes.get(payment_id)]
+    if missing:
+        shortcodes.update(db.session.execute(
+            select(Payment.id, Property.paybill_number)
+            .join(Lease, Lease.id == Payment.lease_id)
+            .join(Property, Property.id == Lease.property_id)
+            .where(Payment.id.in_(missing))
+        ).all())
+    return shortcodes
+
+
+def _notify_tenant(payment):
+    if payment.status == 'paid':
+        title, message = "Payment Successful", f"Your payment of KES {payment.amount} has been received."
+    else:
+        title, message = "Payment Failed", f"Your payment request failed: {payment.notes}"
+    db.session.add(Notification(user_id=payment.tenant_id, title=title, message=message, notification_type='payment'))
+
+
+def _expire_unconfirmed_pushes(expire_before):
+    """
+    Fail pending payments whose push may or may not have reached Safaricom
+    (its job failed with an unknown outcome, so there is no CheckoutRequestID
+    to query) once no callback could still be coming. Returns how many.
+    """
+    payments = db.session.scalars(
+        select(Payment).where(
+            Payment.status == 'pending',
+            Payment.checkout_request_id.is_(None),
+            Payment.created_at <= expire_before,
+            select(PaymentJob.id).where(PaymentJob.payment_id == Payment.id, PaymentJob.status == 'failed').exists()
+        ).with_for_update()
+    ).all()
+    for payment in payments:
+        payment.status = 'failed'
+        payment.notes = f"STK push expired: {payment.notes or 'no confirmation from Safaricom'}"
+        _notify_tenant(payment)
+    return len(payments)
+
+
+def reconcile_pending(service=None):
+    """
+    Query Safaricom for one batch of pending STK payments and record the results.
+    Returns a Counter of outcomes, or None if another sweep is already running.
+
+    No transaction is open while the gateway is queried: the batch is read and
+    committed first, and the outcomes are written in a second, short
+    transaction that locks only the rows it changes.
+    """
+    config = current_app.config
+    now = datetime.now(timezone.utc)
+    ready_before = now - timedelta(seconds=config.get('PAYMENT_RECONCILE_MIN_AGE', 30))
+    expire_before = now - timedelta(seconds=config.get('PAYMENT_RECONCILE_EXPIRE_SECONDS', 900))
+
+    with exclusive_lock('reconcile-payments', _ADVISORY_LOCK_KEY, across_transactions=True) as acquired:
+        if not acquired:
+            return None
+
+        summary = Counter()
+        summary['failed'] += _expire_unconfirmed_pushes(expire_before)
+        rows = db.session.execute(
+            select(Payment.id, Payment.checkout_request_id, (Payment.created_at <= expire_before).label('expired'))
+            .where(
+                Payment.status == 'pending',
+                Payment.checkout_request_id.isnot(None),
+                Payment.created_at <= ready_before
+            )
+            .order_by(Payment.created_at)
+            .limit(config.get('PAYMENT_RECONCILE_BATCH', 50))
+        ).all()
+        shortcodes = _shortcodes([row.id for row in rows]) if rows else {}
+        db.session.commit()
+        if not rows:
+            return summary
+
+        service = service or MpesaService(Config)
+        app = current_app._get_current_object()
+
+        def query(row):
+            if not shortcodes.get(row.id):
+                return None, "No paybill configured for this payment"
+            with app.app_context():
+                return service.query_stk_status(row.checkout_request_id, shortcodes[row.id])
+
+        with ThreadPoolExecutor(max_workers=max(1, config.get('PAYMENT_RECONCILE_CONCURRENCY', 4))) as pool:
+            results = list(pool.map(query, rows))
+
+        outcomes = {}
+        for row, (response, error) in zip(rows, results):
+            if error:
+                summary['unknown'] += 1
+                continue
+
+            status, note = stk_outcome(response.get("ResultCode"), response.get("ResultDesc"))
+            if status is None and row.expired:
+                status, note = 'failed', f"STK push expired: {note}"
+            if status is None:
+                summary['pending'] += 1
+                continue
+            outcomes[row.id] = (status, note)
+
+        if outcomes:
+            payments = db.session.scalars(
+                select(Payment).where(Payment.id.in_(outcomes)).order_by(Payment.id).with_for_update()
+            ).all()
+            for payment in payments:
+                if payment.status != 'pending':
+                    continue  # The callback got there while we were asking
+                status, note = outcomes[payment.id]
+                payment.status = status
+                if note:
+                    payment.notes = note
+                if status in ('paid', 'failed'):
+                    _notify_tenant(payment)
+                summary[status] += 1
+        db.session.commit()
+    return summary
+
+
+class _Sweeper:
+    """Runs reconcile_pending at most every PAYMENT_RECONCILE_INTERVAL seconds per process."""
+
+    def __init__(self):
+        self._last = 0.0
+        self._lock = threading.Lock()
+
+    def run_if_due(self, app):
+        interval = app.config.get('PAYMENT_RECONCILE_INTERVAL', 30)
+        if interval <= 0 or time.monotonic() - self._last < interval:
+            return None
+        if not self._lock.acquire(blocking=False):
+            return None
+        try:
+            self._last = time.monotonic()
+            return reconcile_pending()
+        finally:
+            self._lock.release()
+
+
+reconcile_if_due = _Sweeper().run_if_due
+
+
+# ---------------------------------------------------------------------------
+# Status change notification (long-poll)
+# ---------------------------------------------------------------------------
+
+_status_changed = threading.Condition()
+
+
+def wait_for_status_change(timeout):
+    """Block until a payment status change is committed in this process, or timeout."""
+    with _status_changed:
+        _status_changed.wait(timeout)
+
+
+@event.listens_for(Session, "after_flush")
+def _track_status_changes(session, flush_context):
+    for obj in session.dirty:
+        if isinstance(obj, Payment) and inspect(obj).attrs.status.history.has_changes():
+            session.info['payment_status_changed'] = True
+            return
+
+
+@event.listens_for(Session, "after_commit")
+def _announce_status_changes(session):
+    if session.info.pop('payment_status_changed', None):
+        with _status_changed:
+            _status_changed.notify_all()
+
+
+@event.listens_for(Session, "after_soft_rollback")
+def _discard_status_changes(session, previous_transaction):
+    session.info.pop('payment_status_changed', None)
@@ -9,6 +9,13 @@ for all test modules in the tests directory.
 import pytest
 import os
 import sys
+import json
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from types import SimpleNamespace
 
 backend_path = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
 sys.path.insert(0, backend_path)
@@ -59,17 +66,10 @@ def db_session(app):
 
 @pytest.fixture(autouse=True)
 def clear_blacklist(app):
-    """Clear the token blacklist before each test to avoid cross-test contamination."""
-    try:
-        from routes.auth_routes import blacklisted_tokens
-        if isinstance(blacklisted_tokens, set):
-            blacklisted_tokens.clear()
-            yield
-            blacklisted_tokens.clear()
-        else:
-            yield
-    except ImportError:
-        yield
+    """Drop the token revocation store before each test to avoid cross-test contamination."""
+    app.extensions.pop("token_revocation", None)
+    yield
+    app.extensions.pop("token_revocation", None)
 
 
 @pytest.fixture(autouse=True)
@@ -204,3 +204,148 @@ def get_jwt_token(client, email, password):
     })
     data = response.get_json()
     return data.get('token') if data and data.get('success') else None
+
+
+class FakeDaraja:
+    """
+    Local stand-in for the Safaricom Daraja API (OAuth, STK push, STK query),
+    so M-Pesa code can be tested offline.
+
+    Knobs: expires_in (token lifetime), revoked (tokens answered with 401),
+    fail_next(n, status) (next n calls answer with status), delay (seconds
+    before every STK reply), query_results (CheckoutRequestID -> (ResultCode,
+    ResultDesc)) and oauth_gate (cleared = OAuth calls wait). hits counts calls
+    per endpoint; client_ports records the connections used.
+    """
+
+    SHORTCODE = "174379"
+
+    def __init__(self):
+        self.run_id = uuid.uuid4().hex[:8]  # Keeps CheckoutRequestIDs unique across fakes sharing a database
+        self.hits = Counter()
+        self.client_ports = set()
+        self.token_calls = 0
+        self.expires_in = 3599
+        self.revoked = set()
+        self.delay = 0
+        self.query_results = {}
+        self.pushes = []
+        self.oauth_gate = threading.Event()
+        self.oauth_gate.set()
+        self._failures = []
+        self._lock = threading.Lock()
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self.url = f"http://127.0.0.1:{self.server.server_address[1]}"
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+
+    def fail_next(self, count, status=503, endpoint=None):
+        """Answer the next `count` calls (to "oauth", "stk_push" or "stk_query", or any) with `status`."""
+        with self._lock:
+            self._failures.extend([(endpoint, status)] * count)
+
+    def config(self, **overrides):
+        return SimpleNamespace(**{
+            "AUTH_URL": f"{self.url}/oauth/v1/generate?grant_type=client_credentials",
+            "STK_PUSH_URL": f"{self.url}/mpesa/stkpush/v1/processrequest",
+            "CALLBACK_URL": "https://example.com/api/payments/mpesa/callback",
+            "MPESA_TOKEN_REFRESH_MARGIN": 300,
+            "MPESA_CONNECT_TIMEOUT": 1,
+            "MPESA_READ_TIMEOUT": 1,
+            "MPESA_QUERY_RETRIES": 2,
+            "MPESA_RETRY_BACKOFF": 0.01,
+            "MPESA_BREAKER_FAILURES": 5,
+            "MPESA_BREAKER_RESET_SECONDS": 30,
+            **overrides
+        })
+
+    def _next_failure(self, endpoint):
+        with self._lock:
+            for index, (target, status) in enumerate(self._failures):
+                if target in (None, endpoint):
+                    del self._failures[index]
+                    return status
+            return None
+
+    def _handler(self):
+        fake = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+
+            def log_message(self, *args):
+                pass
+
+            def _reply(self, status, body):
+                fake.client_ports.add(self.client_address[1])
+                data = json.dumps(body).encode()
+                self.send_response(status)
+                self.send_header("Content-Type", "application/json")
+                self.send_header("Content-Length", str(len(data)))
+                self.end_headers()
+                self.wfile.write(data)
+
+            def do_GET(self):
+                fake.hits["oauth"] += 1
+                fake.oauth_gate.wait(5)
+                status = fake._next_failure("oauth")
+                if status:
+                    return self._reply(status, {"errorMessage": "Service unavailable"})
+                with fake._lock:
+                    fake.token_calls += 1
+                    token = f"token-{fake.token_calls}"
+                self._reply(200, {"access_token": token, "expires_in": str(fake.expires_in)})
+
+            def do_POST(self):
+                body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+                endpoint = "stk_query" if "stkpushquery" in self.path else "stk_push"
+                fake.hits[endpoint] += 1
+                if fake.delay:
+                    time.sleep(fake.delay)
+                status = fake._next_failure(endpoint)
+                if status:
+                    return self._reply(status, {"errorMessage": "Service unavailable"})
+                if self.headers.get("Authorization", "").removeprefix("Bearer ") in fake.revoked:
+                    return self._reply(401, {"errorMessage": "Invalid Access Token"})
+
+                if endpoint == "stk_push":
+                    with fake._lock:
+                        fake.pushes.append(body)
+                        checkout_id = f"ws_CO_{fake.run_id}_{len(fake.pushes)}"
+                    return self._reply(200, {
+                        "MerchantRequestID": f"mr_{len(fake.pushes)}",
+                        "CheckoutRequestID": checkout_id,
+                        "ResponseCode": "0",
+                        "ResponseDescription": "Success. Request accepted for processing"
+                    })
+
+                result_code, result_desc = fake.query_results.get(
+                    body.get("CheckoutRequestID"), ("0", "The service request is processed successfully.")
+                )
+                self._reply(200, {
+                    "CheckoutRequestID": body.get("CheckoutRequestID"),
+                    "ResponseCode": "0",
+                    "ResultCode": result_code,
+                    "ResultDesc": result_desc
+                })
+
+        return Handler
+
+    def close(self):
+        self.server.shutdown()
+        self.server.server_close()
+
+
+@pytest.fixture
+def daraja(app, monkeypatch):
+    """A running FakeDaraja, with the JOYCE credentials pointing at its shortcode."""
+    from services.mpesa_service import token_cache
+
+    fake = FakeDaraja()
+    monkeypatch.setitem(app.config, "JOYCE", {
+        "CONSUMER_KEY": "key", "CONSUMER_SECRET": "secret",
+        "BUSINESS_SHORTCODE": FakeDaraja.SHORTCODE, "PASSKEY": "passkey"
+    })
+    token_cache.clear()
+    yield fake
+    token_cache.clear()
+    fake.close()
@@ -7,3 +7,252 @@ def test_home_route(client):
     data = response.get_json()
     assert "message" in data
     assert data["message"] == "✅ Joyce Suites Backend is running successfully!"
+
+
+def test_request_log_is_json_and_sampled():
+    """
+    Access-log records are JSON lines and the longest route prefix picks the sample rate.
+    """
+    import json
+    import logging
+    from utils.logging_config import JsonFormatter, parse_sample_rates, sample_rate_for
+
+    rates = parse_sample_rates("/api/tenant=0.1,/api/tenant/dashboard=0")
+    assert sample_rate_for("/api/tenant/dashboard", rates) == 0
+    assert sample_rate_for("/api/tenant/profile", rates) == 0.1
+    assert sample_rate_for("/api/admin/overview", rates, 0.5) == 0.5
+
+    record = logging.LogRecord("app", logging.INFO, __file__, 1, "request", (), None)
+    record.status = 200
+    entry = json.loads(JsonFormatter().format(record))
+    assert entry["message"] == "request"
+    assert entry["status"] == 200
+    assert entry["level"] == "INFO"
+
+
+def test_earlier_apps_still_logged_after_reconfigure():
+    """
+    Configuring logging for a second app keeps the first app's records flowing to the listener.
+    """
+    from flask import Flask
+    from utils import logging_config
+
+    first, second = Flask("log_first"), Flask("log_second")
+    for app in (first, second):
+        app.config["LOG_FILE"] = ""
+        logging_config.configure_logging(app)
+
+    queues = {handler.queue for app in (first, second) for handler in app.logger.handlers}
+    assert queues == {logging_config._listener.queue}
+
+
+def test_cors_preflight_and_responses(client):
+    """
+    Preflights from allowed origins are answered before auth; other origins get no CORS headers.
+    """
+    preflight = {
+        "Origin": "https://joyce-suites-preview-1.vercel.app",
+        "Access-Control-Request-Method": "POST",
+        "Access-Control-Request-Headers": "content-type"
+    }
+    response = client.options("/api/auth/inquiry", headers=preflight)
+    assert response.status_code == 200
+    assert response.headers["Access-Control-Allow-Origin"] == preflight["Origin"]
+    assert "POST" in response.headers["Access-Control-Allow-Methods"]
+
+    response = client.options("/api/tenant/dashboard", headers=preflight)
+    assert response.status_code == 200
+    assert response.headers["Access-Control-Allow-Credentials"] == "true"
+
+    blocked = dict(preflight, Origin="https://evil.example.com")
+    response = client.options("/api/auth/inquiry", headers=blocked)
+    assert "Access-Control-Allow-Origin" not in response.headers
+
+    response = client.get("/api/health", headers={"Origin": "http://localhost:3000"})
+    assert response.headers["Access-Control-Allow-Origin"] == "http://localhost:3000"
+    assert "Origin" in response.headers["Vary"]
+
+
+def test_pool_sizes_follow_worker_count():
+    """
+    Each worker gets a pool for its threads and overflow from its share of the connection budget.
+    """
+    from utils.db_engine import pool_options
+
+    assert pool_options(workers=1, threads=4, max_connections=30) == {"pool_size": 4, "max_overflow": 26}
+    assert pool_options(workers=5, threads=4, max_connections=30) == {"pool_size": 4, "max_overflow": 2}
+    assert pool_options(workers=16, threads=8, max_connections=30) == {"pool_size": 1, "max_overflow": 0}
+    assert pool_options(workers=5, threads=4, max_connections=30, background_threads=2) == \
+        {"pool_size": 6, "max_overflow": 0}
+
+
+def test_small_connection_share_reported():
+    """
+    Request threads, payment job threads and the reconciler's lock connection
+    all count against a worker's share; a share too small for them is reported.
+    """
+    from utils.db_engine import connection_shortfall, engine_options
+
+    config = {"SQLALCHEMY_DATABASE_URI": "postgresql://u:p@db/joyce", "WSGI_THREADS": 4,
+              "PAYMENT_JOB_WORKERS": 2, "DB_MAX_CONNECTIONS": 30}
+    assert connection_shortfall(dict(config, WSGI_WORKERS=4)) == 0   # (30 - 4) // 4 = 6 = 4 + 2
+    assert connection_shortfall(dict(config, WSGI_WORKERS=5)) == 1   # (30 - 5) // 5 = 5
+    assert connection_shortfall(dict(config, WSGI_WORKERS=17)) == 5  # (30 - 17) // 17 -> 1
+    assert connection_shortfall(dict(config, WSGI_WORKERS=17, PAYMENT_JOB_WORKERS=0)) == 3
+    assert connection_shortfall(dict(config, WSGI_WORKERS=17, SQLALCHEMY_DATABASE_URI="sqlite:///dev.db")) == 0
+
+    options = engine_options(dict(config, WSGI_WORKERS=4))
+    assert options["pool_size"] + options["max_overflow"] == 6
+
+
+def test_sweep_lock_connection_is_outside_the_pool():
+    """
+    The session-level lock a sweep holds uses an unpooled connection, so a
+    one-connection pool is still free for the sweep's own queries.
+    """
+    from sqlalchemy.pool import NullPool
+    from app import create_app
+    from models.base import db
+    from utils.locks import _lock_engine
+
+    postgres_app = create_app({
+        "SQLALCHEMY_DATABASE_URI": "postgresql://u:p@db/joyce",
+        "TESTING": True,
+        "PAYMENT_JOB_WORKERS": 0,
+        "WSGI_WORKERS": 30
+    })
+    with postgres_app.app_context():
+        assert db.engine.pool.size() == 1
+        lock_engine = _lock_engine()
+        assert isinstance(lock_engine.pool, NullPool) and lock_engine is not db.engine
+        assert lock_engine.url == db.engine.url and _lock_engine() is lock_engine
+
+
+def test_startup_imports_within_budget():
+    """
+    Building the app leaves migration, HTTP client and server packages unimported
+    and stays within IMPORT_TIME_BUDGET_MS (python -X importtime).
+    """
+    import os
+    import subprocess
+    import sys
+
+    backend_dir = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+    env = {key: value for key, value in os.environ.items() if key != "SQLALCHEMY_DATABASE_URI"}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", "import app; app.create_app()"],
+        cwd=backend_dir, env=env, capture_output=True, text=True, timeout=120
+    )
+    assert result.returncode == 0, result.stderr[-2000:]
+
+    top_level_us = 0
+    imported = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line[len("import time:"):].split("|")
+        imported.add(name.strip())
+        if not name.startswith("  "):
+            top_level_us += int(cumulative)
+
+    assert not imported & {"alembic", "requests", "gunicorn"}
+    assert top_level_us / 1000 < float(os.getenv("IMPORT_TIME_BUDGET_MS", 2000))
+
+
+def test_engine_options_follow_dialect():
+    """
+    SQLite gets a thread-sized local pool; Postgres shares DB_MAX_CONNECTIONS across workers.
+    """
+    from utils.db_engine import engine_options
+
+    config = {"WSGI_WORKERS": 5, "WSGI_THREADS": 4, "DB_MAX_CONNECTIONS": 30, "DB_STATEMENT_TIMEOUT_MS": 15000}
+
+    assert engine_options(dict(config, SQLALCHEMY_DATABASE_URI="sqlite://")) == {}
+
+    sqlite = engine_options(dict(config, SQLALCHEMY_DATABASE_URI="sqlite:///dev.db"))
+    assert sqlite["pool_size"] == 4 and "pool_pre_ping" not in sqlite
+
+    postgres = engine_options(dict(config, SQLALCHEMY_DATABASE_URI="postgresql://u:p@db/joyce"))
+    assert postgres["pool_size"] + postgres["max_overflow"] == 5  # One per worker kept for the sweep lock
+    assert postgres["connect_args"]["options"] == "-c statement_timeout=15000"
+
+
+def test_reads_use_replica_until_client_writes(tmp_path):
+    """
+    GET requests read the replica; after a POST the same client reads the primary.
+    Token revocation checks always read the primary.
+    """
+    import sqlite3
+    import jwt
+    from werkzeug.security import generate_password_hash
+    from app import create_app
+    from models.base import db
+    from models.property import Property
+    from models.user import User
+    from routes.auth_routes import generate_jwt_token
+    from utils.read_replica import sync_sqlite_replica
+    from utils.token_revocation import get_revocation_store
+
+    primary, replica = tmp_path / "primary.db", tmp_path / "replica.db"
+    replica_app = create_app({
+        "SQLALCHEMY_DATABASE_URI": f"sqlite:///{primary}",
+        "SQLALCHEMY_REPLICA_URI": f"sqlite:///{replica}",
+        "TESTING": True,
+        "PAYMENT_JOB_WORKERS": 0,
+        "WTF_CSRF_ENABLED": False,
+        "RATELIMIT_ENABLED": False
+    })
+    with replica_app.app_context():
+        db.create_all()
+        landlord = User(email="landlord@replica.test", username="replica_landlord", first_name="Replica",
+                        last_name="Landlord", password_hash=generate_password_hash("Password123"),
+                        role="admin", national_id=20202020)
+        db.session.add(landlord)
+        db.session.flush()
+        db.session.add(Property(name="Room 1", property_type="bedsitter", rent_amount=5000,
+                                deposit_amount=5000, landlord_id=landlord.id, status="vacant"))
+        db.session.commit()
+        room_id = Property.query.filter_by(name="Room 1").one().id
+        token = generate_jwt_token(landlord.id, "admin")
+
+    sync_sqlite_replica(replica_app)
+    with sqlite3.connect(replica) as conn:
+        conn.execute("UPDATE properties SET name = 'Replica Room' WHERE id = ?", (room_id,))
+
+    client = replica_app.test_client()
+
+    def room_names():
+        response = client.get("/api/auth/rooms/available")
+        assert response.status_code == 200
+        return {room["name"] for room in response.get_json()["rooms"]}
+
+    assert "Replica Room" in room_names()
+
+    # A logout recorded only on the primary is honoured by a read-only request
+    headers = {"Authorization": f"Bearer {token}"}
+    assert client.get("/api/auth/profile", headers=headers).status_code == 200
+    with replica_app.app_context():
+        payload = jwt.decode(token, options={"verify_signature": False})
+        get_revocation_store().revoke(payload["jti"], payload["exp"])
+        replica_app.extensions.pop("token_revocation")
+    assert client.get("/api/auth/profile", headers=headers).status_code == 401
+
+    # A rejected write does not pin anyone to the primary
+    response = client.post("/api/auth/login", json={"email": "landlord@replica.test", "password": "wrong"})
+    assert response.status_code == 401
+    assert "db_primary_until" not in response.headers.get("Set-Cookie", "")
+    assert "Replica Room" in room_names()
+
+    response = client.post("/api/auth/inquiry", json={
+        "name": "Replica Check", "email": "replica@example.com", "message": "Is room 1 free?", "room_id": room_id
+    })
+    assert response.status_code == 201
+    assert "db_primary_until" in response.headers.get("Set-Cookie", "")
+
+    names = room_names()
+    assert "Room 1" in names and "Replica Room" not in names
+
+    # Pinning follows the writer's cookie, not the (shared, proxied) client address
+    other_client = replica_app.test_client()
+    assert "Replica Room" in {room["name"] for room in
+                              other_client.get("/api/auth/rooms/available").get_json()["rooms"]}
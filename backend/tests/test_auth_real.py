@@ -132,3 +132,125 @@ class TestAuth:
         data = response.get_json()
         assert data['success'] is True
         assert data['user']['email'] == 'profile@test.com'
+
+    def test_logout_revokes_only_that_token(self, client):
+        """Test logout revokes the presented token across stores but not other sessions."""
+        client.post('/api/auth/register', json={
+            'email': 'logout@test.com',
+            'password': 'Password123',
+            'full_name': 'Logout User',
+            'phone': '+254712345678',
+            'role': 'tenant',
+            'idNumber': '66666666'
+        })
+        credentials = {'email': 'logout@test.com', 'password': 'Password123'}
+        first = client.post('/api/auth/login', json=credentials).get_json()['token']
+        second = client.post('/api/auth/login', json=credentials).get_json()['token']
+
+        response = client.post('/api/auth/logout', headers={'Authorization': f'Bearer {first}'})
+        assert response.status_code == 200
+
+        # A fresh store (as in another worker) still sees the revocation
+        client.application.extensions.pop('token_revocation', None)
+
+        response = client.get('/api/auth/profile', headers={'Authorization': f'Bearer {first}'})
+        assert response.status_code == 401
+        response = client.get('/api/auth/profile', headers={'Authorization': f'Bearer {second}'})
+        assert response.status_code == 200
+
+    def test_memory_revocation_store_never_drops_unexpired_entries(self, app):
+        """Test a full in-process revocation store evicts expired entries only."""
+        import time
+        from utils.token_revocation import MemoryRevocationStore
+
+        store = MemoryRevocationStore(max_entries=2)
+        store.revoke('expired', time.time() - 1)
+        for jti in ('a', 'b', 'c'):
+            store.revoke(jti, time.time() + 3600)
+
+        assert all(store.is_revoked(jti) for jti in ('a', 'b', 'c'))
+        assert not store.is_revoked('expired')
+
+    def test_stacked_decorators_decode_token_once(self, client, monkeypatch):
+        """Test token_required plus role_required verify the token once per request."""
+        from routes import auth_routes
+
+        response = client.post('/api/auth/register', json={
+            'email': 'decodeonce@test.com',
+            'password': 'Password123',
+            'full_name': 'Decode Once',
+            'phone': '+254712345678',
+            'role': 'caretaker',
+            'idNumber': '77777777'
+        })
+        token = response.get_json()['token']
+
+        calls = []
+        original = auth_routes.verify_jwt_token
+
+        def counting_verify(raw_token):
+            calls.append(raw_token)
+            return original(raw_token)
+
+        monkeypatch.setattr(auth_routes, 'verify_jwt_token', counting_verify)
+
+        response = client.get('/api/rent-deposit/rent/records', headers={
+            'Authorization': f'Bearer {token}'
+        })
+        assert response.status_code == 200
+        assert len(calls) == 1
+
+    def test_token_has_compact_claims(self, client):
+        """Test tokens carry only sub, role, jti and exp."""
+        import jwt
+
+        client.post('/api/auth/register', json={
+            'email': 'compact@test.com',
+            'password': 'Password123',
+            'full_name': 'Compact Claims',
+            'phone': '+254712345678',
+            'role': 'tenant',
+            'idNumber': '81818181'
+        })
+        token = client.post('/api/auth/login', json={
+            'email': 'compact@test.com',
+            'password': 'Password123'
+        }).get_json()['token']
+
+        claims = jwt.decode(token, options={'verify_signature': False})
+        assert set(claims) == {'sub', 'role', 'jti', 'exp'}
+
+        # Repeat calls are served from the verified-token cache and still honour logout
+        headers = {'Authorization': f'Bearer {token}'}
+        assert client.get('/api/auth/profile', headers=headers).status_code == 200
+        assert client.get('/api/auth/profile', headers=headers).status_code == 200
+        assert client.post('/api/auth/logout', headers=headers).status_code == 200
+        assert client.get('/api/auth/profile', headers=headers).status_code == 401
+
+    def test_sqlite_limiter_storage_accepts_limits_3_arguments(self, tmp_path):
+        """Test the SQLite limiter store takes the elastic_expiry argument older limits releases pass."""
+        from utils.rate_limit import SQLiteStorage
+
+        storage = SQLiteStorage(f'sqlite:///{tmp_path / "ratelimit.db"}')
+        assert storage.incr('login', 60, amount=1) == 1
+        assert storage.incr('login', 60, elastic_expiry=False, amount=2) == 3
+        assert storage.incr('login', 600, elastic_expiry=True, amount=1) == 4
+        assert storage.get_expiry('login') > storage.get_expiry('other') + 300
+
+    def test_login_budget_shared_between_workers(self, monkeypatch, tmp_path):
+        """Test two app instances on one SQLite limiter store share the login budget."""
+        from app import create_app
+        from config import Config
+
+        monkeypatch.setattr(Config, 'RATELIMIT_STORAGE_URI', f'sqlite:///{tmp_path / "ratelimit.db"}')
+        monkeypatch.setattr(Config, 'RATELIMIT_ENDPOINT_LIMITS', {'auth.login': '2 per minute'})
+        overrides = {'TESTING': True, 'PAYMENT_JOB_WORKERS': 0}  # No background runner threads
+        workers = [create_app(overrides).test_client(), create_app(overrides).test_client()]
+
+        credentials = {'email': 'nobody@test.com', 'password': 'wrong'}
+        assert workers[0].post('/api/auth/login', json=credentials).status_code == 401
+        assert workers[1].post('/api/auth/login', json=credentials).status_code == 401
+        assert workers[0].post('/api/auth/login', json=credentials).status_code == 429
+
+        # Other endpoints keep their own budgets
+        assert workers[1].get('/api/health').status_code != 429
@@ -363,6 +363,46 @@ class TestPaymentMonitoring:
         assert response.status_code == 401
         print(f"✓ Pending payments access rejected without token")
 
+    def test_get_all_tenants_payment_status(self, client, caretaker_user):
+        """Test getting the payment status of every tenant."""
+        login_response = client.post('/api/auth/login', json={
+            'email': caretaker_user['email'],
+            'password': caretaker_user['password']
+        })
+        token = login_response.get_json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        response = client.get('/api/caretaker/payments/all-tenants', headers=headers)
+        
+        assert response.status_code == 200
+        data = response.get_json()
+        assert data['success'] is True
+        assert data['total'] == len(data['tenants'])
+        assert 'current_period' in data
+        assert 'server_time' in data
+        print(f"✓ All tenants payment status retrieved successfully")
+    
+    def test_get_all_tenants_payment_status_since(self, client, caretaker_user):
+        """Test incremental payment status only returns changed tenants."""
+        login_response = client.post('/api/auth/login', json={
+            'email': caretaker_user['email'],
+            'password': caretaker_user['password']
+        })
+        token = login_response.get_json()['token']
+        headers = {'Authorization': f'Bearer {token}'}
+        
+        response = client.get('/api/caretaker/payments/all-tenants?since=2999-01-01T00:00:00Z', 
+            headers=headers)
+        
+        assert response.status_code == 200
+        assert response.get_json()['tenants'] == []
+        
+        response = client.get('/api/caretaker/payments/all-tenants?since=yesterday', 
+            headers=headers)
+        
+        assert response.status_code == 400
+        print(f"✓ Incremental payment status filtered by since")
+
 
 class TestRoomMonitoring:
     """Test room monitoring endpoints."""
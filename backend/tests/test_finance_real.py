@@ -160,3 +160,166 @@ class TestFinanceReal:
         assert 'rent_summary' in data
         assert 'deposit_summary' in data
         assert 'water_bill_summary' in data
+
+    def test_outstanding_balances_batch(self):
+        """Test batched outstanding balances match the single-lease calculation."""
+        from models.payment import Payment
+        from utils.finance import (
+            calculate_outstanding_balance,
+            calculate_outstanding_balances,
+            current_payment_period,
+            get_active_leases_by_tenant
+        )
+
+        with self.client.application.app_context():
+            period_start, _ = current_payment_period()
+            db.session.add(Payment(
+                tenant_id=self.tenant_id,
+                lease_id=self.lease_id,
+                amount=4000,
+                status='paid',
+                payment_method='cash',
+                payment_date=period_start
+            ))
+            db.session.commit()
+
+            lease = get_active_leases_by_tenant([self.tenant_id])[self.tenant_id]
+            balances = calculate_outstanding_balances([lease])
+
+            assert balances[lease.id] == calculate_outstanding_balance(lease)
+            assert calculate_outstanding_balances([]) == {}
+
+    def test_monthly_ledger_tracks_rent_payment(self, runner):
+        """Test the monthly ledger follows rent payments and survives a rebuild."""
+        from models.monthly_ledger import MonthlyLedger
+
+        now = datetime.now(timezone.utc)
+        with self.client.application.app_context():
+            record = RentRecord(
+                tenant_id=self.tenant_id,
+                property_id=self.prop_id,
+                lease_id=self.lease_id,
+                due_date=now + timedelta(days=5),
+                amount_due=10000,
+                amount_paid=0,
+                balance=10000,
+                month=now.month,
+                year=now.year + 50
+            )
+            db.session.add(record)
+            db.session.commit()
+
+            record.mark_payment(4000, None)
+            db.session.commit()
+
+            totals = MonthlyLedger.totals('rent', year=now.year + 50, month=now.month)
+            assert totals['amount_due'] == 10000.0
+            assert totals['amount_paid'] == 4000.0
+            assert totals['balance'] == 6000.0
+
+        result = runner.invoke(args=['rebuild-ledger'])
+        assert 'Rebuilt monthly ledger' in result.output
+
+        with self.client.application.app_context():
+            assert MonthlyLedger.totals('rent', year=now.year + 50, month=now.month) == totals
+
+    def test_ledger_deltas_upsert_one_row_per_key(self):
+        """Test first writes for the same ledger key add up in one row."""
+        from models.monthly_ledger import MonthlyLedger, apply_ledger_deltas
+
+        key = (self.prop_id, self.tenant_id, 2090, 3, 'payment')
+        with self.client.application.app_context():
+            for amount in (100, 250):
+                apply_ledger_deltas(db.session.connection(), {key: {'record_count': 1, 'amount_paid': amount}})
+            db.session.commit()
+
+            rows = MonthlyLedger.query.filter_by(property_id=self.prop_id, tenant_id=self.tenant_id,
+                                                 year=2090, month=3, stream='payment').all()
+            assert len(rows) == 1
+            assert rows[0].record_count == 2 and float(rows[0].amount_paid) == 350.0
+
+    def test_generate_monthly_rent_is_idempotent(self):
+        """Test bulk rent generation returns ids and skips tenants already billed."""
+        payload = {'month': 1, 'year': datetime.now(timezone.utc).year + 60}
+
+        resp = self.client.post('/api/rent-deposit/rent/generate-monthly', json=payload,
+                                headers=self.caretaker_headers)
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data['generated_count'] == len(data['record_ids']) > 0
+
+        resp = self.client.post('/api/rent-deposit/rent/generate-monthly', json=payload,
+                                headers=self.caretaker_headers)
+        assert resp.status_code == 200
+        assert resp.get_json()['generated_count'] == 0
+
+    def test_record_water_readings_csv_upload(self):
+        """Test meter readings uploaded as CSV create, then update, one bill per tenant."""
+        import io
+        from models.monthly_ledger import MonthlyLedger
+
+        year = datetime.now(timezone.utc).year + 70
+
+        def upload(current_reading):
+            csv_data = f"tenant_id,previous_reading,current_reading\n{self.tenant_id},100,{current_reading}\n"
+            return self.client.post(
+                '/api/rent-deposit/water-bill/record-readings',
+                data={'month': '2', 'year': str(year), 'unit_rate': '50',
+                      'file': (io.BytesIO(csv_data.encode()), 'readings.csv')},
+                headers=self.caretaker_headers,
+                content_type='multipart/form-data'
+            )
+
+        resp = upload(120)
+        assert resp.status_code == 200
+        data = resp.get_json()
+        assert data['created_bills'] == 1
+        assert data['bills'][0]['amount_due'] == 1000.0
+
+        resp = upload(130)
+        data = resp.get_json()
+        assert data['created_bills'] == 0
+        assert data['updated_bills'] == 1
+        assert data['bills'][0]['units_consumed'] == 30.0
+
+        with self.client.application.app_context():
+            assert WaterBill.query.filter_by(tenant_id=self.tenant_id, month=2, year=year).count() == 1
+            totals = MonthlyLedger.totals('water', year=year, month=2)
+            assert totals['record_count'] == 1
+            assert totals['amount_due'] == 1500.0
+
+    def test_run_checks_marks_overdue_once(self, runner):
+        """Test the overdue sweep flips past-due rent and notifies the tenant once per day."""
+        from models.notification import Notification
+
+        with self.client.application.app_context():
+            record = RentRecord(
+                tenant_id=self.tenant_id,
+                property_id=self.prop_id,
+                lease_id=self.lease_id,
+                due_date=datetime(2001, 1, 5),
+                amount_due=10000,
+                amount_paid=0,
+                balance=10000,
+                month=1,
+                year=2001
+            )
+            db.session.add(record)
+            db.session.commit()
+            record_id = record.id
+
+        resp = self.client.post('/api/rent-deposit/run-checks', headers=self.caretaker_headers)
+        assert resp.status_code == 200
+        assert resp.get_json()['summary']['rent_records_updated'] >= 1
+
+        result = runner.invoke(args=['run-checks'])
+        assert 'Overdue checks completed' in result.output
+
+        with self.client.application.app_context():
+            assert db.session.get(RentRecord, record_id).status == RentStatus.OVERDUE
+            today = datetime.now(timezone.utc).replace(hour=0, minute=0, second=0, microsecond=0, tzinfo=None)
+            assert Notification.query.filter(
+                Notification.user_id == self.tenant_id,
+                Notification.title == 'Rent Payment Overdue',
+                Notification.created_at >= today
+            ).count() == 1
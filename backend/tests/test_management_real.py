@@ -1,4 +1,4 @@
-
+import time
 import pytest
 from datetime import datetime, timedelta, timezone
 from models.base import db
@@ -152,3 +152,84 @@ class TestManagementReal:
         })
         
         assert resp.status_code in [201, 200]
+
+    def test_grouped_stats_match_counts(self):
+        """Test grouped status counts agree with per-status counts."""
+        from utils.stats import property_stats, tenant_stats, vacate_notice_stats
+
+        with self.client.application.app_context():
+            properties = property_stats()
+            assert properties['total'] == Property.query.count()
+            assert properties['vacant'] == Property.query.filter_by(status='vacant').count()
+
+            tenants = tenant_stats()
+            assert tenants['active'] == User.query.filter_by(role='tenant', is_active=True).count()
+
+            notices = vacate_notice_stats()
+            assert notices['total'] == VacateNotice.query.count()
+            assert notices['pending'] == VacateNotice.query.filter_by(status='pending').count()
+
+        resp = self.client.get('/api/caretaker/vacate-notices/summary', headers=self.caretaker_headers)
+        assert resp.status_code == 200
+        assert resp.get_json()['summary']['total'] == notices['total']
+
+    def test_inquiry_notifies_cached_staff(self):
+        """Test a booking inquiry fans out one notification per active staff member."""
+        from models.notification import Notification
+        from services.notification_service import staff_recipient_ids
+
+        with self.client.application.app_context():
+            staff_ids = staff_recipient_ids()
+            assert self.admin.id in staff_ids
+            assert self.tenant_id not in staff_ids
+
+        resp = self.client.post('/api/auth/inquiry', json={
+            'name': 'Fan Out Inquirer',
+            'email': 'fanout@example.com',
+            'message': 'Do you have parking?',
+            'phone': '+254711122244'
+        })
+        assert resp.status_code in [201, 200]
+
+        with self.client.application.app_context():
+            recipients = [n.user_id for n in Notification.query.filter_by(title='NEW BOOKING: Fan Out Inquirer')]
+            assert sorted(recipients) == sorted(staff_ids)
+
+            # Deactivating a staff member drops them from the cached list
+            staff = db.session.get(User, self.admin.id)
+            staff.is_active = False
+            db.session.flush()
+            # Until the commit, other threads must keep seeing (and caching) the committed list
+            assert self.admin.id in staff_recipient_ids()
+            db.session.commit()
+            assert self.admin.id not in staff_recipient_ids()
+            staff.is_active = True
+            db.session.commit()
+
+    def test_notifications_from_rolled_back_savepoint_dropped(self):
+        """Test queued notifications leave on the outer commit, minus those of a rolled-back savepoint."""
+        from models.notification import Notification
+        from services import notification_service
+
+        app = self.client.application
+        run = f"savepoint-{time.time_ns()}"
+        with app.app_context():
+            app.config['NOTIFICATIONS_ASYNC'] = True
+            try:
+                notification_service.notify_users([self.admin.id], 'Savepoint kept', run, 'general')
+                with db.session.begin_nested():
+                    notification_service.notify_users([self.admin.id], 'Savepoint kept', run, 'general')
+                try:
+                    with db.session.begin_nested():
+                        notification_service.notify_users([self.admin.id], 'Savepoint dropped', run, 'general')
+                        raise RuntimeError('undo')
+                except RuntimeError:
+                    pass
+                assert Notification.query.filter_by(message=run).count() == 0
+                db.session.commit()
+                notification_service.drain()
+            finally:
+                app.config['NOTIFICATIONS_ASYNC'] = False
+
+            titles = [n.title for n in Notification.query.filter_by(message=run)]
+            assert sorted(titles) == ['Savepoint kept', 'Savepoint kept']
@@ -0,0 +1,435 @@
+import threading
+import time
+from datetime import date, datetime, timedelta, timezone
+
+import pytest
+from werkzeug.security import generate_password_hash
+from models.base import db
+from models.lease import Lease
+from models.mpesa_inbox import MpesaInboxMessage
+from models.notification import Notification
+from models.payment import Payment
+from models.payment_job import PaymentJob
+from models.user import User
+from routes.auth_routes import generate_jwt_token
+from services.mpesa_service import MpesaService
+from services.http_transport import CircuitOpenError, HttpTransport, get_transport
+from services import mpesa_inbox
+from services.mpesa_inbox import process_inbox
+from services.payment_jobs import run_pending
+from services.payment_reconciler import reconcile_pending
+
+SHORTCODE = "174379"
+
+
+def stk_push(service):
+    return service.initiate_stk_push("0712345678", 10, SHORTCODE, "Room 1", "Rent")
+
+
+class TestMpesaTokenCache:
+    """OAuth tokens are fetched once per shortcode and reused across requests."""
+
+    def test_token_reused_across_calls(self, app, daraja):
+        service = MpesaService(daraja.config())
+        for _ in range(3):
+            result, error = stk_push(service)
+            assert error is None and result["ResponseCode"] == "0"
+        result, error = MpesaService(daraja.config()).query_stk_status(result["CheckoutRequestID"], SHORTCODE)
+        assert error is None
+        assert daraja.token_calls == 1
+
+    def test_concurrent_misses_make_one_oauth_call(self, app, daraja):
+        service = MpesaService(daraja.config())
+        daraja.oauth_gate.clear()
+        tokens = []
+
+        def fetch():
+            with app.app_context():
+                tokens.append(service.get_access_token("key", "secret", SHORTCODE))
+
+        threads = [threading.Thread(target=fetch) for _ in range(8)]
+        for thread in threads:
+            thread.start()
+        daraja.oauth_gate.set()
+        for thread in threads:
+            thread.join(5)
+
+        assert tokens == ["token-1"] * 8
+        assert daraja.token_calls == 1
+
+    def test_refreshes_before_expiry(self, app, daraja):
+        daraja.expires_in = 200  # Already inside the 300 s refresh margin
+        service = MpesaService(daraja.config())
+        assert service.get_access_token("key", "secret", SHORTCODE) == "token-1"
+        assert service.get_access_token("key", "secret", SHORTCODE) == "token-2"
+
+    def test_401_invalidates_and_retries(self, app, daraja):
+        service = MpesaService(daraja.config())
+        assert service.get_access_token("key", "secret", SHORTCODE) == "token-1"
+        daraja.revoked.add("token-1")
+
+        result, error = stk_push(service)
+        assert error is None and result["CheckoutRequestID"].endswith("_1")
+        assert daraja.token_calls == 2
+        assert service.get_access_token("key", "secret", SHORTCODE) == "token-2"
+
+
+class TestMpesaTransport:
+    """Pooled connections, timeouts, retries and the circuit breaker for Daraja calls."""
+
+    def test_calls_reuse_pooled_connection(self, app, daraja):
+        service = MpesaService(daraja.config())
+        for _ in range(4):
+            assert stk_push(service)[1] is None
+        assert len(daraja.client_ports) == 1
+
+    def test_slow_gateway_times_out_without_retrying_push(self, app, daraja):
+        service = MpesaService(daraja.config(MPESA_READ_TIMEOUT=0.2))
+        service.get_access_token("key", "secret", SHORTCODE)
+        daraja.delay = 1
+
+        started = time.monotonic()
+        result, error = stk_push(service)
+        assert result is None and error
+        assert time.monotonic() - started < 0.9
+        assert daraja.hits["stk_push"] == 1
+
+    def test_status_query_retried_after_gateway_errors(self, app, daraja):
+        service = MpesaService(daraja.config())
+        service.get_access_token("key", "secret", SHORTCODE)
+        daraja.fail_next(2)
+
+        result, error = service.query_stk_status("ws_CO_9", SHORTCODE)
+        assert error is None and result["ResultCode"] == "0"
+        assert daraja.hits["stk_query"] == 3
+
+        metrics = get_transport(daraja.config()).snapshot()["calls"]["mpesa.stk_query"]
+        assert metrics["retries"] >= 2 and metrics["errors"] >= 2
+
+    def test_circuit_opens_after_repeated_failures(self, app, daraja):
+        config = daraja.config(MPESA_QUERY_RETRIES=0, MPESA_BREAKER_FAILURES=3, MPESA_BREAKER_RESET_SECONDS=60)
+        service = MpesaService(config)
+        service.get_access_token("key", "secret", SHORTCODE)
+        daraja.fail_next(10)
+
+        for _ in range(3):
+            assert service.query_stk_status("ws_CO_9", SHORTCODE)[0] is None
+        result, error = service.query_stk_status("ws_CO_9", SHORTCODE)
+
+        assert result is None and "circuit open" in error
+        assert daraja.hits["stk_query"] == 3
+        with pytest.raises(CircuitOpenError):
+            get_transport(config).post(config.STK_PUSH_URL, json={})
+
+
+    def test_half_open_probe_ends_on_any_request_error(self, monkeypatch):
+        import requests
+        transport = HttpTransport(retries=0, failure_threshold=1, reset_timeout=0)
+        session, breaker = transport._host_state("gw.test")
+
+        def broken_body(*args, **kwargs):
+            raise requests.exceptions.ChunkedEncodingError("connection broken mid-body")
+
+        monkeypatch.setattr(session, "request", broken_body)
+        for _ in range(3):  # Open, then two half-open probes that fail the same way
+            with pytest.raises(requests.exceptions.ChunkedEncodingError):
+                transport.get("https://gw.test/query")
+        assert breaker.state == "half_open" and breaker.allow()
+
+
+@pytest.fixture
+def tenant_headers(client):
+    """Auth headers for a tenant in room 1 with an active lease."""
+    with client.application.app_context():
+        tenant = User.query.filter_by(email='stk_queue@test.com').first()
+        if tenant is None:
+            tenant = User(email='stk_queue@test.com', username='stk_queue', first_name='Queue', last_name='Tenant',
+                          password_hash=generate_password_hash('Password123'), role='tenant',
+                          national_id=52305230, room_number='1')
+            db.session.add(tenant)
+            db.session.flush()
+            db.session.add(Lease(tenant_id=tenant.id, property_id=1, start_date=date.today(),
+                                 end_date=date.today() + timedelta(days=365), rent_amount=5000, status='active'))
+            db.session.commit()
+        # Minted directly: the login endpoint's rate limit is shared with the rest of the suite
+        return {'Authorization': f"Bearer {generate_jwt_token(tenant.id, 'tenant')}"}
+
+
+def request_push(client, headers):
+    response = client.post('/api/tenant/stk-push', headers=headers, json={'phone_number': '0712345678', 'amount': 5000})
+    assert response.status_code == 202
+    return response.get_json()
+
+
+class TestStkPushQueue:
+    """STK pushes are queued by the request and sent by the payment job runner."""
+
+    def test_request_returns_job_and_worker_records_checkout_id(self, app, client, daraja, tenant_headers):
+        data = request_push(client, tenant_headers)
+        assert daraja.hits['stk_push'] == 0
+
+        job = client.get(f"/api/tenant/payment-jobs/{data['job_id']}", headers=tenant_headers).get_json()['job']
+        assert job['status'] == 'queued' and job['checkout_request_id'] is None
+
+        assert run_pending(service=MpesaService(daraja.config())) == 1
+        job = client.get(f"/api/tenant/payment-jobs/{data['job_id']}", headers=tenant_headers).get_json()['job']
+        checkout_id = f"ws_CO_{daraja.run_id}_1"
+        assert job['status'] == 'succeeded' and job['checkout_request_id'] == checkout_id
+        assert db.session.get(Payment, data['payment_id']).checkout_request_id == checkout_id
+
+    def test_push_without_token_retried_then_sent_once(self, app, client, daraja, tenant_headers, monkeypatch):
+        monkeypatch.setitem(app.config, 'PAYMENT_JOB_RETRY_SECONDS', 0)
+        data = request_push(client, tenant_headers)
+        daraja.fail_next(1, status=503, endpoint='oauth')
+
+        run_pending(service=MpesaService(daraja.config(MPESA_QUERY_RETRIES=0)))
+        job = db.session.get(PaymentJob, data['job_id'])
+        db.session.refresh(job)
+        assert job.status == 'succeeded' and job.attempts == 2
+        assert len(daraja.pushes) == 1
+
+    def test_push_with_unknown_outcome_not_resent(self, app, client, daraja, tenant_headers, monkeypatch):
+        monkeypatch.setitem(app.config, 'PAYMENT_JOB_RETRY_SECONDS', 0)
+        data = request_push(client, tenant_headers)
+        daraja.fail_next(1, status=503, endpoint='stk_push')  # The gateway may have accepted it anyway
+
+        run_pending(service=MpesaService(daraja.config()))
+        job = db.session.get(PaymentJob, data['job_id'])
+        db.session.refresh(job)
+        assert job.status == 'failed' and job.attempts == 1
+        assert daraja.hits['stk_push'] == 1
+        assert job.payment.status == 'pending'
+
+        # Once no callback can still arrive, the sweep fails it
+        monkeypatch.setitem(app.config, 'PAYMENT_RECONCILE_EXPIRE_SECONDS', 0)
+        reconcile_pending(service=MpesaService(daraja.config()))
+        db.session.refresh(job.payment)
+        assert job.payment.status == 'failed'
+
+    def test_interrupted_push_not_resent_after_earlier_failure(self, app, client, daraja, tenant_headers,
+                                                               monkeypatch):
+        monkeypatch.setitem(app.config, 'PAYMENT_JOB_RETRY_SECONDS', 0)
+        service = MpesaService(daraja.config(MPESA_QUERY_RETRIES=0))
+        data = request_push(client, tenant_headers)
+        daraja.fail_next(1, status=503, endpoint='oauth')
+        assert run_pending(service=service, limit=1) == 1  # Retryable failure: requeued with last_error set
+
+        # A runner claims it and dies before recording anything
+        assert PaymentJob.claim_next('dead-runner', lease_seconds=120) == data['job_id']
+        job = db.session.get(PaymentJob, data['job_id'])
+        job.locked_at = datetime.now(timezone.utc) - timedelta(hours=1)
+        db.session.commit()
+
+        run_pending(service=service)
+        db.session.refresh(job)
+        assert job.status == 'failed' and job.attempts == 3
+        assert daraja.hits['stk_push'] == 0
+        assert job.payment.status == 'pending'
+
+    def test_invalid_push_fails_payment(self, app, client, daraja, tenant_headers):
+        data = request_push(client, tenant_headers)
+        daraja.fail_next(1, status=400, endpoint='stk_push')
+
+        run_pending(service=MpesaService(daraja.config()))
+        job = db.session.get(PaymentJob, data['job_id'])
+        db.session.refresh(job)
+        assert job.status == 'failed' and job.attempts == 1
+        assert job.payment.status == 'failed'
+
+
+class TestPaymentReconciler:
+    """Pending payments are resolved server-side; the status endpoint reads only the local row."""
+
+    def pushed_payment(self, client, daraja, headers, result_code=None):
+        """A pending payment whose push was sent a minute ago."""
+        data = request_push(client, headers)
+        run_pending(service=MpesaService(daraja.config()))
+        payment = db.session.get(Payment, data['payment_id'])
+        payment.created_at = datetime.now(timezone.utc) - timedelta(minutes=1)
+        db.session.commit()
+        if result_code is not None:
+            daraja.query_results[payment.checkout_request_id] = (result_code, f"Result {result_code}")
+        return payment.id, payment.checkout_request_id
+
+    def status(self, client, headers, checkout_id, wait=0):
+        response = client.get(f"/api/tenant/payment-status/{checkout_id}?wait={wait}", headers=headers)
+        assert response.status_code == 200
+        return response.get_json()['status']
+
+    def test_sweep_records_outcomes_with_one_token(self, app, client, daraja, tenant_headers):
+        paid = self.pushed_payment(client, daraja, tenant_headers, "0")
+        cancelled = self.pushed_payment(client, daraja, tenant_headers, "1032")
+        waiting = self.pushed_payment(client, daraja, tenant_headers, "1037")
+        assert self.status(client, tenant_headers, paid[1]) == 'pending'
+
+        tokens_before = daraja.token_calls
+        assert reconcile_pending(service=MpesaService(daraja.config())) is not None
+        assert daraja.token_calls == tokens_before
+
+        queries = daraja.hits['stk_query']
+        assert self.status(client, tenant_headers, paid[1]) == 'paid'
+        assert self.status(client, tenant_headers, cancelled[1]) == 'cancelled'
+        assert self.status(client, tenant_headers, waiting[1]) == 'pending'
+        assert daraja.hits['stk_query'] == queries  # Status reads never reach Safaricom
+
+    def test_no_transaction_open_while_querying_gateway(self, app, client, daraja, tenant_headers):
+        self.pushed_payment(client, daraja, tenant_headers, "0")
+        sweeper_session = db.session()
+        in_transaction = []
+
+        class WatchedService(MpesaService):
+            def query_stk_status(self, checkout_request_id, shortcode):
+                in_transaction.append(sweeper_session.in_transaction())
+                return super().query_stk_status(checkout_request_id, shortcode)
+
+        assert reconcile_pending(service=WatchedService(daraja.config()))['paid'] >= 1
+        assert in_transaction and not any(in_transaction)
+
+    def test_unanswered_push_expires(self, app, client, daraja, tenant_headers, monkeypatch):
+        monkeypatch.setitem(app.config, 'PAYMENT_RECONCILE_EXPIRE_SECONDS', 30)
+        _, checkout_id = self.pushed_payment(client, daraja, tenant_headers, "1037")
+
+        reconcile_pending(service=MpesaService(daraja.config()))
+        assert self.status(client, tenant_headers, checkout_id) == 'failed'
+
+    def test_long_poll_returns_when_status_changes(self, app, client, daraja, tenant_headers):
+        payment_id, checkout_id = self.pushed_payment(client, daraja, tenant_headers)
+
+        def confirm():
+            time.sleep(0.3)
+            with app.app_context():
+                db.session.get(Payment, payment_id).status = 'paid'
+                db.session.commit()
+                db.session.remove()
+
+        threading.Thread(target=confirm).start()
+        started = time.monotonic()
+        assert self.status(client, tenant_headers, checkout_id, wait=5) == 'paid'
+        assert time.monotonic() - started < 3
+
+
+def stk_callback(checkout_id, result_code=0, receipt=None):
+    callback = {"CheckoutRequestID": checkout_id, "ResultCode": result_code, "ResultDesc": f"Result {result_code}"}
+    if receipt:
+        callback["CallbackMetadata"] = {"Item": [{"Name": "Amount", "Value": 5000},
+                                                 {"Name": "MpesaReceiptNumber", "Value": receipt}]}
+    return {"Body": {"stkCallback": callback}}
+
+
+def c2b_confirmation(trans_id, bill_ref="JOYCE001"):
+    return {"TransID": trans_id, "TransAmount": "5000.00", "BillRefNumber": bill_ref, "MSISDN": "254712345678"}
+
+
+class TestMpesaInbox:
+    """Callbacks and confirmations are stored and acknowledged, then applied once by the runner."""
+
+    def pushed_payment(self, client, daraja, headers):
+        data = request_push(client, headers)
+        run_pending(service=MpesaService(daraja.config()))
+        return db.session.get(Payment, data['payment_id'])
+
+    def post(self, client, path, payload):
+        response = client.post(f'/api/payments/{path}', json=payload)
+        assert response.status_code == 200
+        assert response.get_json()['ResultCode'] == 0
+
+    def tenant_notifications(self, tenant_id, text):
+        return Notification.query.filter(Notification.user_id == tenant_id, Notification.message.contains(text)).count()
+
+    def test_repeated_callback_applied_once(self, app, client, daraja, tenant_headers):
+        payment = self.pushed_payment(client, daraja, tenant_headers)
+        receipt = f"RCB{daraja.run_id}".upper()
+        for _ in range(3):
+            self.post(client, 'callback', stk_callback(payment.checkout_request_id, 0, receipt))
+
+        assert MpesaInboxMessage.query.filter_by(transaction_id=payment.checkout_request_id).count() == 1
+        db.session.refresh(payment)
+        assert payment.status == 'pending'  # Nothing is applied by the request itself
+
+        assert process_inbox()['applied'] >= 1
+        self.post(client, 'callback', stk_callback(payment.checkout_request_id, 0, receipt))
+        process_inbox()
+
+        db.session.refresh(payment)
+        assert payment.status == 'paid' and payment.reference_number == receipt
+        assert self.tenant_notifications(payment.tenant_id, receipt) == 1
+
+    def test_repeated_confirmation_records_one_payment(self, app, client, tenant_headers):
+        trans_id = f"C2B{time.time_ns()}"
+        self.post(client, 'confirmation', c2b_confirmation(trans_id))
+        process_inbox()
+        self.post(client, 'confirmation', c2b_confirmation(trans_id))
+        process_inbox()
+
+        payments = Payment.query.filter_by(reference_number=trans_id).all()
+        assert len(payments) == 1
+        assert payments[0].status == 'paid' and payments[0].details == {'phone': '254712345678'}
+        assert self.tenant_notifications(payments[0].tenant_id, trans_id) == 1
+
+    def test_confirmation_for_stk_receipt_is_not_a_second_payment(self, app, client, daraja, tenant_headers):
+        payment = self.pushed_payment(client, daraja, tenant_headers)
+        receipt = f"RDUP{daraja.run_id}".upper()
+        self.post(client, 'confirmation', c2b_confirmation(receipt))
+        self.post(client, 'callback', stk_callback(payment.checkout_request_id, 0, receipt))
+
+        process_inbox()
+        assert Payment.query.filter_by(reference_number=receipt).count() == 1
+        assert db.session.get(Payment, payment.id).status == 'paid'
+        message = MpesaInboxMessage.query.filter_by(kind='c2b_confirmation', transaction_id=receipt).one()
+        assert message.status == 'ignored'
+
+    def test_invalid_callback_rejected(self, client):
+        response = client.post('/api/payments/callback', json={"Body": {}})
+        assert response.status_code == 400
+
+        malformed = stk_callback("ws_CO_bad", 0)
+        malformed["Body"]["stkCallback"]["CallbackMetadata"] = [{"Name": "Amount", "Value": 1}]
+        response = client.post('/api/payments/callback', json=malformed)
+        assert response.status_code == 400
+        assert MpesaInboxMessage.query.filter_by(transaction_id="ws_CO_bad").count() == 0
+
+    def test_malformed_message_does_not_block_the_inbox(self, app, client, tenant_headers):
+        checkout_id = f"ws_CO_bad_{time.time_ns()}"
+        malformed = stk_callback(checkout_id, 0)
+        malformed["Body"]["stkCallback"]["CallbackMetadata"] = [{"Name": "Amount", "Value": 1}]
+        mpesa_inbox.record('stk_callback', checkout_id, malformed)
+        db.session.commit()
+        trans_id = f"C2B{time.time_ns()}"
+        self.post(client, 'confirmation', c2b_confirmation(trans_id))
+
+        process_inbox()
+        bad = MpesaInboxMessage.query.filter_by(transaction_id=checkout_id).one()
+        assert bad.status == 'error' and 'CallbackMetadata' in bad.note
+        assert Payment.query.filter_by(reference_number=trans_id).count() == 1
+
+    def test_failing_message_rolled_back_alone(self, app, client, tenant_headers, monkeypatch):
+        first, second = f"C2BA{time.time_ns()}", f"C2BB{time.time_ns()}"
+        self.post(client, 'confirmation', c2b_confirmation(first))
+        self.post(client, 'confirmation', c2b_confirmation(second))
+
+        notify_users = mpesa_inbox.notify_users
+        def notify_users_failing_once(user_ids, title, message, notification_type="general"):
+            if first in message:
+                raise RuntimeError("notification store unavailable")
+            return notify_users(user_ids, title, message, notification_type)
+
+        monkeypatch.setattr(mpesa_inbox, 'notify_users', notify_users_failing_once)
+        process_inbox()
+
+        failed = MpesaInboxMessage.query.filter_by(kind='c2b_confirmation', transaction_id=first).one()
+        assert failed.status == 'error' and 'notification store unavailable' in failed.note
+        assert Payment.query.filter_by(reference_number=first).count() == 0
+        assert Payment.query.filter_by(reference_number=second).count() == 1
+
+    def test_late_success_callback_settles_expired_payment(self, app, client, daraja, tenant_headers):
+        payment = self.pushed_payment(client, daraja, tenant_headers)
+        payment.status, payment.notes = 'failed', "STK push expired: no response"
+        db.session.commit()
+
+        receipt = f"RLATE{daraja.run_id}".upper()
+        self.post(client, 'callback', stk_callback(payment.checkout_request_id, 0, receipt))
+        process_inbox()
+
+        db.session.refresh(payment)
+        assert payment.status == 'paid' and payment.reference_number == receipt
+        assert self.tenant_notifications(payment.tenant_id, receipt) == 1
@@ -1,16 +1,26 @@
 from functools import wraps
 from flask import request, jsonify
-from routes.auth_routes import token_required
+from routes.auth_routes import authenticate_request
 
 
 def role_required(allowed_roles):
-    """Decorator to require specific user roles."""
+    """
+    Decorator to require specific user roles. Reuses the principal when
+    token_required already ran for this request, so the token is decoded once.
+    """
     def decorator(f):
         @wraps(f)
-        @token_required
         def decorated(*args, **kwargs):
+            if request.method == 'OPTIONS':
+                return f(*args, **kwargs)
+
+            error = authenticate_request()
+            if error:
+                return error
+
             if request.user_role not in allowed_roles:
                 return jsonify({
+                    'success': False,
                     'error': f'Access denied. Required roles: {", ".join(allowed_roles)}'
                 }), 403
             return f(*args, **kwargs)
@@ -0,0 +1,103 @@
+"""
+CORS handling for the API. This is the only place CORS headers are written.
+
+Origins are checked against the configured list and a few precompiled
+patterns (deploy previews). Each origin's decision, together with the
+headers to send, is kept in a bounded LRU, so repeat requests skip the
+pattern matching and header building. Preflights from allowed origins are
+answered in before_request, before auth, rate limiting or the view run.
+"""
+
+import re
+from functools import lru_cache
+from flask import Flask, request
+
+# Production frontends that must always be allowed, whatever CORS_ORIGINS says
+REQUIRED_ORIGINS = (
+    "https://joyce-suites.vercel.app",
+    "https://joyce-suites-jcfw.vercel.app",
+    "https://joyce-suites-git-main-steves-projects-d95e3bef.vercel.app",
+    "https://joyce-suites.onrender.com"
+)
+
+# Deploy-preview style domains, allowed without redeploying backend config
+DEFAULT_ORIGIN_PATTERNS = (
+    r"^https://joyce-suites(?:-[a-z0-9-]+)?\.onrender\.com$",
+    r"^https://joyce-suites(?:-[a-z0-9-]+)?\.vercel\.app$"
+)
+
+ALLOW_METHODS = "GET, POST, PUT, DELETE, OPTIONS, PATCH"
+ALLOW_HEADERS = "content-type, Content-Type, Authorization, X-Requested-With, Accept, Origin"
+EXPOSE_HEADERS = "Content-Type, Authorization"
+
+
+class CorsPolicy:
+    """Allowed origins plus a cached origin -> (response headers, preflight headers) lookup."""
+
+    def __init__(self, origins, patterns=DEFAULT_ORIGIN_PATTERNS, max_age=3600, cache_size=256):
+        self.origins = frozenset(origin.strip() for origin in origins if origin and origin.strip())
+        self.patterns = tuple(re.compile(pattern) for pattern in patterns)
+        self.max_age = str(max_age)
+        self.headers_for = lru_cache(maxsize=cache_size)(self._headers_for)
+
+    def is_allowed(self, origin):
+        return bool(origin) and self.headers_for(origin) is not None
+
+    def _headers_for(self, origin):
+        """Headers for an allowed origin, or None when it is blocked."""
+        if origin not in self.origins and not any(pattern.match(origin) for pattern in self.patterns):
+            return None
+
+        response_headers = (
+            ("Access-Control-Allow-Origin", origin),
+            ("Access-Control-Allow-Credentials", "true"),
+            ("Access-Control-Expose-Headers", EXPOSE_HEADERS)
+        )
+        preflight_headers = response_headers + (
+            ("Access-Control-Allow-Methods", ALLOW_METHODS),
+            ("Access-Control-Allow-Headers", ALLOW_HEADERS),
+            ("Access-Control-Max-Age", self.max_age),
+            ("Vary", "Origin")
+        )
+        return response_headers, preflight_headers
+
+
+def init_cors(app: Flask) -> CorsPolicy:
+    """Build the app's CORS policy and register the preflight and response hooks."""
+    origins = list(app.config.get("CORS_ORIGINS", [])) + list(REQUIRED_ORIGINS)
+    policy = CorsPolicy(
+        origins,
+        patterns=app.config.get("CORS_ORIGIN_PATTERNS", DEFAULT_ORIGIN_PATTERNS),
+        max_age=app.config.get("CORS_MAX_AGE", 3600),
+        cache_size=app.config.get("CORS_DECISION_CACHE_SIZE", 256)
+    )
+    app.extensions["cors"] = policy
+
+    @app.before_request
+    def answer_preflight():
+        if request.method != "OPTIONS" or "Access-Control-Request-Method" not in request.headers:
+            return None
+
+        origin = request.headers.get("Origin")
+        headers = policy.headers_for(origin) if origin else None
+        if headers is None:
+            return None  # Not a CORS preflight we allow; let Flask answer it without CORS headers
+        return app.response_class(status=200, headers=headers[1])
+
+    @app.after_request
+    def add_cors_headers(response):
+        origin = request.headers.get("Origin")
+        if not origin or "Access-Control-Allow-Origin" in response.headers:
+            return response
+
+        headers = policy.headers_for(origin)
+        if headers is None:
+            app.logger.debug(f"CORS blocked for origin: {origin}")
+            return response
+
+        response.headers.extend(headers[0])
+        response.vary.add("Origin")
+        return response
+
+    app.logger.info("CORS configured", extra={"cors_origins": sorted(policy.origins)})
+    return policy
@@ -0,0 +1,190 @@
+"""
+Database engine configuration, chosen per dialect and serving layout.
+
+engine_options(config) picks the pool for the configured database:
+
+- SQLite in memory: one shared connection (Flask-SQLAlchemy's StaticPool).
+- SQLite file: a small per-process QueuePool, one connection per request
+  thread. Connections use a WAL journal, synchronous=NORMAL, a memory-mapped
+  read window and a busy timeout, so readers do not block the writer and
+  writers wait instead of failing with "database is locked".
+- Postgres and other servers: a QueuePool sized from WSGI_WORKERS,
+  WSGI_THREADS and PAYMENT_JOB_WORKERS, so all workers together stay within
+  DB_MAX_CONNECTIONS. Each worker's share also leaves room for the
+  reconciler's unpooled lock connection (utils/locks.py).
+  Connections are pre-pinged and recycled, and Postgres sessions get a
+  statement_timeout.
+
+install_engine_events(app) attaches the SQLite pragmas and the pool
+listeners behind pool_metrics().
+"""
+
+import threading
+from flask import Flask, current_app
+from sqlalchemy import event
+from sqlalchemy.engine import make_url
+from models.base import db
+
+
+def _worker_share(workers, max_connections):
+    return max(1, max_connections // max(1, workers))
+
+
+def pool_options(workers, threads, max_connections, background_threads=0):
+    """
+    pool_size / max_overflow per worker process. Each request thread and each
+    background thread (payment job runners) holds at most one connection, so
+    pool_size covers them; overflow uses what is left of the per-worker share
+    of max_connections.
+    """
+    share = _worker_share(workers, max_connections)
+    pool_size = max(1, min(threads + background_threads, share))
+    return {"pool_size": pool_size, "max_overflow": max(0, share - pool_size)}
+
+
+def _pool_demand(config):
+    """(workers, request threads, pooled connection budget, background threads) for a server database."""
+    workers = config.get("WSGI_WORKERS") or 1
+    background_threads = max(0, config.get("PAYMENT_JOB_WORKERS", 2))
+    max_connections = config.get("DB_MAX_CONNECTIONS", 30)
+    if background_threads:
+        # The job runners' reconciler sweep holds one unpooled lock connection per worker
+        max_connections -= workers
+    return workers, config.get("WSGI_THREADS", 4), max_connections, background_threads
+
+
+def connection_shortfall(config):
+    """
+    How many connections each worker's pool is short of one per request and
+    background thread; 0 when the share covers them (and for SQLite).
+    """
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    if url.get_backend_name() == "sqlite":
+        return 0
+    workers, threads, max_connections, background_threads = _pool_demand(config)
+    return max(0, threads + background_threads - _worker_share(workers, max_connections))
+
+
+def _is_memory_sqlite(url):
+    return url.database in (None, "", ":memory:")
+
+
+def engine_options(config):
+    """SQLALCHEMY_ENGINE_OPTIONS for the configured database URI."""
+    url = make_url(config["SQLALCHEMY_DATABASE_URI"])
+    threads = config.get("WSGI_THREADS", 4)
+    pool_timeout = config.get("DB_POOL_TIMEOUT", 30)
+
+    if url.get_backend_name() == "sqlite":
+        if _is_memory_sqlite(url):
+            return {}
+        # A local file has no server connection limit; size for the threads only
+        return {
+            "pool_size": threads,
+            "max_overflow": threads,
+            "pool_timeout": pool_timeout,
+            "connect_args": {"timeout": config.get("SQLITE_BUSY_TIMEOUT_MS", 5000) / 1000}
+        }
+
+    options = {
+        "pool_pre_ping": True,
+        "pool_recycle": config.get("DB_POOL_RECYCLE", 1800),
+        "pool_timeout": pool_timeout,
+        **pool_options(*_pool_demand(config))
+    }
+
+    if url.get_backend_name() == "postgresql":
+        connect_args = {"connect_timeout": 10, "application_name": "joyce_suites"}
+        statement_timeout = config.get("DB_STATEMENT_TIMEOUT_MS", 30000)
+        if statement_timeout:
+            connect_args["options"] = f"-c statement_timeout={int(statement_timeout)}"
+        options["connect_args"] = connect_args
+    return options
+
+
+def _sqlite_pragmas(journal_wal, busy_timeout_ms, mmap_size):
+    def set_pragmas(dbapi_connection, connection_record):
+        cursor = dbapi_connection.cursor()
+        try:
+            if journal_wal:
+                cursor.execute("PRAGMA journal_mode=WAL")
+            cursor.execute("PRAGMA synchronous=NORMAL")
+            cursor.execute(f"PRAGMA busy_timeout={int(busy_timeout_ms)}")
+            if mmap_size:
+                cursor.execute(f"PRAGMA mmap_size={int(mmap_size)}")
+        finally:
+            cursor.close()
+    return set_pragmas
+
+
+class PoolMetrics:
+    """Checkout, connect and overflow counters per engine, fed by pool events."""
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._engines = {}
+
+    def watch(self, name, engine):
+        stats = {
+            "checkouts": 0,
+            "connects": 0,
+            "invalidations": 0,
+            "peak_checked_out": 0,
+            "peak_overflow": 0
+        }
+        self._engines[name] = (engine, stats)
+
+        @event.listens_for(engine, "connect")
+        def on_connect(dbapi_connection, connection_record):
+            with self._lock:
+                stats["connects"] += 1
+
+        @event.listens_for(engine, "checkout")
+        def on_checkout(dbapi_connection, connection_record, connection_proxy):
+            pool = engine.pool
+            with self._lock:
+                stats["checkouts"] += 1
+                if hasattr(pool, "checkedout"):
+                    stats["peak_checked_out"] = max(stats["peak_checked_out"], pool.checkedout())
+                    stats["peak_overflow"] = max(stats["peak_overflow"], pool.overflow())  # Negative until the pool fills
+
+        @event.listens_for(engine, "invalidate")
+        def on_invalidate(dbapi_connection, connection_record, exception):
+            with self._lock:
+                stats["invalidations"] += 1
+
+    def snapshot(self):
+        """Current pool state plus counters, keyed by bind name ("default" for the main engine)."""
+        result = {}
+        for name, (engine, stats) in self._engines.items():
+            pool = engine.pool
+            with self._lock:
+                entry = {"pool": type(pool).__name__, "dialect": engine.dialect.name, **stats}
+            if hasattr(pool, "checkedout"):
+                entry.update(size=pool.size(), checked_out=pool.checkedout(), overflow=max(0, pool.overflow()))
+            result[name] = entry
+        return result
+
+
+def install_engine_events(app: Flask) -> None:
+    """SQLite pragmas and pool metrics for every engine of the app."""
+    metrics = PoolMetrics()
+    app.extensions["db_pool_metrics"] = metrics
+
+    with app.app_context():
+        engines = dict(db.engines)
+
+    for name, engine in engines.items():
+        if engine.dialect.name == "sqlite":
+            event.listen(engine, "connect", _sqlite_pragmas(
+                journal_wal=not _is_memory_sqlite(engine.url),
+                busy_timeout_ms=app.config.get("SQLITE_BUSY_TIMEOUT_MS", 5000),
+                mmap_size=app.config.get("SQLITE_MMAP_SIZE", 64 * 1024 * 1024)
+            ))
+        metrics.watch(name or "default", engine)
+
+
+def pool_metrics():
+    """The current app's pool metrics snapshot."""
+    metrics = current_app.extensions.get("db_pool_metrics")
+    return metrics.snapshot() if metrics else {}
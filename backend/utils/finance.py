@@ -1,40 +1,91 @@
 from datetime import datetime
-from dateutil.relativedelta import relativedelta
+from flask import current_app
+from sqlalchemy import func
+from sqlalchemy.orm import joinedload
+from models.base import db
+from models.lease import Lease
 from models.payment import Payment
 
-def calculate_outstanding_balance(lease):
+
+def current_payment_period(today=None):
     """
-    Calculate the outstanding balance for a given lease.
-    Balance is calculated for the current payment period (5th of current month to 5th of next month).
+    Return (start, end) of the current payment period.
+    Payment period runs from the 5th of one month to the 5th of the next.
     """
-    if not lease:
-        return 0.0
+    from dateutil.relativedelta import relativedelta
+
+    today = today or datetime.now()
+    if today.day < 5:
+        period_start = (today.replace(day=1) - relativedelta(days=1)).replace(day=5, hour=0, minute=0, second=0, microsecond=0)
+    else:
+        period_start = today.replace(day=5, hour=0, minute=0, second=0, microsecond=0)
+
+    return period_start, period_start + relativedelta(months=1)
+
+
+def get_active_leases_by_tenant(tenant_ids):
+    """
+    Fetch the active lease (with its property) for many tenants in one query.
+    Returns a dict of {tenant_id: lease}.
+    """
+    tenant_ids = [tid for tid in tenant_ids if tid is not None]
+    if not tenant_ids:
+        return {}
+
+    leases = Lease.query.options(joinedload(Lease.property)).filter(
+        Lease.tenant_id.in_(tenant_ids),
+        Lease.status == 'active'
+    ).order_by(Lease.id).all()
+
+    leases_by_tenant = {}
+    for lease in leases:
+        # Keep the first active lease per tenant, matching .first() semantics
+        leases_by_tenant.setdefault(lease.tenant_id, lease)
+    return leases_by_tenant
+
+
+def calculate_outstanding_balances(leases):
+    """
+    Calculate the outstanding balance for many leases with a single grouped SUM.
+    Returns a dict of {lease_id: balance} for the current payment period.
+    """
+    leases = [lease for lease in leases if lease is not None]
+    if not leases:
+        return {}
 
     try:
-        today = datetime.now()
-        # Payment period starts on the 5th of each month
-        if today.day < 5:
-            current_month_start = (today.replace(day=1) - relativedelta(days=1)).replace(day=5, hour=0, minute=0, second=0, microsecond=0)
-        else:
-            current_month_start = today.replace(day=5, hour=0, minute=0, second=0, microsecond=0)
-        
-        next_month_start = current_month_start + relativedelta(months=1)
-
-        # Get all 'paid' payments for this lease in the current period
-        payments = Payment.query.filter(
-            Payment.lease_id == lease.id,
+        period_start, period_end = current_payment_period()
+
+        paid_rows = db.session.query(
+            Payment.lease_id,
+            func.coalesce(func.sum(Payment.amount), 0.0)
+        ).filter(
+            Payment.lease_id.in_([lease.id for lease in leases]),
             Payment.status == 'paid',
-            Payment.payment_date >= current_month_start,
-            Payment.payment_date < next_month_start
-        ).all()
+            Payment.payment_date >= period_start,
+            Payment.payment_date < period_end
+        ).group_by(Payment.lease_id).all()
 
-        total_paid = sum(p.amount for p in payments)
-        rent_amount = float(lease.rent_amount) if lease.rent_amount else 0.0
-        
-        # Balance is Rent - Total Paid
-        balance = max(0.0, rent_amount - total_paid)
-        return balance
+        paid_by_lease = {lease_id: float(total or 0) for lease_id, total in paid_rows}
+
+        balances = {}
+        for lease in leases:
+            rent_amount = float(lease.rent_amount) if lease.rent_amount else 0.0
+            # Balance is Rent - Total Paid
+            balances[lease.id] = max(0.0, rent_amount - paid_by_lease.get(lease.id, 0.0))
+        return balances
 
     except Exception as e:
-        print(f"Error calculating balance: {str(e)}")
+        current_app.logger.error(f"Error calculating balances: {str(e)}")
+        return {lease.id: 0.0 for lease in leases}
+
+
+def calculate_outstanding_balance(lease):
+    """
+    Calculate the outstanding balance for a given lease.
+    Balance is calculated for the current payment period (5th of current month to 5th of next month).
+    """
+    if not lease:
         return 0.0
+
+    return calculate_outstanding_balances([lease]).get(lease.id, 0.0)
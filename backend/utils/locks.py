@@ -0,0 +1,69 @@
+import os
+from contextlib import contextmanager
+from flask import current_app
+from sqlalchemy import create_engine, text
+from sqlalchemy.pool import NullPool
+from models.base import db
+
+
+def _lock_engine():
+    """
+    Unpooled engine for session-level advisory locks, one per app. A lock held
+    for a whole sweep must not take a connection from the app's pool, which
+    may have only one and which the sweep's own session needs.
+    """
+    engines = current_app.extensions.setdefault('lock_engines', {})
+    engine = engines.get(db.engine.url)
+    if engine is None:
+        connect_args = current_app.config["SQLALCHEMY_ENGINE_OPTIONS"].get("connect_args", {})
+        engine = engines[db.engine.url] = create_engine(db.engine.url, poolclass=NullPool, connect_args=connect_args)
+    return engine
+
+
+@contextmanager
+def exclusive_lock(name, advisory_key, across_transactions=False):
+    """
+    Hold a lock so only one process runs the named sweep at a time. Yields True
+    when the lock was acquired and False when another process holds it.
+
+    PostgreSQL uses an advisory lock on advisory_key. By default it is
+    transaction-scoped (released on the session's commit or rollback); with
+    across_transactions it is a session-level lock held on a separate, idle
+    connection outside the pool, so the caller can commit as often as it likes
+    while holding it.
+    Other databases fall back to a lock file named `<name>.lock` in the
+    instance folder.
+    """
+    if db.engine.dialect.name == 'postgresql':
+        if not across_transactions:
+            yield db.session.execute(
+                text("SELECT pg_try_advisory_xact_lock(:key)"), {'key': advisory_key}
+            ).scalar()
+            return
+
+        with _lock_engine().connect() as connection:
+            acquired = connection.execute(
+                text("SELECT pg_try_advisory_lock(:key)"), {'key': advisory_key}
+            ).scalar()
+            connection.commit()  # Keep the lock, not an open transaction
+            try:
+                yield acquired
+            finally:
+                if acquired:
+                    connection.execute(text("SELECT pg_advisory_unlock(:key)"), {'key': advisory_key})
+                    connection.commit()
+        return
+
+    import fcntl
+
+    os.makedirs(current_app.instance_path, exist_ok=True)
+    with open(os.path.join(current_app.instance_path, f'{name}.lock'), 'w') as lock_file:
+        try:
+            fcntl.flock(lock_file, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            yield False
+            return
+        try:
+            yield True
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
@@ -0,0 +1,159 @@
+"""
+Structured, non-blocking logging.
+
+Request threads only put records on a queue (QueueHandler). Every app in
+the process shares that queue, and a single QueueListener thread formats them as JSON lines and writes them to the
+rotating log file and stderr. Settings, all from config/env:
+
+- LOG_LEVEL: level for the app logger (DEBUG, INFO, WARNING, ...)
+- LOG_FILE: rotating log file path ("" disables file output)
+- LOG_SAMPLE_RATE: fraction of successful requests written to the access log
+- LOG_SAMPLE_RATES: per-route overrides as "path_prefix=rate,..."; the
+  longest matching prefix wins. 4xx/5xx responses are always logged.
+"""
+
+import atexit
+import json
+import logging
+import os
+import queue
+import random
+import time
+from datetime import datetime, timezone
+from logging.handlers import QueueHandler, QueueListener, RotatingFileHandler
+from flask import Flask, g, request
+
+# Attributes every LogRecord has; anything else was passed via `extra`
+_RESERVED = set(vars(logging.LogRecord("", 0, "", 0, "", (), None))) | {"message", "asctime"}
+
+_log_queue = queue.SimpleQueue()
+_listener = None
+
+
+class JsonFormatter(logging.Formatter):
+    """One JSON object per line: ts, level, logger, message plus any extra fields."""
+
+    def format(self, record):
+        entry = {
+            "ts": datetime.fromtimestamp(record.created, tz=timezone.utc).isoformat(),
+            "level": record.levelname,
+            "logger": record.name,
+            "message": record.getMessage()
+        }
+        for key, value in vars(record).items():
+            if key not in _RESERVED and not key.startswith("_"):
+                entry[key] = value
+        if record.exc_info:
+            entry["exc_info"] = self.formatException(record.exc_info)
+        return json.dumps(entry, default=str)
+
+
+def parse_sample_rates(value):
+    """'/api/tenant=0.1,/api/admin/dashboard-stats=0' -> {prefix: rate}."""
+    if isinstance(value, dict):
+        return {prefix: float(rate) for prefix, rate in value.items()}
+
+    rates = {}
+    for item in (value or "").split(","):
+        if "=" in item:
+            prefix, rate = item.split("=", 1)
+            rates[prefix.strip()] = float(rate)
+    return rates
+
+
+def sample_rate_for(path, rates, default=1.0):
+    """Rate of the longest route prefix matching `path`."""
+    best = None
+    for prefix in rates:
+        if path.startswith(prefix) and (best is None or len(prefix) > len(best)):
+            best = prefix
+    return rates[best] if best is not None else default
+
+
+def stop_listener():
+    """Flush queued records and stop the listener thread."""
+    global _listener
+    if _listener is not None:
+        _listener.stop()
+        _listener = None
+
+
+def configure_logging(app: Flask) -> None:
+    """Route app logs through a queue to JSON file/stderr handlers on a listener thread."""
+    global _listener
+
+    level = logging.getLevelName(str(app.config.get("LOG_LEVEL", "INFO")).upper())
+    if not isinstance(level, int):
+        level = logging.INFO
+
+    handlers = []
+    log_file = app.config.get("LOG_FILE", "logs/joyce_suites.log")
+    if log_file:
+        log_dir = os.path.dirname(log_file)
+        if log_dir:
+            os.makedirs(log_dir, exist_ok=True)
+        handlers.append(RotatingFileHandler(log_file, maxBytes=10 * 1024 * 1024, backupCount=10))
+    handlers.append(logging.StreamHandler())
+
+    formatter = JsonFormatter()
+    for handler in handlers:
+        handler.setFormatter(formatter)
+
+    # create_app() may run more than once per process. Earlier apps keep their
+    # QueueHandlers, so the queue stays the same and only the listener's
+    # handlers are swapped (stop() drains what is already queued first).
+    if _listener is not None:
+        _listener.stop()
+        for handler in _listener.handlers:
+            handler.close()
+    for handler in list(app.logger.handlers):
+        app.logger.removeHandler(handler)
+
+    app.logger.addHandler(QueueHandler(_log_queue))
+    app.logger.setLevel(level)
+    app.logger.propagate = False
+
+    _listener = QueueListener(_log_queue, *handlers, respect_handler_level=True)
+    _listener.start()
+
+    app.logger.info("Joyce Suites API started", extra={"env": os.getenv("FLASK_ENV", "development")})
+
+
+atexit.register(stop_listener)
+
+
+def restart_listener() -> None:
+    """Start a new listener thread in a forked worker; threads do not survive fork."""
+    global _listener
+    if _listener is not None:
+        _listener = QueueListener(_listener.queue, *_listener.handlers, respect_handler_level=True)
+        _listener.start()
+
+
+def register_request_logging(app: Flask) -> None:
+    """One sampled access-log record per request, with status and duration."""
+    default_rate = float(app.config.get("LOG_SAMPLE_RATE", 1.0))
+    rates = parse_sample_rates(app.config.get("LOG_SAMPLE_RATES"))
+
+    @app.before_request
+    def start_request_timer():
+        g.request_started = time.perf_counter()
+
+    @app.after_request
+    def log_request(response):
+        if request.method == "OPTIONS" or not app.logger.isEnabledFor(logging.INFO):
+            return response
+
+        if response.status_code < 400 and random.random() >= sample_rate_for(request.path, rates, default_rate):
+            return response
+
+        started = g.get("request_started")
+        app.logger.info("request", extra={
+            "method": request.method,
+            "path": request.path,
+            "status": response.status_code,
+            "duration_ms": round((time.perf_counter() - started) * 1000, 2) if started else None,
+            "ip": request.remote_addr,
+            "user_id": getattr(request, "user_id", None)
+        })
+        return response
@@ -0,0 +1,105 @@
+from datetime import datetime, timezone
+from sqlalchemy import insert, select, update
+from models.base import db
+from models.notification import Notification
+from models.rent_deposit import RentRecord, RentStatus
+from models.water_bill import WaterBill, WaterBillStatus
+from utils.locks import exclusive_lock
+
+# Arbitrary key for pg_try_advisory_xact_lock; any constant shared by all workers works
+_ADVISORY_LOCK_KEY = 7305151
+
+RENT_OVERDUE_TITLE = "Rent Payment Overdue"
+WATER_OVERDUE_TITLE = "Water Bill Overdue"
+
+
+def overdue_checks_lock():
+    """Lock so only one overdue sweep runs at a time (see utils.locks.exclusive_lock)."""
+    return exclusive_lock('run-checks', _ADVISORY_LOCK_KEY)
+
+
+def _mark_overdue(model, open_statuses, overdue_status, today):
+    """Flip open records past their due date to overdue; returns the updated rows."""
+    table = model.__table__
+    return db.session.execute(
+        update(table).where(
+            table.c.status.in_(open_statuses),
+            table.c.due_date < today
+        ).values(
+            status=overdue_status,
+            updated_at=datetime.now(timezone.utc)
+        ).returning(table.c.tenant_id, table.c.balance, table.c.month, table.c.year)
+    ).all()
+
+
+def _notified_today(tenant_ids, today):
+    """(user_id, title) pairs of payment notifications already sent today."""
+    if not tenant_ids:
+        return set()
+    return set(db.session.execute(
+        select(Notification.user_id, Notification.title).where(
+            Notification.user_id.in_(tenant_ids),
+            Notification.notification_type == 'payment',
+            Notification.title.in_([RENT_OVERDUE_TITLE, WATER_OVERDUE_TITLE]),
+            Notification.created_at >= today
+        )
+    ).all())
+
+
+def run_overdue_checks(today=None):
+    """
+    Mark overdue rent records and water bills and notify their tenants.
+
+    Runs in a constant number of statements: one UPDATE ... RETURNING per
+    table, one lookup of today's overdue notifications and one bulk INSERT.
+    Tenants get at most one rent and one water notice per day. Returns a
+    summary dict, or None if another sweep is already running.
+    """
+    now = datetime.now(timezone.utc)
+    today = today or datetime(now.year, now.month, now.day)
+
+    with overdue_checks_lock() as acquired:
+        if not acquired:
+            db.session.rollback()
+            return None
+
+        overdue_rent = _mark_overdue(
+            RentRecord, [RentStatus.UNPAID, RentStatus.PARTIALLY_PAID], RentStatus.OVERDUE, today
+        )
+        overdue_water = _mark_overdue(
+            WaterBill, [WaterBillStatus.UNPAID, WaterBillStatus.PARTIALLY_PAID], WaterBillStatus.OVERDUE, today
+        )
+
+        # Anti-join against today's notifications; also de-duplicates within this run
+        notified = _notified_today({row.tenant_id for row in overdue_rent + overdue_water}, today)
+        notifications = []
+        for rows, title, template in (
+            (overdue_rent, RENT_OVERDUE_TITLE,
+             "Your rent payment of KES {balance:,.2f} for {month}/{year} is overdue. Please pay immediately."),
+            (overdue_water, WATER_OVERDUE_TITLE,
+             "Your water bill of KES {balance:,.2f} for {month}/{year} is overdue."),
+        ):
+            for row in rows:
+                if (row.tenant_id, title) in notified:
+                    continue
+                notified.add((row.tenant_id, title))
+                notifications.append({
+                    'user_id': row.tenant_id,
+                    'title': title,
+                    'message': template.format(balance=float(row.balance or 0), month=row.month, year=row.year),
+                    'notification_type': 'payment',
+                    'is_read': False,
+                    'created_at': now,
+                    'updated_at': now
+                })
+
+        if notifications:
+            db.session.execute(insert(Notification), notifications)
+        db.session.commit()
+
+    return {
+        'rent_records_updated': len(overdue_rent),
+        'rent_notifications_sent': sum(1 for n in notifications if n['title'] == RENT_OVERDUE_TITLE),
+        'water_bills_updated': len(overdue_water),
+        'water_notifications_sent': sum(1 for n in notifications if n['title'] == WATER_OVERDUE_TITLE)
+    }
@@ -0,0 +1,152 @@
+"""
+Rate limiting: limiter storage and per-blueprint / per-endpoint budgets.
+
+RATELIMIT_STORAGE_URI picks where counters live:
+
+- "memory://" (development default): per process, so each worker counts alone.
+- "sqlite:///ratelimit.db" (production default): a small SQLite file shared by
+  every worker on the node. Relative paths are resolved against the instance
+  folder. Each hit is one UPSERT on an autocommit WAL connection per thread,
+  so there is no process-wide Python lock on the request path.
+- "redis://host:port" or "memcached://host:port": a local counter server,
+  handled by the limits package (needs the matching client library).
+
+Budgets are limit strings ("10 per minute;100 per hour"). Blueprint budgets
+replace the global defaults for every route in the blueprint; endpoint
+budgets replace both for that route. Public endpoints (login, inquiry,
+M-Pesa callbacks) get their own, independent of the dashboards.
+"""
+
+import os
+import sqlite3
+import threading
+import time
+from flask import Flask, request
+from flask_limiter import Limiter
+from flask_limiter.util import get_remote_address
+from limits.storage import Storage
+
+
+class SQLiteStorage(Storage):
+    """Fixed-window counters in a SQLite file shared by all local workers."""
+
+    STORAGE_SCHEME = ["sqlite"]
+
+    # Expired windows are deleted at most this often, per process
+    PURGE_INTERVAL = 60
+
+    def __init__(self, uri, wrap_exceptions=False, **options):
+        super().__init__(uri, wrap_exceptions=wrap_exceptions, **options)
+        self.path = uri[len("sqlite:///"):]
+        if not self.path:
+            raise ValueError(f"SQLite rate limit storage needs a file path: {uri}")
+        self.timeout = float(options.get("timeout", 5))
+        self._local = threading.local()
+        self._purged_at = 0.0
+
+        self._connection().execute(
+            "CREATE TABLE IF NOT EXISTS rate_limits ("
+            " key TEXT PRIMARY KEY, count INTEGER NOT NULL, expires_at REAL NOT NULL)"
+        )
+
+    @property
+    def base_exceptions(self):
+        return sqlite3.Error
+
+    def _connection(self):
+        # One connection per thread, reopened after a fork (gunicorn preload)
+        conn = getattr(self._local, "conn", None)
+        if conn is None or self._local.pid != os.getpid():
+            conn = sqlite3.connect(self.path, timeout=self.timeout, isolation_level=None, check_same_thread=False)
+            conn.execute("PRAGMA journal_mode=WAL")
+            conn.execute("PRAGMA synchronous=OFF")  # Counters are disposable
+            self._local.conn = conn
+            self._local.pid = os.getpid()
+        return conn
+
+    def incr(self, key, expiry, amount=1, elastic_expiry=False):
+        # The pinned limits 5.x calls incr(key, expiry, amount). Older releases that Flask-Limiter 3.5
+        # also accepts pass elastic_expiry, which restarts the window on each hit.
+        now = time.time()
+        conn = self._connection()
+        count = conn.execute(
+            "INSERT INTO rate_limits (key, count, expires_at) VALUES (?, ?, ?) "
+            "ON CONFLICT(key) DO UPDATE SET "
+            " count = CASE WHEN expires_at <= ? THEN excluded.count ELSE count + excluded.count END, "
+            " expires_at = CASE WHEN ? OR expires_at <= ? THEN excluded.expires_at ELSE expires_at END "
+            "RETURNING count",
+            (key, amount, now + expiry, now, bool(elastic_expiry), now)
+        ).fetchone()[0]
+
+        if now - self._purged_at >= self.PURGE_INTERVAL:
+            self._purged_at = now
+            conn.execute("DELETE FROM rate_limits WHERE expires_at <= ?", (now,))
+        return count
+
+    def get(self, key):
+        row = self._connection().execute(
+            "SELECT count FROM rate_limits WHERE key = ? AND expires_at > ?", (key, time.time())
+        ).fetchone()
+        return row[0] if row else 0
+
+    def get_expiry(self, key):
+        now = time.time()
+        row = self._connection().execute(
+            "SELECT expires_at FROM rate_limits WHERE key = ? AND expires_at > ?", (key, now)
+        ).fetchone()
+        return row[0] if row else now
+
+    def check(self):
+        try:
+            self._connection().execute("SELECT 1").fetchone()
+            return True
+        except sqlite3.Error:
+            return False
+
+    def reset(self):
+        return self._connection().execute("DELETE FROM rate_limits").rowcount
+
+    def clear(self, key):
+        self._connection().execute("DELETE FROM rate_limits WHERE key = ?", (key,))
+
+
+def storage_uri_for(app: Flask) -> str:
+    """RATELIMIT_STORAGE_URI with relative sqlite paths placed in the instance folder."""
+    uri = app.config.get("RATELIMIT_STORAGE_URI", "memory://")
+    if uri.startswith("sqlite:///") and not os.path.isabs(uri[len("sqlite:///"):]):
+        os.makedirs(app.instance_path, exist_ok=True)
+        uri = "sqlite:///" + os.path.join(app.instance_path, uri[len("sqlite:///"):])
+    return uri
+
+
+def _is_preflight():
+    return request.method == "OPTIONS"
+
+
+def init_rate_limits(app: Flask) -> Limiter:
+    """Create the app's limiter on the configured storage (blueprint budgets apply once registered)."""
+    limiter = Limiter(
+        app=app,
+        key_func=get_remote_address,
+        default_limits=app.config.get("RATELIMIT_DEFAULTS", ["1000 per day", "200 per hour"]),
+        storage_uri=storage_uri_for(app),
+        # A shared backend that goes away should not take the API down with it
+        in_memory_fallback_enabled=not app.config.get("RATELIMIT_STORAGE_URI", "memory://").startswith("memory://"),
+        swallow_errors=True,
+        default_limits_exempt_when=_is_preflight
+    )
+    app.limiter = limiter
+    return limiter
+
+
+def apply_rate_limit_budgets(app: Flask, limiter: Limiter) -> None:
+    """Attach RATELIMIT_BLUEPRINT_LIMITS and RATELIMIT_ENDPOINT_LIMITS to registered routes."""
+    for name, limit_value in app.config.get("RATELIMIT_BLUEPRINT_LIMITS", {}).items():
+        blueprint = app.blueprints.get(name)
+        if blueprint is not None and limit_value:
+            limiter.limit(limit_value, exempt_when=_is_preflight)(blueprint)
+
+    for endpoint, limit_value in app.config.get("RATELIMIT_ENDPOINT_LIMITS", {}).items():
+        view = app.view_functions.get(endpoint)
+        if view is not None and limit_value:
+            app.view_functions[endpoint] = limiter.limit(limit_value, exempt_when=_is_preflight)(view)
@@ -0,0 +1,93 @@
+"""
+Read-replica routing for read-only requests.
+
+With SQLALCHEMY_REPLICA_URI set, the replica engine is added to db.engines
+as "replica" and GET/HEAD requests read from it through models.base.RoutingSession.
+Writes, and every query in POST/PUT/PATCH/DELETE requests, use the primary.
+
+Read-your-writes: after a successful write request the client is pinned to the
+primary for READ_YOUR_WRITES_SECONDS by a cookie, which every worker sees. The
+client address is not used: behind the hosting proxy every client shares one.
+
+Locally, point SQLALCHEMY_REPLICA_URI at a second SQLite file and refresh it
+from the primary with `flask sync-replica`.
+"""
+
+import os
+import sqlite3
+import time
+from flask import Flask, request
+from sqlalchemy import create_engine
+from sqlalchemy.engine import make_url
+from models.base import db, REPLICA_BIND
+from utils.db_engine import engine_options
+
+WRITE_METHODS = frozenset({"POST", "PUT", "PATCH", "DELETE"})
+READ_METHODS = frozenset({"GET", "HEAD"})
+STICKY_COOKIE = "db_primary_until"
+
+
+def create_replica_engine(app: Flask):
+    """
+    Engine for SQLALCHEMY_REPLICA_URI, stored as db.engines["replica"]. It is not
+    a SQLALCHEMY_BINDS entry: no model lives only there, and create_all/drop_all
+    must not treat it as a separate schema.
+    """
+    url = make_url(app.config["SQLALCHEMY_REPLICA_URI"])
+    if url.get_backend_name() == "sqlite" and url.database not in (None, "", ":memory:") \
+            and not os.path.isabs(url.database):
+        # Same rule as Flask-SQLAlchemy applies to the primary
+        url = url.set(database=os.path.join(app.instance_path, url.database))
+
+    options = engine_options({**app.config, "SQLALCHEMY_DATABASE_URI": url})
+    engine = create_engine(url, **options)
+    with app.app_context():
+        db.engines[REPLICA_BIND] = engine
+    return engine
+
+
+def _pinned_until_cookie(now):
+    try:
+        return float(request.cookies.get(STICKY_COOKIE, 0)) > now
+    except ValueError:
+        return False
+
+
+def init_read_replica(app: Flask) -> None:
+    """Route read-only requests to the replica and pin recent writers to the primary."""
+    if not app.config.get("SQLALCHEMY_REPLICA_URI"):
+        return
+
+    create_replica_engine(app)
+    window = app.config.get("READ_YOUR_WRITES_SECONDS", 5)
+    secure = bool(app.config.get("SESSION_COOKIE_SECURE"))
+
+    @app.before_request
+    def choose_database():
+        if request.method not in READ_METHODS or _pinned_until_cookie(time.time()):
+            return
+        db.session.info["use_replica"] = True
+
+    @app.after_request
+    def remember_writer(response):
+        # A rejected write (failed login, malformed callback) changed nothing to read back
+        if request.method in WRITE_METHODS and 200 <= response.status_code < 300 and window > 0:
+            until = time.time() + window
+            # The frontend is cross-site in production, which needs SameSite=None; Secure
+            response.set_cookie(STICKY_COOKIE, str(int(until) + 1), max_age=window + 1, httponly=True,
+                                secure=secure, samesite="None" if secure else "Lax")
+        return response
+
+
+def sync_sqlite_replica(app: Flask) -> str:
+    """Copy a SQLite primary into the SQLite replica file (local development only)."""
+    with app.app_context():
+        primary = db.engines[None].url
+        replica = db.engines[REPLICA_BIND].url
+
+    if make_url(primary).get_backend_name() != "sqlite" or make_url(replica).get_backend_name() != "sqlite":
+        raise ValueError("sync-replica only copies SQLite to SQLite; use database replication otherwise")
+
+    with sqlite3.connect(primary.database) as source, sqlite3.connect(replica.database) as target:
+        source.backup(target)
+    return replica.database
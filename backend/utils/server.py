@@ -0,0 +1,79 @@
+"""
+Production serving: `flask serve` runs the app under gunicorn.
+
+The app is built once in the master (preload), so imports, model mappers
+and config are shared copy-on-write by the forked workers. Each worker runs
+WSGI_THREADS request threads (gthread). Database pools are sized from the
+worker and thread counts so all workers together stay within
+DB_MAX_CONNECTIONS. On SIGTERM, workers finish in-flight requests (up to
+WSGI_GRACEFUL_TIMEOUT), let running payment jobs finish, flush logs and
+queued notifications, and close their database connections.
+"""
+
+import multiprocessing
+from gunicorn.app.base import BaseApplication
+from models.base import db
+from services import notification_service, payment_jobs
+from utils.logging_config import restart_listener, stop_listener
+
+
+def default_workers():
+    """Gunicorn's usual starting point: 2 x cores + 1."""
+    return multiprocessing.cpu_count() * 2 + 1
+
+
+class GunicornServer(BaseApplication):
+    """Runs an app factory under gunicorn with preloading and lifecycle hooks."""
+
+    def __init__(self, app_factory, options):
+        self.app_factory = app_factory
+        self.options = options
+        self.application = None
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            if key in self.cfg.settings and value is not None:
+                self.cfg.set(key, value)
+
+        self.cfg.set("post_fork", self._post_fork)
+        self.cfg.set("worker_exit", self._worker_exit)
+
+    def load(self):
+        if self.application is None:
+            self.application = self.app_factory()
+        return self.application
+
+    def _post_fork(self, server, worker):
+        # Connections and threads opened in the master must not be shared
+        with self.application.app_context():
+            for engine in db.engines.values():
+                engine.dispose(close=False)
+        restart_listener()
+
+    def _worker_exit(self, server, worker):
+        if self.application is None:
+            return
+        payment_jobs.stop()
+        notification_service.drain()
+        with self.application.app_context():
+            for engine in db.engines.values():
+                engine.dispose()
+        stop_listener()
+
+
+def serve(app_factory, bind, workers, threads, timeout, graceful_timeout, keepalive=5, max_requests=0):
+    """Run `app_factory()` under gunicorn until shut down."""
+    GunicornServer(app_factory, {
+        "bind": bind,
+        "workers": workers,
+        "threads": threads,
+        "worker_class": "gthread" if threads > 1 else "sync",
+        "preload_app": True,
+        "timeout": timeout,
+        "graceful_timeout": graceful_timeout,
+        "keepalive": keepalive,
+        "max_requests": max_requests,
+        "max_requests_jitter": max_requests // 10 if max_requests else 0,
+        "accesslog": None  # Requests are logged by the app (utils.logging_config)
+    }).run()
@@ -0,0 +1,290 @@
+from datetime import datetime
+from sqlalchemy import case, func
+from models.base import db
+from models.lease import Lease
+from models.maintenance import MaintenanceRequest, MAINTENANCE_STATUSES
+from models.payment import Payment
+from models.property import Property, PROPERTY_STATUSES
+from models.rent_deposit import DepositRecord, DepositStatus
+from models.user import User
+from models.vacate_notice import VacateNotice, VACATE_STATUSES
+from models.water_bill import WaterBill, WaterBillStatus
+
+
+def count_by(columns, *criteria):
+    """
+    Count rows grouped by one or more columns with a single GROUP BY query.
+    Returns {value: count}, keyed by tuples when several columns are given.
+    """
+    if not isinstance(columns, (list, tuple)):
+        columns = [columns]
+
+    rows = db.session.query(*columns, func.count()).filter(*criteria).group_by(*columns).all()
+
+    if len(columns) == 1:
+        return {row[0]: row[1] for row in rows}
+    return {tuple(row[:-1]): row[-1] for row in rows}
+
+
+def property_stats():
+    """Property counts by status and by (type, status)."""
+    by_type_status = count_by([Property.property_type, Property.status])
+
+    stats = {status: 0 for status in PROPERTY_STATUSES}
+    by_type = {}
+    for (property_type, status), count in by_type_status.items():
+        stats[status] = stats.get(status, 0) + count
+        by_type.setdefault(property_type, {}).setdefault(status, 0)
+        by_type[property_type][status] += count
+
+    stats["total"] = sum(by_type_status.values())
+    stats["by_type"] = by_type
+    return stats
+
+
+def tenant_stats():
+    """Tenant counts split by active flag."""
+    by_active = count_by(User.is_active, User.role == 'tenant')
+    active = by_active.get(True, 0)
+    total = sum(by_active.values())
+    return {"total": total, "active": active, "inactive": total - active}
+
+
+def lease_stats():
+    """Lease counts by status."""
+    by_status = count_by(Lease.status)
+    by_status["total"] = sum(by_status.values())
+    return by_status
+
+
+def payment_stats():
+    """Payment count and amount per status."""
+    rows = db.session.query(
+        Payment.status,
+        func.count(Payment.id),
+        func.coalesce(func.sum(Payment.amount), 0.0)
+    ).group_by(Payment.status).all()
+
+    by_status = {status: {"count": count, "amount": float(amount or 0)} for status, count, amount in rows}
+    return {
+        "total_count": sum(s["count"] for s in by_status.values()),
+        "by_status": by_status
+    }
+
+
+def maintenance_stats():
+    """Maintenance counts by status plus requests completed today."""
+    today = datetime.now().date()
+    rows = db.session.query(
+        MaintenanceRequest.status,
+        func.count(MaintenanceRequest.id),
+        func.sum(case((MaintenanceRequest.updated_at >= today, 1), else_=0))
+    ).group_by(MaintenanceRequest.status).all()
+
+    stats = {status: 0 for status in MAINTENANCE_STATUSES}
+    completed_today = 0
+    for status, count, updated_today in rows:
+        stats[status] = count
+        if status == "completed":
+            completed_today = int(updated_today or 0)
+
+    stats["total"] = sum(count for _, count, _ in rows)
+    stats["completed_today"] = completed_today
+    return stats
+
+
+def vacate_notice_stats():
+    """Vacate notice counts by status."""
+    stats = {status: 0 for status in VACATE_STATUSES}
+    stats.update(count_by(VacateNotice.status))
+    stats["total"] = sum(stats.values())
+    return stats
+
+
+def _last_n_months(month, year, count=6):
+    """(year, month) pairs for the `count` months ending at month/year, newest first."""
+    months = []
+    for offset in range(count):
+        index = year * 12 + (month - 1) - offset
+        months.append((index // 12, index % 12 + 1))
+    return months
+
+
+def _status_key(status):
+    return status.value if hasattr(status, 'value') else status
+
+
+def deposit_summary():
+    """
+    Deposit totals, status counts and per-property breakdown from a single
+    GROUP BY property_id, status query.
+    """
+    rows = db.session.query(
+        DepositRecord.property_id,
+        Property.name,
+        DepositRecord.status,
+        func.count(DepositRecord.id),
+        func.coalesce(func.sum(DepositRecord.amount_required), 0),
+        func.coalesce(func.sum(DepositRecord.amount_paid), 0),
+        func.coalesce(func.sum(DepositRecord.refund_amount), 0),
+        func.coalesce(func.sum(DepositRecord.balance), 0)
+    ).outerjoin(
+        Property, Property.id == DepositRecord.property_id
+    ).group_by(
+        DepositRecord.property_id, Property.name, DepositRecord.status
+    ).all()
+
+    summary = {
+        'total_deposits': 0,
+        'total_amount_required': 0.0,
+        'total_amount_paid': 0.0,
+        'total_refunded': 0.0,
+        'total_balance': 0.0,
+        'status_counts': {status.value: 0 for status in DepositStatus},
+        'property_breakdown': {}
+    }
+
+    for _, prop_name, status, count, required, paid, refunded, balance in rows:
+        status = _status_key(status)
+        summary['total_deposits'] += count
+        summary['total_amount_required'] += float(required)
+        summary['total_amount_paid'] += float(paid)
+        summary['total_refunded'] += float(refunded)
+        summary['total_balance'] += float(balance)
+        summary['status_counts'][status] = summary['status_counts'].get(status, 0) + count
+
+        breakdown = summary['property_breakdown'].setdefault(prop_name or 'Unknown', {
+            'total_deposits': 0,
+            'total_required': 0.0,
+            'total_paid': 0.0,
+            'total_refunded': 0.0,
+            'total_balance': 0.0,
+            'status_counts': {s.value: 0 for s in DepositStatus}
+        })
+        breakdown['total_deposits'] += count
+        breakdown['total_required'] += float(required)
+        breakdown['total_paid'] += float(paid)
+        breakdown['total_refunded'] += float(refunded)
+        breakdown['total_balance'] += float(balance)
+        breakdown['status_counts'][status] = breakdown['status_counts'].get(status, 0) + count
+
+    return summary
+
+
+def deposit_monthly_trend(month, year, count=6):
+    """Deposits created per month for the last `count` months, oldest first."""
+    months = _last_n_months(month, year, count)
+    oldest_year, oldest_month = months[-1]
+
+    created_year = func.extract('year', DepositRecord.created_at)
+    created_month = func.extract('month', DepositRecord.created_at)
+    rows = db.session.query(
+        created_year,
+        created_month,
+        func.count(DepositRecord.id),
+        func.coalesce(func.sum(DepositRecord.amount_required), 0),
+        func.coalesce(func.sum(DepositRecord.amount_paid), 0),
+        func.coalesce(func.sum(DepositRecord.refund_amount), 0)
+    ).filter(
+        DepositRecord.created_at >= datetime(oldest_year, oldest_month, 1)
+    ).group_by(created_year, created_month).all()
+
+    by_month = {(int(y), int(m)): row for y, m, *row in rows}
+
+    trend = []
+    for trend_year, trend_month in reversed(months):
+        total, required, paid, refunded = by_month.get((trend_year, trend_month), (0, 0, 0, 0))
+        trend.append({
+            'month': trend_month,
+            'year': trend_year,
+            'total_deposits': total,
+            'total_amount': float(required),
+            'collected': float(paid),
+            'refunded': float(refunded)
+        })
+    return trend
+
+
+def water_bill_summary(month, year):
+    """
+    Water bill totals, status counts and per-property breakdown for one
+    billing month from a single GROUP BY property_id, status query.
+    """
+    rows = db.session.query(
+        WaterBill.property_id,
+        Property.name,
+        WaterBill.status,
+        func.count(WaterBill.id),
+        func.coalesce(func.sum(WaterBill.amount_due), 0),
+        func.coalesce(func.sum(WaterBill.amount_paid), 0),
+        func.coalesce(func.sum(WaterBill.balance), 0)
+    ).outerjoin(
+        Property, Property.id == WaterBill.property_id
+    ).filter(
+        WaterBill.month == month,
+        WaterBill.year == year
+    ).group_by(
+        WaterBill.property_id, Property.name, WaterBill.status
+    ).all()
+
+    summary = {
+        'total_bills': 0,
+        'total_amount_due': 0.0,
+        'total_amount_paid': 0.0,
+        'total_balance': 0.0,
+        'status_counts': {status.value: 0 for status in WaterBillStatus},
+        'property_breakdown': {}
+    }
+
+    for _, prop_name, status, count, due, paid, balance in rows:
+        status = _status_key(status)
+        summary['total_bills'] += count
+        summary['total_amount_due'] += float(due)
+        summary['total_amount_paid'] += float(paid)
+        summary['total_balance'] += float(balance)
+        summary['status_counts'][status] = summary['status_counts'].get(status, 0) + count
+
+        breakdown = summary['property_breakdown'].setdefault(prop_name or 'Unknown', {
+            'total_bills': 0,
+            'total_due': 0.0,
+            'total_paid': 0.0,
+            'total_balance': 0.0
+        })
+        breakdown['total_bills'] += count
+        breakdown['total_due'] += float(due)
+        breakdown['total_paid'] += float(paid)
+        breakdown['total_balance'] += float(balance)
+
+    return summary
+
+
+def water_bill_monthly_trend(month, year, count=6):
+    """Water bill totals per billing month for the last `count` months, oldest first."""
+    months = _last_n_months(month, year, count)
+    oldest_year, oldest_month = months[-1]
+
+    period_index = WaterBill.year * 12 + WaterBill.month
+    rows = db.session.query(
+        WaterBill.year,
+        WaterBill.month,
+        func.count(WaterBill.id),
+        func.coalesce(func.sum(WaterBill.amount_due), 0),
+        func.coalesce(func.sum(WaterBill.amount_paid), 0)
+    ).filter(
+        period_index >= oldest_year * 12 + oldest_month,
+        period_index <= year * 12 + month
+    ).group_by(WaterBill.year, WaterBill.month).all()
+
+    by_month = {(y, m): row for y, m, *row in rows}
+
+    trend = []
+    for trend_year, trend_month in reversed(months):
+        total, due, paid = by_month.get((trend_year, trend_month), (0, 0, 0))
+        trend.append({
+            'month': trend_month,
+            'year': trend_year,
+            'total_bills': total,
+            'total_amount': float(due),
+            'collected': float(paid)
+        })
+    return trend
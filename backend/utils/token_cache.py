@@ -0,0 +1,60 @@
+"""
+Bounded LRU of already-verified JWTs, so repeat requests with the same token
+skip the HMAC check and JSON decode. Entries are keyed by a digest of the
+token, never outlive the token's exp, and are dropped on logout. Revocation
+is still checked on every request by the caller.
+"""
+
+import hashlib
+import threading
+import time
+from collections import OrderedDict
+from flask import current_app
+
+
+class VerifiedTokenCache:
+    """Thread-safe LRU of token digest -> decoded payload."""
+
+    def __init__(self, max_entries=1024):
+        self.max_entries = max_entries
+        self._entries = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def digest(token):
+        return hashlib.blake2b(token.encode(), digest_size=20).digest()
+
+    def get(self, token):
+        key = self.digest(token)
+        with self._lock:
+            payload = self._entries.get(key)
+            if payload is None:
+                return None
+            if payload["exp"] <= time.time():
+                del self._entries[key]
+                return None
+            self._entries.move_to_end(key)
+            return payload
+
+    def put(self, token, payload):
+        if self.max_entries <= 0:
+            return
+        key = self.digest(token)
+        with self._lock:
+            self._entries[key] = payload
+            self._entries.move_to_end(key)
+            while len(self._entries) > self.max_entries:
+                self._entries.popitem(last=False)
+
+    def discard(self, token):
+        with self._lock:
+            self._entries.pop(self.digest(token), None)
+
+
+def get_verified_token_cache():
+    """The current app's verified-token cache, created on first use."""
+    cache = current_app.extensions.get("jwt_verify_cache")
+    if cache is None:
+        cache = VerifiedTokenCache(current_app.config.get("JWT_VERIFY_CACHE_SIZE", 1024))
+        current_app.extensions["jwt_verify_cache"] = cache
+    return cache
@@ -0,0 +1,185 @@
+"""
+Revocation stores for logged-out JWTs, keyed by the token's jti claim.
+
+Two backends are available, chosen with TOKEN_REVOCATION_BACKEND:
+
+- "memory": a map of jti -> exp inside the process. Fast, but a logout is
+  only seen by the worker that handled it. When it reaches
+  TOKEN_REVOCATION_MAX_ENTRIES only expired entries are dropped; unexpired
+  revocations are kept (and a warning logged) rather than silently undone.
+- "database" (default): rows in the revoked_tokens table, shared by all
+  workers. A per-process bloom filter of revoked jtis answers "definitely
+  not revoked" without a query. The filter is rebuilt from the table every
+  TOKEN_REVOCATION_SYNC_SECONDS, which bounds how long another worker's
+  logout can go unseen. 0 means rebuild on every check.
+
+Entries are dropped once the token would have expired anyway.
+"""
+
+import hashlib
+import heapq
+import math
+import threading
+import time
+from datetime import datetime, timezone
+from flask import current_app
+from sqlalchemy.exc import IntegrityError
+from models.base import db, read_from_primary
+from models.revoked_token import RevokedToken
+
+
+def _as_datetime(exp):
+    if isinstance(exp, datetime):
+        return exp if exp.tzinfo else exp.replace(tzinfo=timezone.utc)
+    return datetime.fromtimestamp(exp, tz=timezone.utc)
+
+
+class BloomFilter:
+    """Fixed-size bloom filter over strings (no false negatives)."""
+
+    def __init__(self, capacity=10000, error_rate=0.01):
+        self.capacity = max(capacity, 1)
+        self.size = max(8, int(-self.capacity * math.log(error_rate) / (math.log(2) ** 2)))
+        self.hash_count = max(1, round(self.size / self.capacity * math.log(2)))
+        self.bits = bytearray((self.size + 7) // 8)
+        self.count = 0
+
+    def _positions(self, key):
+        digest = hashlib.blake2b(key.encode(), digest_size=16).digest()
+        h1 = int.from_bytes(digest[:8], "little")
+        h2 = int.from_bytes(digest[8:], "little") | 1
+        return ((h1 + i * h2) % self.size for i in range(self.hash_count))
+
+    def add(self, key):
+        for position in self._positions(key):
+            self.bits[position >> 3] |= 1 << (position & 7)
+        self.count += 1
+
+    def __contains__(self, key):
+        return all(self.bits[position >> 3] & (1 << (position & 7)) for position in self._positions(key))
+
+
+class MemoryRevocationStore:
+    """In-process revoked jtis with per-entry expiry, evicted soonest-expiring first."""
+
+    def __init__(self, max_entries=100000):
+        self.max_entries = max_entries
+        self._entries = {}
+        self._expiry_heap = []  # (expires_at, jti); stale pairs are skipped
+        self._over_capacity = False
+        self._lock = threading.Lock()
+
+    def _drop_expired(self, now):
+        while self._expiry_heap and self._expiry_heap[0][0] <= now:
+            expires_at, jti = heapq.heappop(self._expiry_heap)
+            if self._entries.get(jti) == expires_at:
+                del self._entries[jti]
+
+    def revoke(self, jti, exp):
+        expires_at = _as_datetime(exp).timestamp()
+        with self._lock:
+            self._entries[jti] = expires_at
+            heapq.heappush(self._expiry_heap, (expires_at, jti))
+            if len(self._entries) <= self.max_entries:
+                self._over_capacity = False
+                return
+            self._drop_expired(time.time())
+            over_capacity = len(self._entries) > self.max_entries
+            warn = over_capacity and not self._over_capacity
+            self._over_capacity = over_capacity
+
+        if warn:
+            # Dropping an unexpired entry would make a logged-out token valid again
+            current_app.logger.warning(
+                f"Token revocation store holds {len(self._entries)} unexpired entries, "
+                f"over TOKEN_REVOCATION_MAX_ENTRIES={self.max_entries}; keeping them all"
+            )
+
+    def is_revoked(self, jti):
+        with self._lock:
+            expires_at = self._entries.get(jti)
+            if expires_at is None:
+                return False
+            if expires_at <= time.time():
+                del self._entries[jti]
+                return False
+            return True
+
+    def prune(self):
+        with self._lock:
+            self._drop_expired(time.time())
+
+
+class DatabaseRevocationStore:
+    """revoked_tokens table behind a periodically rebuilt bloom filter."""
+
+    def __init__(self, sync_seconds=5, error_rate=0.01):
+        self.sync_seconds = sync_seconds
+        self.error_rate = error_rate
+        self._bloom = None
+        self._synced_at = 0.0
+        self._lock = threading.Lock()
+
+    def _sync(self):
+        """Rebuild the bloom filter from unexpired revocations."""
+        now = datetime.now(timezone.utc)
+        # Revocations are read from the primary: a replica could lag behind a logout
+        with read_from_primary():
+            jtis = db.session.scalars(db.select(RevokedToken.jti).where(RevokedToken.expires_at > now)).all()
+
+        bloom = BloomFilter(capacity=max(1024, len(jtis) * 2), error_rate=self.error_rate)
+        for jti in jtis:
+            bloom.add(jti)
+
+        with self._lock:
+            self._bloom = bloom
+            self._synced_at = time.monotonic()
+
+    def revoke(self, jti, exp):
+        try:
+            # Pruning on the write path keeps reads free of writes
+            RevokedToken.prune()
+            db.session.add(RevokedToken(jti=jti, expires_at=_as_datetime(exp)))
+            db.session.commit()
+        except IntegrityError:
+            db.session.rollback()  # Already revoked
+
+        with self._lock:
+            if self._bloom is not None:
+                self._bloom.add(jti)
+
+    def is_revoked(self, jti):
+        with self._lock:
+            stale = self._bloom is None or time.monotonic() - self._synced_at >= self.sync_seconds
+        if stale:
+            self._sync()
+
+        if jti not in self._bloom:
+            return False
+
+        with read_from_primary():
+            return db.session.query(
+                RevokedToken.query.filter(
+                    RevokedToken.jti == jti,
+                    RevokedToken.expires_at > datetime.now(timezone.utc)
+                ).exists()
+            ).scalar()
+
+    def prune(self):
+        RevokedToken.prune()
+        db.session.commit()
+
+
+def get_revocation_store():
+    """The current app's revocation store, created on first use."""
+    store = current_app.extensions.get("token_revocation")
+    if store is None:
+        backend = current_app.config.get("TOKEN_REVOCATION_BACKEND", "database")
+        if backend == "memory":
+            store = MemoryRevocationStore(current_app.config.get("TOKEN_REVOCATION_MAX_ENTRIES", 100000))
+        elif backend == "database":
+            store = DatabaseRevocationStore(current_app.config.get("TOKEN_REVOCATION_SYNC_SECONDS", 5))
+        else:
+            raise ValueError(f"Unknown TOKEN_REVOCATION_BACKEND: {backend}")
+        current_app.extensions["token_revocation"] = store
+    return store
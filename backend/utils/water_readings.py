@@ -0,0 +1,246 @@
+import csv
+import io
+from datetime import datetime, timezone
+from sqlalchemy import func, insert, update
+from models.base import db
+from models.lease import Lease
+from models.water_bill import WaterBill, WaterBillStatus
+from models.monthly_ledger import apply_bulk_rows
+
+# Columns accepted in a meter-round CSV upload
+CSV_COLUMNS = ('tenant_id', 'current_reading', 'previous_reading', 'property_id', 'lease_id')
+
+
+def _to_number(value, cast=float):
+    if value is None or (isinstance(value, str) and not value.strip()):
+        return None
+    return cast(value)
+
+
+def parse_readings_csv(file_storage):
+    """
+    Parse an uploaded CSV of meter readings into reading dicts.
+    Needs tenant_id and current_reading columns; previous_reading,
+    property_id and lease_id are optional.
+    """
+    stream = io.TextIOWrapper(file_storage.stream, encoding='utf-8-sig', newline='')
+    reader = csv.DictReader(stream)
+    missing = {'tenant_id', 'current_reading'} - set(reader.fieldnames or [])
+    if missing:
+        raise ValueError(f"CSV is missing columns: {', '.join(sorted(missing))}")
+
+    return [
+        {column: row.get(column) for column in CSV_COLUMNS if row.get(column) not in (None, '')}
+        for row in reader
+    ]
+
+
+def due_date_for(month, year, day=5):
+    """Water bills fall due on `day` of the month after the billing month."""
+    if month == 12:
+        return datetime(year + 1, 1, day, tzinfo=timezone.utc)
+    return datetime(year, month + 1, day, tzinfo=timezone.utc)
+
+
+def _bill_amounts(previous_reading, current_reading, unit_rate, amount_paid, due_date, now):
+    """Consumption, amount, balance and status, as WaterBill.calculate_amount() computes them."""
+    units_consumed = max(0.0, current_reading - previous_reading)
+    amount_due = round(units_consumed * unit_rate, 2)
+    balance = round(amount_due - amount_paid, 2)
+
+    if balance <= 0:
+        status, amount_paid, balance = WaterBillStatus.PAID, amount_due, 0.0
+    elif amount_paid > 0:
+        status = WaterBillStatus.PARTIALLY_PAID
+    else:
+        status = WaterBillStatus.UNPAID
+
+    if due_date < now and status != WaterBillStatus.PAID:
+        status = WaterBillStatus.OVERDUE
+
+    return {
+        'units_consumed': units_consumed,
+        'amount_due': amount_due,
+        'amount_paid': amount_paid,
+        'balance': balance,
+        'status': status
+    }
+
+
+def ingest_water_readings(readings, month, year, unit_rate, caretaker_id,
+                          reading_date=None, due_day=5, update_existing=True):
+    """
+    Create or update the water bills for a batch of readings.
+
+    Active leases and existing bills for the whole batch are fetched with two
+    queries, amounts are computed in one pass and the rows are written with a
+    bulk INSERT and a bulk UPDATE. The caller commits.
+
+    Returns a dict with 'created' and 'updated' row lists and 'errors'.
+    """
+    now = datetime.now(timezone.utc)
+    reading_date = reading_date or now
+    due_date = due_date_for(month, year, due_day)
+    unit_rate = float(unit_rate)
+    errors = []
+
+    # Validate and normalise; a later reading for the same tenant wins
+    parsed = {}
+    for reading in readings:
+        tenant_id = reading.get('tenant_id')
+        try:
+            tenant_id = _to_number(tenant_id, int)
+            current_reading = _to_number(reading.get('current_reading'))
+            previous_reading = _to_number(reading.get('previous_reading')) or 0.0
+            property_id = _to_number(reading.get('property_id'), int)
+            lease_id = _to_number(reading.get('lease_id'), int)
+        except (TypeError, ValueError):
+            errors.append(f"Invalid reading data for tenant {tenant_id}")
+            continue
+
+        if not tenant_id or current_reading is None:
+            errors.append(f"Invalid reading data for tenant {tenant_id}")
+            continue
+
+        parsed[tenant_id] = {
+            'tenant_id': tenant_id,
+            'current_reading': current_reading,
+            'previous_reading': previous_reading,
+            'property_id': property_id,
+            'lease_id': lease_id
+        }
+
+    if not parsed:
+        return {'created': [], 'updated': [], 'errors': errors}
+
+    tenant_ids = list(parsed)
+
+    # Query 1: first active lease per tenant
+    first_leases = db.session.query(
+        func.min(Lease.id).label('lease_id')
+    ).filter(
+        Lease.tenant_id.in_(tenant_ids),
+        Lease.status == 'active'
+    ).group_by(Lease.tenant_id).subquery()
+
+    leases = {
+        tenant_id: (lease_id, property_id)
+        for lease_id, tenant_id, property_id in db.session.query(
+            Lease.id, Lease.tenant_id, Lease.property_id
+        ).join(first_leases, first_leases.c.lease_id == Lease.id)
+    }
+
+    # Query 2: bills already recorded for this month
+    existing = {
+        row.tenant_id: row
+        for row in db.session.query(
+            WaterBill.id, WaterBill.tenant_id, WaterBill.property_id,
+            WaterBill.amount_due, WaterBill.amount_paid, WaterBill.balance
+        ).filter(
+            WaterBill.tenant_id.in_(tenant_ids),
+            WaterBill.month == month,
+            WaterBill.year == year
+        )
+    }
+
+    created, updated, backed_out = [], [], []
+    for tenant_id, reading in parsed.items():
+        bill = existing.get(tenant_id)
+
+        if bill is not None:
+            if not update_existing:
+                errors.append(f"Water bill already exists for tenant {tenant_id}")
+                continue
+
+            amounts = _bill_amounts(
+                reading['previous_reading'], reading['current_reading'], unit_rate,
+                float(bill.amount_paid or 0), due_date, now
+            )
+            updated.append(dict(
+                amounts,
+                id=bill.id,
+                tenant_id=tenant_id,
+                property_id=bill.property_id,
+                previous_reading=reading['previous_reading'],
+                current_reading=reading['current_reading'],
+                unit_rate=unit_rate,
+                recorded_by_caretaker_id=caretaker_id,
+                last_calculated=now,
+                updated_at=now
+            ))
+            backed_out.append({
+                'property_id': bill.property_id,
+                'tenant_id': tenant_id,
+                'year': year,
+                'month': month,
+                'record_count': -1,
+                'amount_due': -float(bill.amount_due or 0),
+                'amount_paid': -float(bill.amount_paid or 0),
+                'balance': -float(bill.balance or 0)
+            })
+            continue
+
+        lease_id, property_id = leases.get(tenant_id, (None, None))
+        lease_id = reading['lease_id'] or lease_id
+        property_id = reading['property_id'] or property_id
+        if not lease_id or not property_id:
+            errors.append(f"No active lease found for tenant {tenant_id}")
+            continue
+
+        amounts = _bill_amounts(
+            reading['previous_reading'], reading['current_reading'], unit_rate, 0.0, due_date, now
+        )
+        created.append(dict(
+            amounts,
+            tenant_id=tenant_id,
+            property_id=property_id,
+            lease_id=lease_id,
+            month=month,
+            year=year,
+            reading_date=reading_date,
+            previous_reading=reading['previous_reading'],
+            current_reading=reading['current_reading'],
+            unit_rate=unit_rate,
+            due_date=due_date,
+            recorded_by_caretaker_id=caretaker_id,
+            is_auto_calculated=True,
+            last_calculated=now,
+            created_at=now,
+            updated_at=now
+        ))
+
+    if created:
+        ids = db.session.scalars(insert(WaterBill).returning(WaterBill.id, sort_by_parameter_order=True), created).all()
+        for row, bill_id in zip(created, ids):
+            row['id'] = bill_id
+    if updated:
+        db.session.execute(update(WaterBill), [
+            {key: value for key, value in row.items() if key not in ('tenant_id', 'property_id')}
+            for row in updated
+        ])
+
+    # Bulk writes bypass the flush hook that maintains the ledger
+    ledger_rows = backed_out + [dict(row, year=year, month=month) for row in created + updated]
+    if ledger_rows:
+        apply_bulk_rows(db.session.connection(), 'water', ledger_rows)
+
+    return {'created': created, 'updated': updated, 'errors': errors}
+
+
+def bill_summary(row, month, year):
+    """Lightweight JSON view of an ingested bill row."""
+    return {
+        'id': row['id'],
+        'tenant_id': row['tenant_id'],
+        'property_id': row['property_id'],
+        'month': month,
+        'year': year,
+        'previous_reading': row['previous_reading'],
+        'current_reading': row['current_reading'],
+        'units_consumed': row['units_consumed'],
+        'unit_rate': row['unit_rate'],
+        'amount_due': row['amount_due'],
+        'amount_paid': row['amount_paid'],
+        'balance': row['balance'],
+        'status': row['status'].value
+    }
@@ -211,14 +211,18 @@ export function AuthProvider({ children }) {
               setUser(null);
             } else {
 
+              // The token only carries sub/role; profile fields come from the stored user
+              let savedUser = {};
+              try {
+                savedUser = JSON.parse(localStorage.getItem(STORAGE_KEYS.USER)) || {};
+              } catch (parseError) {
+                savedUser = {};
+              }
+
               const userData = {
-                user_id: decodedNode.user_id,
-                email: decodedNode.email,
-                full_name: decodedNode.full_name,
-                role: decodedNode.role,
-                photo_path: decodedNode.photo_path,
-                room_number: decodedNode.room_number,
-                is_active: decodedNode.is_active
+                ...savedUser,
+                user_id: decodedNode.sub !== undefined ? Number(decodedNode.sub) : decodedNode.user_id,
+                role: decodedNode.role
               };
 
 